@@ -5,31 +5,154 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 from utils import load_config, is_admin, logger
+from keyboards import (
+    KEYBOARD_COMMANDS, BACK_TO_MENU_KEYBOARD,
+    BTN_BACK_TO_MENU, BTN_VIEW_MESSAGES, BTN_DELETE_MESSAGES, BTN_LINK_CHANNEL,
+    BTN_MESSAGE_MANAGEMENT, BTN_LIST_MANAGEMENT, BTN_BOT_STATUS
+)
+from menu_manager import MenuManager
+from message_manager import MessageManager
+from message_store import MessageStore
+from destination_importer import DestinationImporter
+from chat_health import ChatHealthCache
+from chat_membership import MembershipTracker
+from broadcast import Broadcaster
+from router import UpdateRouter
+from state_store import ConversationStateStore
+from pagination import PAGE_CALLBACK_PREFIX, page_nav_row, parse_page_callback
+
+# Tamaño de página de las listas de mensajes
+MESSAGES_PAGE_SIZE = 10
 
 class BotHandler:
-    def __init__(self, config_file='config.json', messages_file='mensajes.json'):
+    def __init__(self, config_file='config.json', messages_file='mensajes.json', message_store=None, config=None,
+                 health=None):
         self.config_file = config_file
         self.messages_file = messages_file
-        self.config = load_config(config_file)
-        self.user_states = {}
+        # Snapshot de configuración compartido con el forwarder (se carga si no se recibe)
+        self.config = config if config is not None else load_config(config_file)
         self.application = None
 
+        # Estados de conversación con TTL, compartidos con listas y menús
+        self.user_states = ConversationStateStore(
+            max_entries=self.config.get('estados_max_entradas', 1000),
+            ttl=self.config.get('estados_ttl_segundos', 1800),
+            persist_file=self.config.get('archivo_estados', 'estados.json') if self.config.get('persistir_estados', True) else None
+        )
+
+        # Almacén de mensajes compartido con el forwarder
+        self.message_store = message_store if message_store is not None else MessageStore(messages_file)
+
         # Sistema simple para crear listas
         from simple_list_creator import SimpleListCreator
-        self.list_creator = SimpleListCreator(self.config)
+        self.list_creator = SimpleListCreator(self.config, self.user_states, self.message_store)
+
+        # Importación masiva de destinos desde documentos
+        self.importer = DestinationImporter(self.config, self.user_states, self.message_store)
+
+        # Registro de destinos con títulos y permisos (compartido con el forwarder)
+        self.health = health if health is not None else ChatHealthCache()
+        self.membership = MembershipTracker(self.config, self.health, self.message_store)
+
+        # Difusiones inmediatas con progreso y cancelación
+        self.broadcaster = Broadcaster(self.config, self.user_states)
+
+        # Un único MenuManager compartido por todos los updates
+        self.menu = MenuManager(self.config, self.config_file, self.messages_file, self.message_store.stats, self.user_states,
+                                self.message_store, self.health)
+
+        # Alta de mensajes reenviados (manual o auto-configurada desde el canal origen)
+        self.message_manager = MessageManager(self.config, self.message_store, self.user_states)
 
         # Deshabilitamos el sistema de solicitudes de bots
         self.request_manager = None
 
+        self.router = UpdateRouter()
+        self._register_routes()
+
+    def _register_routes(self):
+        """Registrar todas las rutas de callbacks, teclado y estados"""
+        menu = self.menu
+        router = self.router
+
+        # Callbacks inline exactos
+        router.add_callback("main_menu", menu.show_main_menu)
+        router.add_callback("msg_management", menu.show_message_management_menu)
+        router.add_callback("destinations", menu.show_destinations_menu)
+        router.add_callback("dest_menu", menu.show_destinations_menu)
+        router.add_callback("show_destinations_menu", menu.show_destinations_menu)
+        router.add_callback("dest_add", menu.request_destination_input)
+        router.add_callback("dest_import", self.importer.request_import_file)
+        router.add_callback("dest_view", menu.show_destinations_view)
+        router.add_callback("dest_delete", menu.show_delete_destinations)
+        router.add_callback("dest_lists", menu.show_manage_lists)
+        router.add_callback("bot_status", menu.show_bot_status)
+        router.add_callback("capacity_report", menu.show_capacity_report)
+        router.add_callback("analytics_report", menu.show_analytics)
+        router.add_callback("analytics_export", menu.export_analytics)
+        router.add_callback("link_channel", menu.show_link_channel_menu)
+        router.add_callback("show_channel_menu", menu.show_channel_menu)
+        router.add_callback("channel_link", menu.request_channel_input)
+        router.add_callback("channel_unlink", menu.unlink_channel)
+        router.add_callback("channel_mirror_toggle", menu.toggle_channel_mirror)
+        router.add_callback("list_management", menu.show_list_management_menu)
+        router.add_callback("list_view", menu.show_existing_lists)
+        router.add_callback("list_composite", menu.show_composite_lists)
+        router.add_callback("list_delete", menu.show_delete_lists_menu)
+        router.add_callback("show_messages_list", self.show_simple_messages_list)
+        router.add_callback("delete_messages", self.show_simple_delete_messages)
+        router.add_callback("broadcast_start", self.broadcaster.request_message)
+        router.add_callback("broadcast_abort", self.broadcaster.abort)
+
+        # Callbacks inline por prefijo
+        router.add_callback_prefix("list_create", self.list_creator.handle_list_callback)
+        router.add_callback_prefix("delete_list_", menu.handle_delete_list_callback)
+        router.add_callback_prefix("dest_del_", menu.handle_delete_destination_callback)
+        router.add_callback_prefix("dest_join_", self.membership.handle_join_add_callback)
+        router.add_callback_prefix("dest_dismiss_", self.membership.handle_join_dismiss_callback)
+        router.add_callback_prefix("auto_config_", self.message_manager.handle_auto_config_callback)
+        router.add_callback_prefix("broadcast_to:", self.broadcaster.handle_target_callback)
+        router.add_callback_prefix("broadcast_cancel:", self.broadcaster.handle_cancel_callback)
+        router.add_callback_prefix(PAGE_CALLBACK_PREFIX, self.handle_page_callback)
+
+        # Renderizadores paginados: tipo de cursor -> handler(update, context, cursor, direction)
+        self.page_renderers = {
+            'm': self.show_simple_messages_list,
+            'md': self.show_simple_delete_messages,
+            'd': menu.show_destinations_view,
+            'x': menu.show_delete_destinations,
+            'l': menu.show_existing_lists,
+            'lc': menu.show_composite_lists,
+            'ld': menu.show_delete_lists_menu,
+            'lm': menu.show_manage_lists,
+        }
+
+        # Teclado principal
+        router.add_keyboard(BTN_BACK_TO_MENU, menu.show_main_menu)
+        router.add_keyboard(BTN_VIEW_MESSAGES, self.show_simple_messages_list)
+        router.add_keyboard(BTN_DELETE_MESSAGES, self.show_simple_delete_messages)
+        router.add_keyboard(BTN_LINK_CHANNEL, menu.show_link_channel_menu)
+        router.add_keyboard(BTN_MESSAGE_MANAGEMENT, menu.show_message_management_menu)
+        router.add_keyboard(BTN_LIST_MANAGEMENT, menu.show_list_management_menu)
+        router.add_keyboard(BTN_BOT_STATUS, menu.show_bot_status)
+
+        # Estados de conversación
+        router.add_state('waiting_list_name', self.list_creator.handle_list_name_input)
+        router.add_state('waiting_channel_id', menu.handle_channel_input)
+        router.add_state('waiting_timezone', menu.handle_timezone_input)
+        router.add_state('awaiting_destination_input', menu.handle_destination_input)
+        router.add_state('awaiting_import_file', self.importer.handle_import_text)
+        router.add_state('awaiting_delete_selection', self.handle_delete_all_messages)
+        router.add_state_prefix('waiting_list_ids_', self._handle_simple_list_ids)
+        router.add_state_prefix('waiting_list_ids:', self._handle_menu_list_ids)
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Comando /start"""
         user_id = update.effective_user.id
         user = update.effective_user
 
         if is_admin(user_id, self.config):
-            from menu_manager import MenuManager
-            menu = MenuManager(self.config, self.config_file, self.messages_file)
-            await menu.show_main_menu(update, context)
+            await self.menu.show_main_menu(update, context)
             return
 
         await update.message.reply_text(
@@ -115,105 +238,77 @@ class BotHandler:
             logger.info(f"❌ Usuario {user_id} no es admin")
             return
 
+        if state == 'awaiting_import_file' and update.message and update.message.document:
+            await self.importer.handle_import_document(update, context)
+            return
+
+        if (update.message and not self._is_keyboard_command(update.message.text)
+                and self.broadcaster.accepts(user_id, update.message)):
+            await self.broadcaster.handle_message(update, context)
+            return
+
         if update.message and not self._is_keyboard_command(update.message.text):
             if (update.message.forward_from_chat or 
                 update.message.photo or update.message.video or 
                 update.message.document or update.message.audio):
-                
-                from message_manager import MessageManager
-                msg_manager = MessageManager(self.config)
+                await self.message_manager.handle_shared_message(update, context)
+                return
 
-                if update.message.forward_from_chat:
-                    origen = self.config.get('origen_chat_id')
-                    if origen and str(update.message.forward_from_chat.id) == str(origen):
-                        await self.ask_auto_config_message(update, context, msg_manager)
-                        return
+        if not update.message or not update.message.text:
+            return
 
-                await msg_manager.add_shared_message(update, context)
-                return
+        text = update.message.text
+        if self.router.is_keyboard_command(text):
+            # Un botón del teclado cancela cualquier flujo pendiente
+            self.clear_user_state(user_id)
+            await self.handle_keyboard_command(update, context, text)
+            return
 
         user_state = self.get_user_state(user_id)
         if user_state:
             await self.handle_conversation_state(update, context, user_state)
+            return
 
-        if update.message and update.message.text:
-            await self.handle_keyboard_command(update, context, update.message.text)
+        await self.handle_keyboard_command(update, context, text)
 
     async def handle_conversation_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, state):
         """Manejar estados de conversación"""
-        from menu_manager import MenuManager
-        menu = MenuManager(self.config, self.config_file, self.messages_file)
-
-        if state == 'awaiting_destination_input':
-            await self.handle_destination_input(update, context, update.message.text)
-        elif state == 'awaiting_message_add':
-            await self.handle_message_add_input(update, context, update.message.text)
-        elif state == 'awaiting_timezone_input':
-            await self.handle_timezone_input(update, context, update.message.text)
-        elif state == 'awaiting_destination_choice':
-            await self.handle_destination_choice(update, context, update.message.text)
-        elif state.startswith('awaiting_list_name'):
-            await self.list_creator.handle_list_name_input(update, context, update.message.text)
-        elif state.startswith('awaiting_list_ids'):
-            list_name = state.split('_', 3)[3]
-            await self.list_creator.handle_list_ids_input(update, context, update.message.text, list_name)
+        await self.router.dispatch_state(update, context, state, update.message.text)
 
     async def handle_keyboard_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text):
         """Manejar comandos del teclado principal"""
-        from menu_manager import MenuManager
-        menu = MenuManager(self.config, self.config_file, self.messages_file)
-
         logger.info(f"🔘 Comando recibido: '{text}'")
-
-        if text == "🔙 Volver al Menú":
-            await menu.show_main_menu(update, context)
-        elif text == "📝 Ver Mensajes":
-            await self.show_simple_messages_list(update, context)
-        elif text == "🗑️ Eliminar Mensajes":
-            await self.show_simple_delete_messages(update, context)
-        elif text == "🔗 Vincular Canal":
-            await menu.show_link_channel_menu(update, context)
-        elif text == "📝 Gestión de Mensajes":
-            await menu.show_message_management_menu(update, context)
-        elif text == "📋 Gestión de Listas":
-            await menu.show_list_management_menu(update, context)
-        elif text == "📄 Estado del Bot":
-            await menu.show_bot_status(update, context)
-        else:
-            logger.info(f"⚠️ Comando no reconocido: '{text}'")
+        await self.router.dispatch_keyboard(update, context, text)
 
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Manejar callbacks inline"""
         query = update.callback_query
         await query.answer()
-
-        data = query.data
-        if data.startswith('list_'):
-            await self.list_creator.handle_list_callback(update, context, data)
-            return
-        if data.startswith('delete_list_'):
-            await self.list_creator.handle_delete_list_callback(update, context, data)
+        await self.router.dispatch_callback(update, context, query.data)
+
+    async def handle_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
+        """Callbacks pg:<tipo>:<n|p>:<cursor> de todas las listas paginadas"""
+        kind, direction, cursor = parse_page_callback(data)
+        renderer = self.page_renderers.get(kind)
+        if not renderer:
+            logger.info(f"⚠️ Paginación desconocida: '{data}'")
             return
+        await renderer(update, context, cursor, direction)
+
+    async def _handle_simple_list_ids(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text, state):
+        """IDs para una lista creada con SimpleListCreator"""
+        list_name = state[len('waiting_list_ids_'):]
+        await self.list_creator.handle_list_ids_input(update, context, text, list_name)
 
-        from menu_manager import MenuManager
-        menu = MenuManager(self.config, self.config_file, self.messages_file)
-
-        if data == "main_menu":
-            await menu.show_main_menu(update, context)
-        elif data == "msg_management":
-            await menu.show_message_management_menu(update, context)
-        elif data == "destinations":
-            await menu.show_destinations_menu(update, context)
-        elif data == "bot_status":
-            await menu.show_bot_status(update, context)
-        elif data == "link_channel":
-            await menu.show_link_channel_menu(update, context)
-        elif data == "list_management":
-            await menu.show_list_management_menu(update, context)
+    async def _handle_menu_list_ids(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text, state):
+        """IDs para una lista creada desde MenuManager"""
+        list_name = state[len('waiting_list_ids:'):]
+        await self.menu.handle_list_ids_input(update, context, text, list_name)
+        self.clear_user_state(update.effective_user.id)
 
     def set_user_state(self, user_id, state):
         """Establecer estado"""
-        self.user_states[user_id] = state
+        self.user_states.set(user_id, state)
 
     def get_user_state(self, user_id):
         """Obtener estado"""
@@ -221,118 +316,72 @@ class BotHandler:
 
     def clear_user_state(self, user_id):
         """Limpiar estado"""
-        self.user_states.pop(user_id, None)
+        self.user_states.pop(user_id)
 
     def _is_keyboard_command(self, text):
         """Es teclado?"""
         if not text:
             return False
-        cmds = [
-            "🔗 Vincular Canal","📝 Gestión de Mensajes","📋 Gestión de Listas",
-            "📄 Estado del Bot","🔙 Volver al Menú","📥 Agregar Mensaje",
-            "📋 Ver Mensajes","🗑️ Eliminar Mensajes","➕ Crear Lista",
-            "👁️ Ver Listas","🗑️ Eliminar Listas","Cancelar","Atrás",
-            "🏠 Menú Principal","⚙️ Configuración","📊 Estadísticas"
-        ]
-        return text.strip() in cmds
-
-    async def show_simple_messages_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Mostrar mensajes simples"""
-        from utils import load_messages
-        from telegram import ReplyKeyboardMarkup
-        msgs = load_messages()
-        if not msgs:
-            kb = [["🔙 Volver al Menú"]]
-            rm = ReplyKeyboardMarkup(kb, resize_keyboard=True)
-            await update.message.reply_text("📝 **No hay mensajes**", reply_markup=rm, parse_mode='Markdown')
+        return text.strip() in KEYBOARD_COMMANDS or self.router.is_keyboard_command(text)
+
+    @staticmethod
+    def _format_message_line(position, m):
+        """Línea de resumen de un mensaje"""
+        dest = 'Todos' if m.get('dest_all', True) else m.get('dest_list', 'N/A')
+        return f"{position}. ID:{m['message_id']} | Int:{m.get('interval',600)}s | Dest:{dest}\n"
+
+    async def _send_message_page(self, update, kind, title, footer, cursor, direction):
+        """Renderizar una página de mensajes (nueva o editando la anterior)"""
+        store = self.message_store
+        if not len(store):
+            await update.effective_message.reply_text("📝 **No hay mensajes**", reply_markup=BACK_TO_MENU_KEYBOARD, parse_mode='Markdown')
             return
-        text = f"📝 **Mensajes Programados** ({len(msgs)})\n\n"
-        for i,m in enumerate(msgs,1):
-            txt = f"{i}. ID:{m['id']} | Int:{m.get('interval',600)}s | Dest:{len(m.get('destinations',[]))}\n"
-            text+=txt
-        rm = ReplyKeyboardMarkup([["🔙 Volver al Menú"]], resize_keyboard=True)
-        await update.message.reply_text(text, reply_markup=rm, parse_mode='Markdown')
-
-    async def show_simple_delete_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+        page, msgs = store.page(cursor, direction, MESSAGES_PAGE_SIZE)
+        text = f"{title} ({page.label()})\n\n"
+        for offset, m in enumerate(msgs, page.start + 1):
+            text += self._format_message_line(offset, m)
+        text += footer
+
+        nav = page_nav_row(kind, page)
+        if cursor is not None and update.callback_query:
+            await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup([nav]) if nav else None, parse_mode='Markdown')
+        elif nav:
+            await update.effective_message.reply_text(text, reply_markup=InlineKeyboardMarkup([nav]), parse_mode='Markdown')
+        else:
+            await update.effective_message.reply_text(text, reply_markup=BACK_TO_MENU_KEYBOARD, parse_mode='Markdown')
+
+    async def show_simple_messages_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
+        """Mostrar mensajes simples"""
+        await self._send_message_page(update, 'm', "📝 **Mensajes Programados**", "", cursor, direction)
+
+    async def show_simple_delete_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
         """Mostrar eliminar mensajes"""
-        from utils import load_messages
-        from telegram import ReplyKeyboardMarkup
-        msgs = load_messages()
-        if not msgs:
-            kb=[["🔙 Volver al Menú"]]
-            rm=ReplyKeyboardMarkup(kb, resize_keyboard=True)
-            await update.message.reply_text("📝 **No hay mensajes**", reply_markup=rm, parse_mode='Markdown')
-            return
-        text=f"🗑️ **Eliminar Mensajes** ({len(msgs)})\n\n"
-        for i,m in enumerate(msgs,1):
-            text+=f"{i}. ID:{m['id']} | Int:{m.get('interval',600)}s | Dest:{len(m.get('destinations',[]))}\n"
-        text+="\n💡 Escribe número o 'eliminar todos'"
-        rm=ReplyKeyboardMarkup([["🔙 Volver al Menú"]], resize_keyboard=True)
-        self.set_user_state(update.effective_user.id,'awaiting_delete_selection')
-        await update.message.reply_text(text, reply_markup=rm, parse_mode='Markdown')
+        if len(self.message_store):
+            self.set_user_state(update.effective_user.id,'awaiting_delete_selection')
+        await self._send_message_page(update, 'md', "🗑️ **Eliminar Mensajes**", "\n💡 Escribe número o 'eliminar todos'", cursor, direction)
 
     async def handle_delete_all_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text):
         """Eliminar mensajes"""
-        from utils import load_messages, save_messages
-        from telegram import ReplyKeyboardMarkup
-        msgs=load_messages()
+        msgs=self.message_store.all()
         if not msgs:
             await update.message.reply_text("📝 **No hay mensajes**")
             return
         uid=update.effective_user.id
         self.clear_user_state(uid)
         if text.lower()=='eliminar todos':
-            save_messages([])
-            rm=ReplyKeyboardMarkup([["🔙 Volver al Menú"]], resize_keyboard=True)
-            await update.message.reply_text("✅ **Todos eliminados**", reply_markup=rm, parse_mode='Markdown')
+            self.message_store.clear()
+            await update.message.reply_text("✅ **Todos eliminados**", reply_markup=BACK_TO_MENU_KEYBOARD, parse_mode='Markdown')
             return
         try:
             idx=int(text.strip())-1
-            from utils import save_messages
-            deleted=msgs.pop(idx)
-            save_messages(msgs)
-            rm=ReplyKeyboardMarkup([["🔙 Volver al Menú"]], resize_keyboard=True)
-            await update.message.reply_text(f"✅ **Eliminado ID:{deleted['id']}**", reply_markup=rm, parse_mode='Markdown')
+            deleted=self.message_store.remove_at(idx)
+            if not deleted:
+                raise IndexError(idx)
+            await update.message.reply_text(f"✅ **Eliminado ID:{deleted['message_id']}**", reply_markup=BACK_TO_MENU_KEYBOARD, parse_mode='Markdown')
         except:
             await update.message.reply_text("❌ **Formato inválido**", parse_mode='Markdown')
 
-    async def ask_auto_config_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE, msg_manager):
-        """Auto-configurar mensaje"""
-        context.user_data['pending_message']={
-            'forward_from_chat_id':update.message.forward_from_chat.id,
-            'forward_from_message_id':update.message.forward_from_message_id,
-            'message_content':update.message.text or "[Multimedia]"
-        }
-        kb=[
-            [InlineKeyboardButton("✅ Sí",callback_data="auto_config_yes")],
-            [InlineKeyboardButton("❌ No",callback_data="auto_config_no")]
-        ]
-        await update.message.reply_text("🔄 **Configurar mensaje?**",reply_markup=InlineKeyboardMarkup(kb),parse_mode='Markdown')
-
-    async def handle_auto_config_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
-        """Respuesta auto-config"""
-        q=update.callback_query
-        await q.answer()
-        if data=="auto_config_yes":
-            from message_manager import MessageManager
-            await MessageManager(self.config).auto_add_message(update,context)
-            await q.edit_message_text("✅ **Configurado**",parse_mode='Markdown')
-        else:
-            await q.edit_message_text("ℹ️ **Ignorado**",parse_mode='Markdown')
-
-    async def handle_new_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Bot agregado a grupo"""
-        uid=update.effective_user.id
-        if not is_admin(uid,self.config):return
-        chat=update.effective_chat
-        await update.message.reply_text(
-            f"🆕 **Bot agregado al grupo:**\\n\\n"
-            f"**Nombre:** {chat.title}\\n"
-            f"**ID:** `{chat.id}`\\n\\n"
-            "💡 Para usar este grupo:\n"
-            "1. Asegura permisos\n"
-            "2. Agrega ID a listas\n"
-            "3. El bot reenviará mensajes\n\n"
-            "📞 **Soporte:** @frankosmel",
-            parse_mode='Markdown'
-        )
+    async def handle_my_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cambios del estado del bot en grupos y canales"""
+        await self.membership.handle_my_chat_member(update, context)
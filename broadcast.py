@@ -0,0 +1,210 @@
+"""
+Difusión inmediata: un mensaje sale ya a todos los destinos o a una lista, con progreso en vivo y cancelación
+"""
+
+import asyncio
+import logging
+import time
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
+from delivery_slo import format_lag
+from keyboards import BROADCAST_ABORT_INLINE
+
+logger = logging.getLogger(__name__)
+
+# Estado de conversación mientras se espera el mensaje a difundir
+AWAITING_BROADCAST = 'awaiting_broadcast_message'
+
+class Broadcaster:
+    def __init__(self, config, user_states):
+        self.config = config
+        self.states = user_states
+        # Difusiones en curso: id -> {'cancel', 'sent', 'failed', 'total', 'started', 'label'}
+        self._jobs = {}
+        self._next_id = 1
+
+    @staticmethod
+    def _pending_key(user_id):
+        return f"{user_id}:pending_broadcast"
+
+    async def request_message(self, update, context):
+        """Pedir el mensaje a difundir"""
+        self.states.set(update.effective_user.id, AWAITING_BROADCAST)
+        await update.callback_query.edit_message_text(
+            "📣 **Difundir ahora**\n\n"
+            "Reenvía el mensaje del canal (o escríbelo aquí) y elige a quién enviarlo.\n"
+            "Sale al momento, fuera del ciclo y con prioridad sobre los envíos programados.",
+            reply_markup=BROADCAST_ABORT_INLINE,
+            parse_mode='Markdown'
+        )
+
+    def accepts(self, user_id, message):
+        """Si el mensaje es el que se espera para difundir (o una parte más de su álbum)"""
+        if self.states.get(user_id) == AWAITING_BROADCAST:
+            return True
+        pending = self.states.get(self._pending_key(user_id))
+        return bool(pending and message.media_group_id and pending.get('media_group_id') == message.media_group_id)
+
+    async def handle_message(self, update, context):
+        """Guardar el mensaje recibido y mostrar los destinos posibles"""
+        user_id = update.effective_user.id
+        message = update.message
+        key = self._pending_key(user_id)
+        if message.forward_from_chat:
+            from_chat_id, message_id, mode = message.forward_from_chat.id, message.forward_from_message_id, 'reenviar'
+        else:
+            # Mensaje escrito al bot: se copia sin la cabecera de reenvío
+            from_chat_id, message_id, mode = message.chat_id, message.message_id, 'copiar'
+
+        pending = self.states.get(key)
+        if pending and message.media_group_id and pending.get('media_group_id') == message.media_group_id:
+            pending['message_ids'].append(message_id)
+            self.states.set(key, pending)
+            return
+
+        self.states.pop(user_id)
+        lists = sorted(self.config.get('listas_destinos', {}))
+        self.states.set(key, {
+            'from_chat_id': from_chat_id,
+            'message_ids': [message_id],
+            'media_group_id': message.media_group_id,
+            'mode': mode,
+            'lists': lists
+        })
+        keyboard = [[InlineKeyboardButton("🌐 Todos los destinos", callback_data="broadcast_to:*")]]
+        keyboard += [[InlineKeyboardButton(f"📋 {name}", callback_data=f"broadcast_to:{i}")] for i, name in enumerate(lists)]
+        keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="broadcast_abort")])
+        await message.reply_text(
+            "🎯 **¿A quién se difunde?**",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+
+    async def abort(self, update, context):
+        """Descartar la difusión antes de enviarla"""
+        user_id = update.effective_user.id
+        self.states.pop(user_id)
+        self.states.pop(self._pending_key(user_id))
+        await update.callback_query.edit_message_text("ℹ️ **Difusión descartada**", parse_mode='Markdown')
+
+    def _build_message(self, pending, target):
+        """Mensaje de un solo uso (sin uid: no entra en el almacén ni en los ciclos)"""
+        message_ids = sorted(pending['message_ids'])
+        msg = {
+            "from_chat_id": pending['from_chat_id'],
+            "message_id": message_ids[0],
+            "dest_all": target is None,
+            "prioridad": 'alta',
+            "modo_envio": pending['mode']
+        }
+        if target is not None:
+            msg['dest_list'] = target
+        if len(message_ids) > 1:
+            msg['media_group_id'] = pending['media_group_id']
+            msg['message_ids'] = message_ids
+        return msg
+
+    async def handle_target_callback(self, update, context, data):
+        """broadcast_to:<*|n>: lanzar la difusión como trabajo aparte"""
+        query = update.callback_query
+        pending = self.states.pop(self._pending_key(update.effective_user.id))
+        if not pending:
+            await query.edit_message_text("⌛ **Solicitud caducada**, vuelve a empezar la difusión", parse_mode='Markdown')
+            return
+        forwarder = context.bot_data.get('forwarder')
+        if not forwarder:
+            await query.edit_message_text("❌ **El reenvío no está disponible**", parse_mode='Markdown')
+            return
+
+        choice = data[len('broadcast_to:'):]
+        target = None
+        if choice != '*':
+            try:
+                target = pending['lists'][int(choice)]
+            except (ValueError, IndexError):
+                await query.edit_message_text("❌ **Lista no válida**", parse_mode='Markdown')
+                return
+
+        job_id = self._next_id
+        self._next_id += 1
+        job = {'cancel': asyncio.Event(), 'sent': 0, 'failed': 0, 'total': 0, 'started': time.monotonic(),
+               'label': f"lista {escape_markdown(target)}" if target else "todos los destinos"}
+        self._jobs[job_id] = job
+        msg = self._build_message(pending, target)
+        logger.info(f"📣 Difusión {job_id}: mensaje {msg['message_id']} → {target or 'todos'}")
+        context.application.create_task(self._run(job_id, job, msg, forwarder, query.message))
+
+    async def handle_cancel_callback(self, update, context, data):
+        """broadcast_cancel:<id>: detener los envíos pendientes"""
+        try:
+            job = self._jobs.get(int(data[len('broadcast_cancel:'):]))
+        except ValueError:
+            job = None
+        if job:
+            job['cancel'].set()
+
+    def _progress_text(self, job, rate, state="⏳ En curso"):
+        """Texto del mensaje de progreso"""
+        done = job['sent'] + job['failed']
+        remaining = max(0, job['total'] - done)
+        elapsed = time.monotonic() - job['started']
+        # ETA con el ritmo observado; antes del primer envío, con la tasa configurada
+        eta = remaining * elapsed / done if done else remaining / rate
+        text = (
+            f"📣 **Difusión a {job['label']}** - {state}\n\n"
+            f"✔️ Enviados: {job['sent']}\n"
+            f"❌ Fallidos: {job['failed']}\n"
+            f"📦 Total: {job['total']}\n"
+        )
+        if remaining and not job['cancel'].is_set():
+            text += f"⏱️ Restante: {format_lag(eta)}\n"
+        return text
+
+    async def _edit(self, message, text, reply_markup=None):
+        """Editar el mensaje de progreso sin interrumpir la difusión si falla"""
+        try:
+            await message.edit_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        except TelegramError as e:
+            logger.warning(f"⚠️ No se pudo actualizar el progreso de la difusión: {e}")
+
+    async def _run(self, job_id, job, msg, forwarder, message):
+        """Enviar y refrescar el progreso como mucho una vez por intervalo"""
+        cancel_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🛑 Cancelar difusión", callback_data=f"broadcast_cancel:{job_id}")]
+        ])
+        interval = max(1, self.config.get('difusion_progreso_segundos', 3))
+
+        def progress(sent, failed, total):
+            job.update(sent=sent, failed=failed, total=total)
+
+        send = asyncio.ensure_future(forwarder.send_now(msg, job['cancel'], progress, urgent=True))
+        # Dejar que la difusión planifique para conocer el total antes de la primera edición
+        await asyncio.sleep(0)
+        last_text = None
+        try:
+            while not send.done():
+                text = self._progress_text(job, forwarder.rate_limiter.rate)
+                if text != last_text:
+                    await self._edit(message, text, cancel_markup)
+                    last_text = text
+                await asyncio.wait({send}, timeout=interval)
+            send.result()
+        except Exception as e:
+            logger.error(f"❌ Difusión {job_id}: {e}")
+            await self._edit(message, self._progress_text(job, forwarder.rate_limiter.rate, "❌ Interrumpida"))
+            return
+        finally:
+            self._jobs.pop(job_id, None)
+
+        unfinished = job['sent'] + job['failed'] < job['total']
+        if forwarder.stopping and (unfinished or not job['total']):
+            # Una difusión no se guarda en el checkpoint: lo pendiente se descarta al apagar
+            state = "⏹️ Interrumpida por apagado"
+        elif not job['total']:
+            await self._edit(message, f"⚠️ **Sin destinos** para la difusión a {job['label']}")
+            return
+        else:
+            state = "🛑 Cancelada" if job['cancel'].is_set() and unfinished else "✅ Completada"
+        logger.info(f"📣 Difusión {job_id}: {state} - {job['sent']} ✔️, {job['failed']} ❌ de {job['total']}")
+        await self._edit(message, self._progress_text(job, forwarder.rate_limiter.rate, state))
@@ -0,0 +1,220 @@
+"""
+Horarios de calendario por mensaje: expresiones cron y ventanas "cada N minutos entre HH:MM y HH:MM"
+evaluadas en la zona horaria configurada (con cambios de horario incluidos)
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta
+import pytz
+from apscheduler.triggers.cron import CronTrigger
+
+logger = logging.getLogger(__name__)
+
+# Tope de iteraciones al recorrer disparos perdidos de un calendario
+MAX_MISSED_SCAN = 10000
+# Días de la semana en cron estándar (0 y 7 = domingo) y sus nombres en APScheduler
+DAY_NAMES = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+class ScheduleError(ValueError):
+    pass
+
+class IntervalSchedule:
+    """Cada N segundos desde el último envío"""
+    calendar = False
+
+    def __init__(self, interval):
+        self.interval = interval
+
+    def first(self, now):
+        """Primer envío de un mensaje nuevo: ya"""
+        return now
+
+    def next_after(self, moment):
+        """Siguiente envío tras 'moment'"""
+        return moment + self.interval
+
+    def missed(self, first, now, keep):
+        """(últimos 'keep' disparos perdidos entre first y now, número total)"""
+        count = int((now - first) // self.interval) + 1
+        last = first + (count - 1) * self.interval
+        return [last - i * self.interval for i in range(min(count, keep) - 1, -1, -1)], count
+
+class CalendarSchedule(ABC):
+    """Base de los horarios de calendario: el primer envío es el siguiente disparo"""
+    calendar = True
+
+    def first(self, now):
+        return self.next_after(now)
+
+    @abstractmethod
+    def next_after(self, moment):
+        """Siguiente disparo posterior a 'moment' (timestamp), o inf si no hay más"""
+
+    def missed(self, first, now, keep):
+        fires = deque([first], maxlen=keep)
+        count = 1
+        moment = self.next_after(first)
+        while moment <= now and count < MAX_MISSED_SCAN:
+            fires.append(moment)
+            count += 1
+            moment = self.next_after(moment)
+        return list(fires), count
+
+def _day_number(value):
+    """Día de la semana en cron estándar (nombre o número, 7 = domingo) -> 0..6"""
+    value = value.lower()
+    if value in DAY_NAMES:
+        return DAY_NAMES.index(value)
+    if not value.isdigit() or int(value) > 7:
+        raise ScheduleError(f"Día de la semana inválido '{value}'")
+    return int(value) % 7
+
+def standard_day_of_week(field):
+    """Campo día_semana de cron estándar -> lista de nombres para APScheduler, que cuenta el 0 como lunes"""
+    if field == '*':
+        return field
+    days = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step.isdigit() else 1
+        if part == '*':
+            first, last = 0, 6
+        elif '-' in part:
+            start, end = part.split('-', 1)
+            # El domingo al final de un rango cuenta como 7 (p. ej. 5-7 o fri-sun)
+            first, last = _day_number(start), 7 if end.lower() in ('7', 'sun') else _day_number(end)
+        else:
+            first = last = _day_number(part)
+        if last < first:
+            raise ScheduleError(f"Rango de días inválido '{part}'")
+        days.update(day % 7 for day in range(first, last + 1, step))
+    return ','.join(DAY_NAMES[day] for day in sorted(days))
+
+class CronSchedule(CalendarSchedule):
+    """Expresión cron estándar de 5 campos (minuto hora día mes día_semana), p. ej. '0 9,18 * * 1-5'"""
+
+    def __init__(self, expression, tz):
+        self.tz = tz
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ScheduleError(f"Cron inválido '{expression}': se esperan 5 campos")
+        try:
+            fields[4] = standard_day_of_week(fields[4])
+            self.trigger = CronTrigger.from_crontab(' '.join(fields), timezone=tz)
+        except ValueError as e:
+            raise ScheduleError(f"Cron inválido '{expression}': {e}")
+        # Fechas imposibles (p. ej. 30 de febrero) no se disparan nunca
+        if self.trigger.get_next_fire_time(None, datetime.now(tz)) is None:
+            raise ScheduleError(f"Cron sin disparos '{expression}'")
+
+    def next_after(self, moment):
+        # Los disparos caen en segundos exactos: buscar desde el segundo siguiente
+        start = datetime.fromtimestamp(int(moment) + 1, self.tz)
+        fire = self.trigger.get_next_fire_time(None, start)
+        return fire.timestamp() if fire else float('inf')
+
+class WindowSchedule(CalendarSchedule):
+    """Cada N minutos entre 'desde' y 'hasta' (hora local; si 'hasta' es menor, la ventana acaba al día siguiente),
+    opcionalmente solo ciertos días de inicio (1 = lunes)"""
+
+    def __init__(self, every_minutes, start, end, days, tz):
+        if not every_minutes or every_minutes <= 0:
+            raise ScheduleError("'cada_minutos' debe ser mayor que 0")
+        if days and not all(isinstance(d, int) and 1 <= d <= 7 for d in days):
+            raise ScheduleError(f"'dias' debe tener días del 1 (lunes) al 7 (domingo): {days}")
+        self.step = timedelta(minutes=every_minutes)
+        self.start = self._parse_time(start or '00:00')
+        self.end = self._parse_time(end or '23:59')
+        self.days = set(days) if days else None
+        self.tz = tz
+
+    @staticmethod
+    def _parse_time(value):
+        try:
+            return datetime.strptime(value, '%H:%M').time()
+        except ValueError:
+            raise ScheduleError(f"Hora inválida '{value}' (formato HH:MM)")
+
+    def _fire(self, moment):
+        """Timestamp de una hora local; normalize corrige las horas que no existen al adelantar el reloj"""
+        return self.tz.normalize(self.tz.localize(moment)).timestamp()
+
+    def _first_fire_after(self, day, after):
+        """Primer disparo de la ventana que empieza 'day' posterior a 'after', o None"""
+        if self.days and day.isoweekday() not in self.days:
+            return None
+        start = datetime.combine(day, self.start)
+        end = datetime.combine(day + timedelta(days=1) if self.end < self.start else day, self.end)
+        count = (end - start) // self.step + 1
+        # Los timestamps crecen con la hora local (también en los cambios de hora): búsqueda binaria
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._fire(start + middle * self.step) > after:
+                high = middle
+            else:
+                low = middle + 1
+        return self._fire(start + low * self.step) if low < count else None
+
+    def next_after(self, moment):
+        day = datetime.fromtimestamp(moment, self.tz).date()
+        # Desde el día anterior: una ventana nocturna empezada ayer puede seguir abierta
+        for offset in range(-1, 8):
+            fire = self._first_fire_after(day + timedelta(days=offset), moment)
+            if fire is not None:
+                return fire
+        return float('inf')
+
+def build_schedule(spec, tz):
+    """Horario de calendario a partir del campo 'horario' de un mensaje"""
+    if 'cron' in spec:
+        return CronSchedule(spec['cron'], tz)
+    if 'cada_minutos' in spec:
+        return WindowSchedule(spec['cada_minutos'], spec.get('desde'), spec.get('hasta'), spec.get('dias'), tz)
+    raise ScheduleError(f"Horario sin 'cron' ni 'cada_minutos': {spec}")
+
+class ScheduleCache:
+    def __init__(self, config):
+        self.config = config
+        self.timezone_name = None
+        self.tz = pytz.utc
+        # uid -> (horario serializado, objeto): se recompila solo si el horario o la zona horaria cambian
+        self._cache = {}
+        self.refresh_timezone()
+
+    def refresh_timezone(self):
+        """Seguir la zona horaria de la configuración; True si cambió (hay que recalcular los próximos disparos)"""
+        timezone_name = self.config.get('timezone', 'Europe/Madrid')
+        if timezone_name == self.timezone_name:
+            return False
+        changed = self.timezone_name is not None
+        self.timezone_name = timezone_name
+        try:
+            self.tz = pytz.timezone(timezone_name)
+        except pytz.UnknownTimeZoneError:
+            self.tz = pytz.utc
+        self._cache.clear()
+        return changed
+
+    def get(self, msg, interval):
+        """Horario de un mensaje: su calendario si tiene 'horario', si no el intervalo"""
+        spec = msg.get('horario')
+        if not spec:
+            return IntervalSchedule(interval)
+        key = json.dumps(spec, sort_keys=True)
+        # Los mensajes aún sin registrar (p. ej. al comprobar la capacidad) no tienen uid ni entran en la caché
+        uid = msg.get('uid')
+        cached = self._cache.get(uid)
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            schedule = build_schedule(spec, self.tz)
+        except ScheduleError as e:
+            logger.warning(f"⚠️ Mensaje {msg.get('message_id')}: {e}; se usa su intervalo")
+            schedule = IntervalSchedule(interval)
+        if uid is not None:
+            self._cache[uid] = (key, schedule)
+        return schedule
@@ -0,0 +1,95 @@
+"""
+Espejo en vivo del canal origen: cada publicación nueva sale a los destinos al momento
+"""
+
+import asyncio
+import logging
+from utils import is_source_chat
+from planner import check_capacity
+
+logger = logging.getLogger(__name__)
+
+class ChannelMirror:
+    def __init__(self, config, forwarder, message_store):
+        self.config = config
+        self.forwarder = forwarder
+        self.store = message_store
+        # Álbumes en espera: media_group_id -> mensaje con las partes recibidas
+        self._albums = {}
+
+    def _is_source(self, chat):
+        """Si el chat es el canal origen vinculado"""
+        return is_source_chat(chat, self.config)
+
+    def _build_message(self, post):
+        """Mensaje programable a partir de una publicación del canal"""
+        msg = {
+            "from_chat_id": post.chat.id,
+            "message_id": post.message_id,
+            "interval": self.config.get('espejo_intervalo', self.config.get('intervalo_global', 60)),
+            "dest_all": True,
+            "active": True,
+            "send_count": 0
+        }
+        list_name = self.config.get('espejo_lista')
+        if list_name:
+            msg['dest_all'] = False
+            msg['dest_list'] = list_name
+        return msg
+
+    async def handle_channel_post(self, update, context):
+        """Publicación nueva en un canal: replicarla si viene del canal origen"""
+        post = update.channel_post
+        if not post or not self.config.get('espejo_canal', False) or not self._is_source(post.chat):
+            return
+
+        if post.media_group_id:
+            # Las partes de un álbum llegan por separado: se juntan y salen como una unidad
+            album = self._albums.get(post.media_group_id)
+            if album is not None:
+                album['message_ids'].append(post.message_id)
+                return
+            msg = self._build_message(post)
+            msg['media_group_id'] = post.media_group_id
+            msg['message_ids'] = [post.message_id]
+            self._albums[post.media_group_id] = msg
+            context.application.create_task(self._flush_album(post, msg, context))
+            return
+
+        await self._publish(post, self._build_message(post), context)
+
+    async def _flush_album(self, post, msg, context):
+        """Esperar a que lleguen todas las partes del álbum y publicarlo"""
+        await asyncio.sleep(self.config.get('espejo_album_espera_segundos', 2))
+        self._albums.pop(msg['media_group_id'], None)
+        msg['message_ids'].sort()
+        msg['message_id'] = msg['message_ids'][0]
+        await self._publish(post, msg, context)
+
+    async def _publish(self, post, msg, context):
+        """Registrar (opcional) y repartir una publicación o álbum"""
+        if self.config.get('espejo_registrar', False):
+            if self.store.find(post.chat.id, msg['message_id']):
+                return
+            warning, reject = check_capacity(self.config, self.store.all() + [msg])
+            if warning:
+                logger.warning(f"🪞 Publicación {msg['message_id']}: {warning}")
+            if reject:
+                # Sin capacidad para otro mensaje periódico: se replica una vez sin registrarlo
+                logger.warning(f"🪞 Publicación {msg['message_id']} no registrada (rechazar_config_inviable)")
+            else:
+                # Registrado también para los reenvíos periódicos
+                self.store.add(msg)
+                if not self.forwarder.is_running:
+                    self.forwarder.start_forwarding(context.application)
+
+        if self.forwarder.application is None:
+            self.forwarder.application = context.application
+        # El reparto corre en segundo plano para no frenar el resto de updates
+        context.application.create_task(self._mirror(post, msg))
+
+    async def _mirror(self, post, msg):
+        """Enviar la publicación a sus destinos por el motor de reenvío"""
+        successful, failed = await self.forwarder.send_now(msg)
+        album = f" (álbum de {len(msg['message_ids'])})" if msg.get('message_ids') else ""
+        logger.info(f"🪞 Publicación {msg['message_id']}{album} replicada: {successful} ✔️, {failed} ❌")
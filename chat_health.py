@@ -0,0 +1,136 @@
+"""
+Estado de salud de los destinos: tipo, título, miembros y permiso de publicación con TTL
+"""
+
+import logging
+import time
+from chat_validation import inspect_chats
+from send_queue import RateLimiter
+from utils import load_state_file, save_state_file
+
+logger = logging.getLogger(__name__)
+
+def all_destinations(config):
+    """Destinos generales y de todas las listas, sin repetir"""
+    destinos = set(config.get('destinos', []))
+    for lista in config.get('listas_destinos', {}).values():
+        destinos.update(lista)
+    return destinos
+
+class ChatHealthCache:
+    def __init__(self, ttl=21600, persist_file=None):
+        self.ttl = ttl
+        self.persist_file = persist_file
+        # chat_id -> info de inspect_chat más 'checked_at', si falló 'error' y, si se descubrió
+        # por my_chat_member y el admin aún no decidió si agregarlo, 'pending'
+        self._entries = {}
+        self._dirty = False
+        self.last_sweep = None
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, chat_id):
+        """Info vigente del chat, o None si no hay o caducó"""
+        entry = self._entries.get(chat_id)
+        if entry is None or time.time() - entry['checked_at'] > self.ttl:
+            return None
+        return entry
+
+    def can_post(self, chat_id):
+        """True/False si se sabe con información vigente, None si es desconocido"""
+        entry = self.get(chat_id)
+        return None if entry is None else entry.get('can_post', False)
+
+    def title(self, chat_id):
+        """Último título conocido (aunque haya caducado) o None"""
+        entry = self._entries.get(chat_id)
+        return entry.get('title') if entry else None
+
+    def update(self, chat_id, info):
+        """Guardar el resultado de una inspección"""
+        entry = dict(info)
+        if 'error' in entry:
+            # Conservar el título conocido aunque el chat ya no sea accesible
+            entry.setdefault('title', self.title(chat_id))
+            entry['can_post'] = False
+        entry['checked_at'] = time.time()
+        self._entries[chat_id] = entry
+        self._dirty = True
+
+    def mark_failed(self, chat_id, reason):
+        """Registrar que un envío falló por permisos o chat inexistente"""
+        self.update(chat_id, {'error': reason})
+
+    def resolve_pending(self, chat_id, keep=True):
+        """El admin agregó (keep) o descartó un chat descubierto pendiente"""
+        entry = self._entries.get(chat_id)
+        if entry is None or not entry.get('pending'):
+            return
+        if keep:
+            del entry['pending']
+        else:
+            del self._entries[chat_id]
+        self._dirty = True
+
+    def forget(self, live_chat_ids):
+        """Eliminar chats que ya no son destinos (los descubiertos pendientes se conservan)"""
+        live_chat_ids = set(live_chat_ids)
+        for chat_id in [c for c, entry in self._entries.items() if c not in live_chat_ids and not entry.get('pending')]:
+            del self._entries[chat_id]
+            self._dirty = True
+
+    def summary(self):
+        """Conteo de destinos por estado"""
+        now = time.time()
+        counts = {'ok': 0, 'sin_permiso': 0, 'caducados': 0}
+        for entry in self._entries.values():
+            if entry.get('pending'):
+                continue
+            if now - entry['checked_at'] > self.ttl:
+                counts['caducados'] += 1
+            elif entry.get('can_post'):
+                counts['ok'] += 1
+            else:
+                counts['sin_permiso'] += 1
+        return counts
+
+    async def sweep(self, bot, config):
+        """Revisar en paralelo todos los destinos dentro del presupuesto de consultas"""
+        destinos = all_destinations(config)
+        rate_limiter = RateLimiter(config.get('salud_consultas_por_segundo', 5), config.get('salud_concurrencia', 5))
+        started = time.monotonic()
+        results = await inspect_chats(bot, destinos, config.get('salud_concurrencia', 5), rate_limiter)
+        for chat_id, info in results.items():
+            self.update(chat_id, info)
+        self.forget(destinos)
+        self.last_sweep = time.time()
+        self.save()
+
+        blocked = [chat_id for chat_id, info in results.items() if not info.get('can_post')]
+        for chat_id in blocked:
+            logger.warning(f"⚠️ Destino {chat_id} sin permiso de publicación: {results[chat_id].get('error', results[chat_id].get('status'))}")
+        logger.info(f"🩺 Revisión de destinos: {len(destinos) - len(blocked)}/{len(destinos)} pueden publicar ({time.monotonic() - started:.1f}s)")
+        return results
+
+    def _load(self):
+        """Restaurar la caché desde disco"""
+        if not self.persist_file:
+            return
+        data = load_state_file(self.persist_file)
+        if data is None:
+            return
+        self._entries = {int(chat_id): entry for chat_id, entry in data.get('chats', {}).items()}
+        self.last_sweep = data.get('last_sweep')
+
+    def save(self):
+        """Persistir la caché si hubo cambios"""
+        if not self.persist_file or not self._dirty:
+            return
+        data = {
+            'last_sweep': self.last_sweep,
+            'chats': {str(chat_id): entry for chat_id, entry in self._entries.items()},
+        }
+        if save_state_file(self.persist_file, data, ensure_ascii=False):
+            self._dirty = False
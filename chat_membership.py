@@ -0,0 +1,179 @@
+"""
+Descubrimiento incremental de destinos a partir de las actualizaciones my_chat_member
+"""
+
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
+from utils import save_config
+from chat_health import all_destinations
+from chat_validation import member_can_post
+from planner import check_capacity
+
+logger = logging.getLogger(__name__)
+
+# Estados en los que el bot no está en el chat
+ABSENT_STATUSES = ('left', 'kicked')
+
+class MembershipTracker:
+    def __init__(self, config, health, message_store=None):
+        self.config = config
+        # Registro de destinos (título, tipo, permiso) compartido con forwarder y menús
+        self.health = health
+        # Mensajes programados, para comprobar la capacidad al sumar destinos
+        self.message_store = message_store
+
+    def _check_capacity(self):
+        """(aviso, rechazar) de capacidad con la configuración actual"""
+        if self.message_store is None:
+            return None, False
+        return check_capacity(self.config, self.message_store.all())
+
+    def _add_to_default_list(self, chat_id):
+        """Agregar el chat a 'lista_por_defecto'; devuelve (nombre o None, aviso de capacidad)"""
+        list_name = self.config.get('lista_por_defecto')
+        if not list_name:
+            return None, None
+        listas = self.config.setdefault('listas_destinos', {})
+        lista = listas.setdefault(list_name, [])
+        if chat_id in lista:
+            return list_name, None
+        lista.append(chat_id)
+        warning, reject = self._check_capacity()
+        if reject:
+            lista.remove(chat_id)
+            if not lista:
+                del listas[list_name]
+            return None, warning
+        save_config(self.config)
+        self.health.resolve_pending(chat_id)
+        self.health.save()
+        return list_name, warning
+
+    def _remove_everywhere(self, chat_id):
+        """Quitar el chat de destinos y de todas las listas; devuelve si estaba"""
+        removed = False
+        destinos = self.config.get('destinos', [])
+        if chat_id in destinos:
+            destinos.remove(chat_id)
+            removed = True
+        for lista in self.config.get('listas_destinos', {}).values():
+            if chat_id in lista:
+                lista.remove(chat_id)
+                removed = True
+        if removed:
+            save_config(self.config)
+        return removed
+
+    async def handle_my_chat_member(self, update, context):
+        """El estado del bot cambió en un chat: actualizar registro sin llamadas a la API"""
+        change = update.my_chat_member
+        chat = change.chat
+        if chat.type == 'private':
+            return
+
+        old, new = change.old_chat_member, change.new_chat_member
+        was_present = old.status not in ABSENT_STATUSES
+        is_present = new.status not in ABSENT_STATUSES
+        can_post = is_present and member_can_post(chat, new)
+        previous = self.health.get(chat.id) or {}
+
+        info = {
+            'type': chat.type,
+            'title': chat.title or chat.username or str(chat.id),
+            'member_count': previous.get('member_count'),
+            'can_post': can_post,
+            'status': new.status,
+        }
+        if not is_present:
+            info['error'] = "Bot eliminado del chat"
+        elif chat.id not in all_destinations(self.config):
+            # Se conserva en el registro (título incluido) hasta que el admin lo agregue o lo descarte
+            info['pending'] = True
+        self.health.update(chat.id, info)
+        self.health.save()
+
+        title = escape_markdown(info['title'])
+        admin_id = self.config.get('admin_id')
+        added_by_admin = change.from_user and change.from_user.id == admin_id
+        reply_markup = None
+
+        if is_present and not was_present:
+            logger.info(f"🆕 Bot agregado a {chat.id} ({info['title']}) - estado {new.status}")
+            list_name, warning = self._add_to_default_list(chat.id) if added_by_admin else (None, None)
+            text = f"🆕 **Bot agregado a un chat**\n\n**Nombre:** {title}\n**ID:** `{chat.id}`\n"
+            if list_name:
+                text += f"\n✅ Agregado automáticamente a la lista **{escape_markdown(list_name)}**"
+            elif warning:
+                text += f"\n❌ No se agregó a la lista **{escape_markdown(self.config['lista_por_defecto'])}**"
+            if warning:
+                text += f"\n{warning}"
+            if not list_name and chat.id not in all_destinations(self.config):
+                reply_markup = InlineKeyboardMarkup([
+                    [InlineKeyboardButton("➕ Agregar a destinos", callback_data=f"dest_join_{chat.id}"),
+                     InlineKeyboardButton("🙈 Descartar", callback_data=f"dest_dismiss_{chat.id}")]
+                ])
+            if not can_post:
+                text += "\n⚠️ El bot aún no puede publicar aquí: revisa sus permisos"
+        elif was_present and not is_present:
+            logger.info(f"👋 Bot eliminado de {chat.id} ({info['title']}) - estado {new.status}")
+            text = f"👋 **Bot eliminado de un chat**\n\n**Nombre:** {title}\n**ID:** `{chat.id}`\n"
+            if self.config.get('eliminar_destinos_al_salir', False) and self._remove_everywhere(chat.id):
+                text += "\n🗑️ Quitado de destinos y listas"
+            elif chat.id in all_destinations(self.config):
+                text += "\n⏸️ Se omite en los envíos hasta que el bot vuelva a poder publicar"
+        elif can_post != previous.get('can_post', can_post):
+            logger.info(f"🔧 Permisos del bot en {chat.id}: puede publicar = {can_post}")
+            icon = "🟢 Ya puede publicar" if can_post else "🔴 Ya no puede publicar"
+            text = f"🔧 **Permisos actualizados**\n\n**Nombre:** {title}\n**ID:** `{chat.id}`\n\n{icon}"
+        else:
+            return
+
+        if admin_id:
+            try:
+                await context.bot.send_message(admin_id, text, reply_markup=reply_markup, parse_mode='Markdown')
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo avisar al admin: {e}")
+
+    async def handle_join_add_callback(self, update, context, data):
+        """Callback dest_join_<id>: agregar un chat descubierto a los destinos"""
+        try:
+            chat_id = int(data.replace("dest_join_", "", 1))
+        except ValueError:
+            return
+        destinos = self.config.setdefault('destinos', [])
+        title = self.health.title(chat_id) or str(chat_id)
+        warning = None
+        if chat_id not in destinos:
+            destinos.append(chat_id)
+            warning, reject = self._check_capacity()
+            if reject:
+                destinos.remove(chat_id)
+                await update.callback_query.edit_message_text(
+                    f"❌ **Destino rechazado**\n\n{escape_markdown(title)} (`{chat_id}`)\n\n{warning}",
+                    parse_mode='Markdown'
+                )
+                return
+            save_config(self.config)
+        self.health.resolve_pending(chat_id)
+        self.health.save()
+        await update.callback_query.edit_message_text(
+            f"✅ **Destino agregado**\n\n{escape_markdown(title)} (`{chat_id}`)\nTotal destinos: {len(destinos)}"
+            + (f"\n\n{warning}" if warning else ""),
+            parse_mode='Markdown'
+        )
+
+    async def handle_join_dismiss_callback(self, update, context, data):
+        """Callback dest_dismiss_<id>: descartar un chat descubierto sin agregarlo"""
+        try:
+            chat_id = int(data.replace("dest_dismiss_", "", 1))
+        except ValueError:
+            return
+        title = self.health.title(chat_id) or str(chat_id)
+        if chat_id not in all_destinations(self.config):
+            self.health.resolve_pending(chat_id, keep=False)
+            self.health.save()
+        await update.callback_query.edit_message_text(
+            f"🙈 **Chat descartado**\n\n{escape_markdown(title)} (`{chat_id}`)",
+            parse_mode='Markdown'
+        )
@@ -0,0 +1,77 @@
+"""
+Validación concurrente de chats destino con getChat/getChatMember
+"""
+
+import asyncio
+import logging
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+def member_can_post(chat, member):
+    """Si el bot puede publicar en el chat según su estado de miembro"""
+    if member.status in ('left', 'kicked'):
+        return False
+    if member.status == 'creator':
+        return True
+    if chat.type == 'channel':
+        return member.status == 'administrator' and bool(getattr(member, 'can_post_messages', False))
+    if member.status == 'administrator':
+        return True
+    if member.status == 'restricted':
+        return bool(getattr(member, 'can_send_messages', False))
+    permissions = chat.permissions
+    return permissions is None or permissions.can_send_messages is not False
+
+async def inspect_chat(bot, chat_id, rate_limiter=None):
+    """Datos del chat y del bot en él: dict con type, title, member_count y can_post
+    (tres llamadas a la API, cada una con su token del limitador)"""
+    async def call(method, *args):
+        if rate_limiter is not None:
+            await rate_limiter.acquire()
+        return await method(*args)
+
+    chat = await call(bot.get_chat, chat_id)
+    member = await call(bot.get_chat_member, chat_id, bot.id)
+    try:
+        member_count = await call(bot.get_chat_member_count, chat_id)
+    except TelegramError:
+        member_count = None
+    return {
+        'type': chat.type,
+        'title': chat.title or chat.username or str(chat_id),
+        'member_count': member_count,
+        'can_post': member_can_post(chat, member),
+        'status': member.status,
+    }
+
+async def inspect_chats(bot, chat_ids, concurrency=10, rate_limiter=None):
+    """Inspeccionar chats en paralelo (acotado); devuelve {chat_id: info} o {chat_id: {'error': motivo}}"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = {}
+
+    async def check(chat_id):
+        async with semaphore:
+            try:
+                results[chat_id] = await inspect_chat(bot, chat_id, rate_limiter)
+            except TelegramError as e:
+                results[chat_id] = {'error': str(e)}
+            except Exception as e:
+                logger.error(f"❌ Error validando {chat_id}: {e}")
+                results[chat_id] = {'error': f"Error inesperado: {e}"}
+
+    await asyncio.gather(*(check(chat_id) for chat_id in chat_ids))
+    return results
+
+async def validate_chats(bot, chat_ids, concurrency=10, rate_limiter=None):
+    """Validar chats en paralelo (acotado); devuelve (info de válidos, motivos de rechazo)"""
+    valid = {}
+    rejected = {}
+    for chat_id, info in (await inspect_chats(bot, chat_ids, concurrency, rate_limiter)).items():
+        if 'error' in info:
+            rejected[chat_id] = info['error']
+        elif info['can_post']:
+            valid[chat_id] = info
+        else:
+            rejected[chat_id] = f"Sin permiso para publicar ({info['status']})"
+    return valid, rejected
@@ -0,0 +1,193 @@
+"""
+Analítica de entregas por destino: buffers circulares y agregados por minuto, hora y día
+"""
+
+import csv
+import io
+import logging
+import time
+from collections import deque
+from telegram.error import RetryAfter, Forbidden, TimedOut, NetworkError, BadRequest
+from utils import load_state_file, save_state_file
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+# Granularidades de los agregados: clave -> (segundos por bucket, buckets retenidos por defecto)
+GRANULARITIES = {'m': (60, 60), 'h': (3600, 48), 'd': (86400, 30)}
+
+def classify_error(error):
+    """Clase de error de un envío fallido"""
+    if isinstance(error, RetryAfter):
+        return 'limite'
+    if isinstance(error, Forbidden):
+        return 'prohibido'
+    if isinstance(error, TimedOut):
+        return 'timeout'
+    if isinstance(error, NetworkError) and not isinstance(error, BadRequest):
+        return 'red'
+    if isinstance(error, BadRequest):
+        return 'solicitud'
+    return 'otro'
+
+def _new_bucket(start):
+    """Bucket de agregado: inicio, envíos, correctos, suma de latencias y errores por clase"""
+    return {'start': start, 'sent': 0, 'ok': 0, 'latency': 0.0, 'errors': {}}
+
+class DestinationSeries:
+    def __init__(self, samples, retention):
+        # Últimos envíos: (timestamp, latencia, clase)
+        self.samples = deque(maxlen=samples)
+        self.rollups = {key: deque(maxlen=retention[key]) for key in GRANULARITIES}
+
+    def record(self, now, latency, outcome):
+        """Añadir un envío al buffer y a los agregados"""
+        self.samples.append((now, latency, outcome))
+        for key, (seconds, _) in GRANULARITIES.items():
+            buckets = self.rollups[key]
+            start = int(now // seconds * seconds)
+            if not buckets or buckets[-1]['start'] != start:
+                buckets.append(_new_bucket(start))
+            bucket = buckets[-1]
+            bucket['sent'] += 1
+            bucket['latency'] += latency
+            if outcome == OK:
+                bucket['ok'] += 1
+            else:
+                bucket['errors'][outcome] = bucket['errors'].get(outcome, 0) + 1
+
+    def window(self, key, since):
+        """Totales de los buckets posteriores a 'since'"""
+        total = _new_bucket(since)
+        for bucket in self.rollups[key]:
+            if bucket['start'] + GRANULARITIES[key][0] <= since:
+                continue
+            total['sent'] += bucket['sent']
+            total['ok'] += bucket['ok']
+            total['latency'] += bucket['latency']
+            for outcome, count in bucket['errors'].items():
+                total['errors'][outcome] = total['errors'].get(outcome, 0) + count
+        return total
+
+    def p95_latency(self):
+        """Percentil 95 de latencia de los últimos envíos"""
+        latencies = sorted(latency for _, latency, _ in self.samples)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+class DestinationAnalytics:
+    def __init__(self, samples=50, retention=None, persist_file=None):
+        self.samples = samples
+        self.retention = {key: default for key, (_, default) in GRANULARITIES.items()}
+        self.retention.update(retention or {})
+        self.persist_file = persist_file
+        self._series = {}
+        self._load()
+
+    def __len__(self):
+        return len(self._series)
+
+    def chat_ids(self):
+        """Destinos con datos registrados"""
+        return list(self._series)
+
+    def _get(self, chat_id):
+        series = self._series.get(chat_id)
+        if series is None:
+            series = DestinationSeries(self.samples, self.retention)
+            self._series[chat_id] = series
+        return series
+
+    def record(self, chat_id, latency, outcome=OK, now=None):
+        """Registrar un envío: latencia en segundos y 'ok' o clase de error"""
+        self._get(chat_id).record(now or time.time(), latency, outcome)
+
+    def summary(self, chat_id, hours=24):
+        """Resumen de un destino en las últimas horas"""
+        series = self._series.get(chat_id)
+        if series is None:
+            return None
+        total = series.window('h', time.time() - hours * 3600)
+        sent = total['sent']
+        return {
+            'chat_id': chat_id,
+            'sent': sent,
+            'ok': total['ok'],
+            'failure_rate': (sent - total['ok']) / sent if sent else 0.0,
+            'avg_latency': total['latency'] / sent if sent else None,
+            'p95_latency': series.p95_latency(),
+            'errors': total['errors'],
+        }
+
+    def worst(self, limit=10, hours=24):
+        """Destinos con peor tasa de fallos y, a igualdad, mayor latencia"""
+        summaries = [s for s in (self.summary(c, hours) for c in self._series) if s and s['sent']]
+        summaries.sort(key=lambda s: (s['failure_rate'], s['avg_latency'] or 0), reverse=True)
+        return summaries[:limit]
+
+    def error_trend(self, key='h', periods=6):
+        """Errores por clase en los últimos periodos, sumando todos los destinos"""
+        seconds = GRANULARITIES[key][0]
+        current = int(time.time() // seconds * seconds)
+        starts = [current - i * seconds for i in range(periods - 1, -1, -1)]
+        trend = {start: _new_bucket(start) for start in starts}
+        for series in self._series.values():
+            for bucket in series.rollups[key]:
+                target = trend.get(bucket['start'])
+                if target is None:
+                    continue
+                target['sent'] += bucket['sent']
+                target['ok'] += bucket['ok']
+                for outcome, count in bucket['errors'].items():
+                    target['errors'][outcome] = target['errors'].get(outcome, 0) + count
+        return [trend[start] for start in starts]
+
+    def export_csv(self, hours=24, titles=None):
+        """CSV con el resumen de todos los destinos"""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['chat_id', 'titulo', 'envios', 'correctos', 'tasa_fallos', 'latencia_media', 'latencia_p95', 'errores'])
+        rows = [s for s in (self.summary(c, hours) for c in self._series) if s]
+        rows.sort(key=lambda s: s['failure_rate'], reverse=True)
+        for s in rows:
+            writer.writerow([
+                s['chat_id'],
+                (titles or {}).get(s['chat_id'], ''),
+                s['sent'],
+                s['ok'],
+                f"{s['failure_rate']:.3f}",
+                f"{s['avg_latency']:.3f}" if s['avg_latency'] is not None else '',
+                f"{s['p95_latency']:.3f}" if s['p95_latency'] is not None else '',
+                ' '.join(f"{k}={v}" for k, v in sorted(s['errors'].items())),
+            ])
+        return output.getvalue()
+
+    def forget(self, live_chat_ids):
+        """Eliminar series de chats que ya no son destinos"""
+        live_chat_ids = set(live_chat_ids)
+        for chat_id in [c for c in self._series if c not in live_chat_ids]:
+            del self._series[chat_id]
+
+    def _load(self):
+        """Restaurar los agregados desde disco (los buffers de envíos empiezan vacíos)"""
+        if not self.persist_file:
+            return
+        data = load_state_file(self.persist_file)
+        if data is None:
+            return
+        for chat_id, rollups in data.items():
+            series = self._get(int(chat_id))
+            for key, buckets in rollups.items():
+                if key in series.rollups:
+                    series.rollups[key].extend(buckets)
+
+    def save(self):
+        """Persistir los agregados en disco si está habilitado"""
+        if not self.persist_file:
+            return
+        data = {
+            str(chat_id): {key: list(buckets) for key, buckets in series.rollups.items()}
+            for chat_id, series in self._series.items()
+        }
+        save_state_file(self.persist_file, data)
@@ -0,0 +1,116 @@
+"""
+Registro idempotente de entregas por (mensaje, destino, ciclo) con bitmaps por ciclo
+"""
+
+import logging
+from utils import load_state_file, save_state_file
+
+logger = logging.getLogger(__name__)
+
+def _uid(msg):
+    """Aceptar el dict del mensaje o directamente su uid"""
+    return msg['uid'] if isinstance(msg, dict) else msg
+
+class DeliveryLedger:
+    def __init__(self, keep_cycles=2, persist_file=None):
+        self.keep_cycles = keep_cycles
+        self.persist_file = persist_file
+        # chat_id -> posición de bit (registro de destinos)
+        self._dest_index = {}
+        # uid -> {ciclo: bitmap de destinos entregados}; como mucho keep_cycles + 1 ciclos por mensaje
+        self._bitmaps = {}
+        # Envíos en vuelo: evita duplicados entre ejecuciones solapadas
+        self._inflight = set()
+        self._load()
+
+    def __len__(self):
+        return sum(len(cycles) for cycles in self._bitmaps.values())
+
+    def _bit(self, chat_id):
+        """Máscara del destino (se registra al primer uso)"""
+        index = self._dest_index.get(chat_id)
+        if index is None:
+            index = len(self._dest_index)
+            self._dest_index[chat_id] = index
+        return 1 << index
+
+    def was_delivered(self, msg, chat_id, cycle):
+        """Si el mensaje ya se entregó a ese chat en ese ciclo"""
+        index = self._dest_index.get(chat_id)
+        if index is None:
+            return False
+        return bool(self._bitmaps.get(_uid(msg), {}).get(cycle, 0) >> index & 1)
+
+    def mark(self, msg, chat_id, cycle):
+        """Registrar una entrega correcta"""
+        cycles = self._bitmaps.setdefault(_uid(msg), {})
+        new_cycle = cycle not in cycles
+        cycles[cycle] = cycles.get(cycle, 0) | self._bit(chat_id)
+        if new_cycle:
+            self._prune_cycles(cycles)
+
+    def begin(self, msg, chat_id, cycle):
+        """Reservar un envío; False si ya se entregó o está en vuelo"""
+        if cycle is None:
+            return True
+        key = (_uid(msg), chat_id, cycle)
+        if key in self._inflight or self.was_delivered(msg, chat_id, cycle):
+            return False
+        self._inflight.add(key)
+        return True
+
+    def finish(self, msg, chat_id, cycle, ok):
+        """Liberar la reserva y registrar la entrega si tuvo éxito"""
+        if cycle is None:
+            return
+        self._inflight.discard((_uid(msg), chat_id, cycle))
+        if ok:
+            self.mark(msg, chat_id, cycle)
+
+    def _prune_cycles(self, cycles):
+        """Conservar solo los últimos ciclos de un mensaje (recorre solo sus propios ciclos)"""
+        oldest = max(cycles) - self.keep_cycles
+        for cycle in [c for c in cycles if c <= oldest]:
+            del cycles[cycle]
+
+    def prune(self, live_uids, live_chat_ids=None):
+        """Olvidar mensajes que ya no existen y, si se indican, compactar los bits de destinos eliminados"""
+        live_uids = set(live_uids)
+        for uid in [u for u in self._bitmaps if u not in live_uids]:
+            del self._bitmaps[uid]
+        if live_chat_ids is not None:
+            self._compact(set(live_chat_ids))
+
+    def _compact(self, live_chat_ids):
+        """Renumerar las posiciones de bit sin los chats que ya no son destinos (los bitmaps no crecen sin límite)"""
+        if all(chat_id in live_chat_ids for chat_id in self._dest_index):
+            return
+        kept = sorted((index, chat_id) for chat_id, index in self._dest_index.items() if chat_id in live_chat_ids)
+        self._dest_index = {chat_id: new for new, (_, chat_id) in enumerate(kept)}
+        moves = [(old, new) for new, (old, _) in enumerate(kept)]
+        for cycles in self._bitmaps.values():
+            for cycle, bitmap in cycles.items():
+                cycles[cycle] = sum(1 << new for old, new in moves if bitmap >> old & 1)
+
+    def _load(self):
+        """Restaurar el registro desde disco"""
+        if not self.persist_file:
+            return
+        data = load_state_file(self.persist_file)
+        if data is None:
+            return
+
+        self._dest_index = {int(chat): index for chat, index in data.get('destinos', {}).items()}
+        for key, bitmap in data.get('entregas', {}).items():
+            uid, cycle = (int(part) for part in key.split(':'))
+            self._bitmaps.setdefault(uid, {})[cycle] = bitmap
+
+    def save(self):
+        """Persistir el registro en disco si está habilitado"""
+        if not self.persist_file:
+            return
+        data = {
+            'destinos': {str(chat): index for chat, index in self._dest_index.items()},
+            'entregas': {f"{uid}:{cycle}": bitmap for uid, cycles in self._bitmaps.items() for cycle, bitmap in cycles.items()},
+        }
+        save_state_file(self.persist_file, data)
@@ -0,0 +1,125 @@
+"""
+Retraso de entrega frente a la hora prevista: histogramas por mensaje, lista y prioridad con alertas de SLO
+"""
+
+import bisect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets de retraso en segundos (el último recoge el resto)
+LAG_BOUNDS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+# Dimensiones de los histogramas
+DIMENSIONS = ('mensaje', 'lista', 'prioridad')
+
+def format_lag(seconds):
+    """Retraso legible"""
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}min"
+    return f"{seconds / 3600:.1f}h"
+
+class LagHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LAG_BOUNDS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, lag):
+        """Contar un retraso"""
+        self.counts[bisect.bisect_left(LAG_BOUNDS, lag)] += 1
+        self.total += 1
+        self.max = max(self.max, lag)
+
+    def merge(self, other):
+        """Sumar otro histograma a este"""
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """Límite superior del bucket que contiene el percentil, sin pasar del máximo observado"""
+        if not self.total:
+            return None
+        target = fraction * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(LAG_BOUNDS[i], self.max) if i < len(LAG_BOUNDS) else self.max
+        return self.max
+
+class LagTracker:
+    def __init__(self, target=300, window=3600, min_samples=20, cooldown=3600):
+        self.target = target
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        # Dos ventanas rotativas: (dimensión, clave) -> LagHistogram
+        self._current = {}
+        self._previous = {}
+        self._window_start = time.time()
+        self._alerted = {}
+
+    def _rotate(self, now):
+        """Pasar a una ventana nueva cuando la actual caduca"""
+        if now - self._window_start < self.window:
+            return
+        self._previous = self._current if now - self._window_start < self.window * 2 else {}
+        self._current = {}
+        self._window_start = now
+
+    def record(self, lag, message, lists, priority, now=None):
+        """Registrar el retraso de una entrega en cada dimensión"""
+        now = now or time.time()
+        self._rotate(now)
+        lag = max(0.0, lag)
+        for key in [('mensaje', message), ('prioridad', priority)] + [('lista', name) for name in lists]:
+            histogram = self._current.get(key)
+            if histogram is None:
+                histogram = self._current[key] = LagHistogram()
+            histogram.add(lag)
+
+    def histogram(self, dimension, name):
+        """Histograma de las dos últimas ventanas"""
+        merged = LagHistogram()
+        for window in (self._previous, self._current):
+            if (dimension, name) in window:
+                merged.merge(window[(dimension, name)])
+        return merged
+
+    def report(self, dimension):
+        """{clave: (entregas, p50, p95, máximo)} de una dimensión, peor p95 primero"""
+        names = {name for window in (self._previous, self._current) for dim, name in window if dim == dimension}
+        rows = {}
+        for name in names:
+            histogram = self.histogram(dimension, name)
+            rows[name] = (histogram.total, histogram.percentile(0.5), histogram.percentile(0.95), histogram.max)
+        return dict(sorted(rows.items(), key=lambda row: row[1][2] or 0, reverse=True))
+
+    def breaches(self, now=None):
+        """Claves cuyo p95 supera el objetivo y no se avisaron durante el enfriamiento"""
+        now = now or time.time()
+        self._rotate(now)
+        result = []
+        for dimension in DIMENSIONS:
+            for name, (total, _, p95, _) in self.report(dimension).items():
+                if total < self.min_samples or p95 is None or p95 <= self.target:
+                    continue
+                if now - self._alerted.get((dimension, name), 0) < self.cooldown:
+                    continue
+                self._alerted[(dimension, name)] = now
+                result.append((dimension, name, total, p95))
+        return result
+
+    def format_alert(self, breaches):
+        """Texto del aviso al admin"""
+        text = f"⏱️ **SLO de retraso superado** (p95 > {format_lag(self.target)})\n\n"
+        for dimension, name, total, p95 in breaches:
+            text += f"• {dimension} `{name}`: p95 {format_lag(p95)} en {total} entregas\n"
+        return text
@@ -0,0 +1,176 @@
+"""
+Importación masiva de destinos desde un documento CSV/TXT con validación concurrente
+"""
+
+import io
+import logging
+import re
+from utils import save_config
+from planner import check_capacity
+from chat_validation import validate_chats
+from keyboards import BACK_TO_DESTINATIONS_INLINE
+
+logger = logging.getLogger(__name__)
+
+# Rechazos que se listan en el resumen (el resto solo se cuenta)
+MAX_REJECTED_SHOWN = 20
+
+def _as_int(cell):
+    """Entero de una celda o None"""
+    try:
+        return int(cell)
+    except ValueError:
+        return None
+
+def parse_chat_ids(lines):
+    """Generar (id, None) por cada ID válido o (None, texto) por cada fila sin ID"""
+    for line_no, line in enumerate(lines, 1):
+        cells = [c.strip().strip('"\'') for c in re.split(r'[,;\s]+', line.strip()) if c.strip()]
+        if not cells:
+            continue
+        ids = [_as_int(c) for c in cells]
+        if all(i is not None for i in ids):
+            # Fila solo con IDs (uno o varios separados)
+            for chat_id in ids:
+                yield chat_id, None
+        elif any(i is not None for i in ids):
+            # Fila CSV con más columnas: el ID es la primera columna numérica
+            yield next(i for i in ids if i is not None), None
+        elif line_no > 1:
+            # La primera línea puede ser una cabecera del CSV
+            yield None, line.strip()[:40]
+
+class DestinationImporter:
+    def __init__(self, config, states, message_store=None):
+        self.config = config
+        # Estados de conversación compartidos con BotHandler
+        self.states = states
+        self.message_store = message_store
+
+    async def request_import_file(self, update, context):
+        """Pedir el documento con los IDs"""
+        await update.callback_query.edit_message_text(
+            "📥 **Importar destinos desde archivo**\n\n"
+            "Envía un documento .csv o .txt con un ID de chat por línea o separados por comas.\n\n"
+            "• Sin comentario: se agregan a los destinos generales.\n"
+            "• Con el nombre de una lista como comentario: se agregan a esa lista (se crea si no existe).\n\n"
+            "Cada ID se valida antes de guardarlo: el bot debe poder publicar en el chat.",
+            reply_markup=BACK_TO_DESTINATIONS_INLINE,
+            parse_mode='Markdown'
+        )
+        self.states.set(update.effective_user.id, 'awaiting_import_file')
+
+    async def handle_import_text(self, update, context, text):
+        """Texto recibido mientras se espera el documento"""
+        await update.message.reply_text(
+            "📎 Envía el archivo como documento (.csv o .txt), o vuelve al menú para cancelar.",
+            reply_markup=BACK_TO_DESTINATIONS_INLINE
+        )
+
+    async def handle_import_document(self, update, context):
+        """Descargar, parsear, validar y guardar los IDs del documento"""
+        document = update.message.document
+        self.states.pop(update.effective_user.id)
+
+        max_bytes = self.config.get('importacion_max_bytes', 1024 * 1024)
+        name = (document.file_name or '').lower()
+        if not (name.endswith(('.csv', '.txt')) or (document.mime_type or '').startswith('text/')):
+            await update.message.reply_text("❌ Formato no soportado. Usa un archivo .csv o .txt.",
+                                            reply_markup=BACK_TO_DESTINATIONS_INLINE)
+            return
+        if document.file_size and document.file_size > max_bytes:
+            await update.message.reply_text(f"❌ Archivo demasiado grande (máx. {max_bytes // 1024} KB).",
+                                            reply_markup=BACK_TO_DESTINATIONS_INLINE)
+            return
+
+        list_name = (update.message.caption or '').strip() or None
+        status = await update.message.reply_text("⏳ Leyendo archivo...")
+
+        buffer = io.BytesIO()
+        telegram_file = await context.bot.get_file(document.file_id)
+        await telegram_file.download_to_memory(buffer)
+        buffer.seek(0)
+
+        # Parseo línea a línea con deduplicación en orden de aparición
+        if list_name:
+            existing = set(self.config.get('listas_destinos', {}).get(list_name, []))
+        else:
+            existing = set(self.config.get('destinos', []))
+        seen = set()
+        candidates = []
+        rejected = {}
+        duplicates = 0
+        for chat_id, bad_token in parse_chat_ids(io.TextIOWrapper(buffer, encoding='utf-8-sig', errors='replace')):
+            if chat_id is None:
+                rejected[bad_token] = "Formato inválido"
+            elif chat_id in seen or chat_id in existing:
+                duplicates += 1
+            else:
+                seen.add(chat_id)
+                candidates.append(chat_id)
+
+        if not candidates and not rejected:
+            await status.edit_text("⚠️ No se encontraron IDs nuevos en el archivo.",
+                                   reply_markup=BACK_TO_DESTINATIONS_INLINE)
+            return
+
+        await status.edit_text(f"⏳ Validando {len(candidates)} chats...")
+        valid, invalid = await validate_chats(
+            context.bot, candidates, concurrency=self.config.get('importacion_concurrente', 10)
+        )
+        rejected.update(invalid)
+        accepted = [chat_id for chat_id in candidates if chat_id in valid]
+
+        warning = None
+        if accepted:
+            warning, reject = self._commit(accepted, list_name)
+            if reject:
+                await status.edit_text(f"❌ Importación rechazada\n\n{warning}",
+                                       reply_markup=BACK_TO_DESTINATIONS_INLINE)
+                return
+
+        target = f"lista {list_name}" if list_name else "destinos generales"
+        lines = [
+            f"✅ Importación en {target} completada",
+            "",
+            f"➕ Agregados: {len(accepted)}",
+            f"🔁 Duplicados o ya existentes: {duplicates}",
+            f"❌ Rechazados: {len(rejected)}",
+        ]
+        if rejected:
+            lines.append("")
+            for chat_id, reason in list(rejected.items())[:MAX_REJECTED_SHOWN]:
+                lines.append(f"• {chat_id}: {reason}")
+            if len(rejected) > MAX_REJECTED_SHOWN:
+                lines.append(f"… y {len(rejected) - MAX_REJECTED_SHOWN} más")
+        if warning:
+            lines.append("")
+            lines.append(warning)
+
+        logger.info(f"📥 Importación: {len(accepted)} agregados, {len(rejected)} rechazados → {target}")
+        await status.edit_text("\n".join(lines), reply_markup=BACK_TO_DESTINATIONS_INLINE)
+
+    def _commit(self, accepted, list_name):
+        """Agregar todos los IDs con una sola escritura; devuelve (aviso, rechazada)"""
+        if list_name:
+            listas = self.config.setdefault('listas_destinos', {})
+            previous = listas.get(list_name)
+            listas[list_name] = (previous or []) + accepted
+        else:
+            destinos = self.config.setdefault('destinos', [])
+            destinos.extend(accepted)
+
+        warning, reject = None, False
+        if self.message_store is not None:
+            warning, reject = check_capacity(self.config, self.message_store.all())
+        if reject:
+            if list_name and previous is None:
+                del listas[list_name]
+            elif list_name:
+                listas[list_name] = previous
+            else:
+                del destinos[-len(accepted):]
+            return warning, True
+
+        save_config(self.config)
+        return warning, False
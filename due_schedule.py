@@ -0,0 +1,81 @@
+"""
+Próximo envío de cada mensaje (persistido en mensajes.json) con cola de vencimientos y recuperación tras una parada
+"""
+
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Qué hacer con los envíos perdidos más allá del margen de gracia:
+# una = un solo envío, todas = uno por periodo perdido (con tope), saltar = esperar al siguiente
+CATCH_UP_POLICIES = ('una', 'todas', 'saltar')
+
+class DueQueue:
+    def __init__(self, policy='una', grace=120, max_catch_up=5):
+        self.policy = policy if policy in CATCH_UP_POLICIES else 'una'
+        self.grace = grace
+        self.max_catch_up = max(1, max_catch_up)
+        # (próximo envío, uid): entradas obsoletas se descartan al sacarlas
+        self._heap = []
+        self._max_uid = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def sync(self, messages, now, schedule_of):
+        """Incorporar mensajes nuevos (los uid crecen: solo se mira el final de la lista)"""
+        added = []
+        for msg in reversed(messages):
+            if msg['uid'] <= self._max_uid:
+                break
+            added.append(msg)
+        for msg in added:
+            # Restaurado de disco o, si nunca se envió, su primer disparo (ya, si va por intervalo)
+            if 'next_due' not in msg:
+                msg['next_due'] = schedule_of(msg).first(now)
+            heapq.heappush(self._heap, (msg['next_due'], msg['uid']))
+        if added:
+            self._max_uid = max(self._max_uid, max(m['uid'] for m in added))
+
+    def reschedule(self, msg, due):
+        """Cambiar el próximo envío de un mensaje"""
+        msg['next_due'] = due
+        if msg['uid'] <= self._max_uid:
+            heapq.heappush(self._heap, (due, msg['uid']))
+
+    def pop_due(self, store, now, schedule_of):
+        """Mensajes vencidos: [(mensaje, [horas previstas a enviar])], ya reprogramados"""
+        due = []
+        caught_up = skipped = 0
+        while self._heap and self._heap[0][0] <= now:
+            next_due, uid = heapq.heappop(self._heap)
+            msg = store.get(uid)
+            if msg is None or msg.get('next_due') != next_due:
+                # Mensaje borrado o entrada reemplazada
+                continue
+
+            schedule = schedule_of(msg)
+            if now - next_due <= self.grace:
+                fire = [next_due]
+                last = next_due
+            else:
+                missed, _ = schedule.missed(next_due, now, self.max_catch_up)
+                last = missed[-1]
+                if self.policy == 'todas':
+                    fire = missed
+                    caught_up += 1
+                elif self.policy == 'una':
+                    fire = [last]
+                    caught_up += 1
+                else:
+                    fire = []
+                    skipped += 1
+
+            msg['next_due'] = schedule.next_after(last)
+            heapq.heappush(self._heap, (msg['next_due'], uid))
+            due.append((msg, fire))
+
+        if caught_up or skipped:
+            logger.info(f"⏰ Envíos atrasados (política '{self.policy}'): {caught_up} recuperados, {skipped} saltados")
+        return due
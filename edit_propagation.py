@@ -0,0 +1,72 @@
+"""
+Propagación de ediciones del canal origen a las copias ya enviadas a los destinos
+"""
+
+import asyncio
+import logging
+from telegram.error import BadRequest, TelegramError
+
+logger = logging.getLogger(__name__)
+
+class EditPropagator:
+    def __init__(self, config, forwarder):
+        self.config = config
+        self.forwarder = forwarder
+
+    async def handle_edited_channel_post(self, update, context):
+        """Publicación editada: aplicar el nuevo texto o pie a todas sus copias"""
+        post = update.edited_channel_post
+        if not post or not self.config.get('propagar_ediciones', True):
+            return
+        copies = self.forwarder.message_map.copies(post.chat.id, post.message_id)
+        if not copies:
+            return
+        # El reparto corre en segundo plano para no frenar el resto de updates
+        context.application.create_task(self._propagate(context.bot, post, copies))
+
+    async def _propagate(self, bot, post, copies):
+        """Editar las copias en paralelo dentro del presupuesto de envíos"""
+        semaphore = asyncio.Semaphore(max(1, int(self.config.get('ediciones_concurrentes', 5))))
+        results = {'ok': 0, 'failed': 0}
+
+        async def edit(chat_id, message_id):
+            async with semaphore:
+                await self.forwarder.rate_limiter.acquire()
+                try:
+                    await self._apply_edit(bot, post, chat_id, message_id)
+                    results['ok'] += 1
+                except BadRequest as e:
+                    text = str(e).lower()
+                    if 'not modified' in text:
+                        results['ok'] += 1
+                        return
+                    if 'not found' in text:
+                        # La copia se borró en el destino: no volver a intentarlo
+                        self.forwarder.message_map.discard(post.chat.id, post.message_id, chat_id, message_id)
+                    results['failed'] += 1
+                    logger.error(f"❌ Edición {post.message_id} → {chat_id}: {e}")
+                except TelegramError as e:
+                    results['failed'] += 1
+                    logger.error(f"❌ Edición {post.message_id} → {chat_id}: {e}")
+
+        await asyncio.gather(*(edit(chat_id, message_id) for chat_id, message_id in copies))
+        self.forwarder.message_map.save()
+        logger.info(f"✏️ Edición de {post.message_id} propagada: {results['ok']} ✔️, {results['failed']} ❌")
+
+    @staticmethod
+    async def _apply_edit(bot, post, chat_id, message_id):
+        """Copiar el texto (o el pie de un multimedia) con sus formatos"""
+        if post.text is not None:
+            await bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=message_id,
+                text=post.text,
+                entities=post.entities
+            )
+        else:
+            await bot.edit_message_caption(
+                chat_id=chat_id,
+                message_id=message_id,
+                caption=post.caption,
+                caption_entities=post.caption_entities
+            )
@@ -0,0 +1,77 @@
+"""
+Fin de campañas: índice por fecha de caducidad (expire_at) y topes de envíos (max_sends) y ciclos (max_cycles)
+"""
+
+import heapq
+import logging
+from datetime import datetime
+import pytz
+
+logger = logging.getLogger(__name__)
+
+def parse_expiry(value, timezone_name):
+    """Timestamp de 'expire_at': número (epoch) o fecha ISO en la zona horaria configurada"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        moment = datetime.fromisoformat(str(value))
+    except ValueError:
+        logger.warning(f"⚠️ expire_at inválido: {value}")
+        return None
+    if moment.tzinfo is None:
+        try:
+            moment = pytz.timezone(timezone_name).localize(moment)
+        except pytz.UnknownTimeZoneError:
+            moment = moment.astimezone()
+    return moment.timestamp()
+
+def reached_limit(msg):
+    """Si el mensaje alcanzó su tope de envíos correctos o de ciclos"""
+    max_sends = msg.get('max_sends')
+    if max_sends and msg.get('send_count', 0) >= max_sends:
+        return True
+    max_cycles = msg.get('max_cycles')
+    return bool(max_cycles) and msg.get('cycle_count', 0) >= max_cycles
+
+class ExpirationIndex:
+    def __init__(self, config):
+        self.config = config
+        self.timezone_name = config.get('timezone', 'Europe/Madrid')
+        # (caducidad, uid) ordenado por caducidad
+        self._heap = []
+        self._max_uid = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def sync(self, messages):
+        """Incorporar mensajes nuevos (los uid crecen: solo se mira el final de la lista)"""
+        timezone_name = self.config.get('timezone', 'Europe/Madrid')
+        if timezone_name != self.timezone_name:
+            # Las fechas sin zona se interpretan en la nueva zona horaria: reindexar todo
+            logger.info(f"🌐 Zona horaria {timezone_name}: caducidades recalculadas")
+            self.timezone_name = timezone_name
+            self._heap = []
+            self._max_uid = 0
+        added = []
+        for msg in reversed(messages):
+            if msg['uid'] <= self._max_uid:
+                break
+            added.append(msg)
+        for msg in added:
+            expires = parse_expiry(msg.get('expire_at'), self.timezone_name)
+            if expires is not None:
+                heapq.heappush(self._heap, (expires, msg['uid']))
+        if added:
+            self._max_uid = max(self._max_uid, max(m['uid'] for m in added))
+
+    def pop_expired(self, store, now):
+        """uids de los mensajes caducados (solo se recorren los vencidos)"""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, uid = heapq.heappop(self._heap)
+            if store.get(uid) is not None:
+                expired.append(uid)
+        return expired
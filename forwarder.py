@@ -1,35 +1,207 @@
 import asyncio
 import logging
+import math
+import os
+import time
+import zlib
 from datetime import datetime
 from telegram.ext import Application
-from telegram.error import TelegramError
+from telegram.error import TelegramError, Forbidden, BadRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from utils import load_config, load_messages, save_messages, get_current_time, logger
+from utils import refresh_config, get_current_time, is_message_active, load_state_file, save_state_file, logger
+from message_store import MessageStore
+from send_queue import WeightedFairQueue, RateLimiter, SendItem, DEFAULT_PRIORITY, PRIORITY_WEIGHTS
+from delivery_ledger import DeliveryLedger
+from chat_health import ChatHealthCache, all_destinations
+from list_algebra import get_list_algebra, ListExpressionError, ALL_DESTINATIONS
+from delivery_analytics import DestinationAnalytics, classify_error, OK
+from delivery_slo import LagTracker
+from message_map import MessageMap
+from due_schedule import DueQueue
+from expiration_index import ExpirationIndex, reached_limit
+from calendar_schedule import ScheduleCache
+
+# Cadencia del job de reenvío fuera del modo suavizado
+FORWARD_JOB_INTERVAL = 60
+# Qué hacer cuando un ciclo sigue en curso al llegar el siguiente:
+# saltar la ejecución, agrupar las perdidas en un ciclo inmediato o estirar el intervalo
+OVERRUN_POLICIES = ('saltar', 'agrupar', 'estirar')
+# Margen sobre la duración medida al estirar el intervalo
+STRETCH_MARGIN = 1.2
+# Reenviar conserva la cabecera "Reenviado de"; copiar permite editar las copias después
+SEND_MODES = ('reenviar', 'copiar')
+
+def resolve_destinations(msg, config, algebra=None):
+    """Destinos de un mensaje, cada chat una vez - SOLO GRUPOS (NO ADMIN NI CANAL ORIGEN)"""
+    admin_id = config.get('admin_id')
+    source_channel = config.get('source_channel_id')
+    
+    if msg.get('dest_all', True):
+        destinos = list(dict.fromkeys(config.get('destinos', [])))
+    else:
+        # Lista simple o compuesta, o varias listas con 'dest_lists' (unión)
+        names = msg.get('dest_lists') or ([msg['dest_list']] if msg.get('dest_list') else [])
+        if not names:
+            return []
+        try:
+            destinos = (algebra or get_list_algebra(config)).resolve_many(names)
+        except ListExpressionError as e:
+            logger.warning(f"⚠️ Mensaje {msg.get('message_id')}: {e}")
+            return []
+    
+    return [d for d in destinos if d != admin_id and d != source_channel]
+
+def message_interval(msg, config):
+    """Intervalo de repetición configurado de un mensaje en segundos"""
+    interval = msg.get('interval') or msg.get('intervalo_segundos') or config.get('intervalo_global', 60)
+    return max(1, int(interval))
+
+def effective_interval(msg, config):
+    """Cada cuánto se envía realmente un mensaje con la configuración actual"""
+    if config.get('modo_suavizado', False):
+        return message_interval(msg, config)
+    return FORWARD_JOB_INTERVAL
 
 class Forwarder:
-    def __init__(self, config):
+    def __init__(self, config, message_store=None, health=None):
         self.config = config
+        self.store = message_store if message_store is not None else MessageStore()
+        self.stats = self.store.stats
         self.scheduler = AsyncIOScheduler()
         self.is_running = False
         self.application = None
+        # Presupuesto de envíos compartido por todos los ciclos (token bucket)
+        self.rate_limiter = RateLimiter(
+            self.config.get('limite_envios_por_segundo', 2),
+            self.config.get('rafaga_envios', 1)
+        )
+        self.current_queue = None
+        self.last_queue_report = {}
+        # Fin de la última ventana evaluada en modo suavizado (reloj de pared)
+        self._last_tick = None
+        # Parada a recuperar con la política 'una' en modo suavizado: (inicio, fin) o None
+        self._catch_up = None
+        # uid -> envíos en vuelo o correctos aún no sumados a send_count (tope max_sends entre ciclos y workers)
+        self._reserved_sends = {}
+        # Apagado cooperativo: no se desencolan más envíos y lo pendiente va al checkpoint
+        self.stopping = False
+        self.checkpoint_file = self.config.get('archivo_checkpoint', 'ciclo_checkpoint.json')
+        self._cycle_tasks = set()
+        self._active_queues = []
+        self._leftovers = []
+        # Excesos de ciclo: ejecuciones que encontraron el ciclo anterior en curso
+        self._cycle_busy = False
+        self._rerun_pending = False
+        self.base_interval = FORWARD_JOB_INTERVAL
+        self.current_interval = FORWARD_JOB_INTERVAL
+        self.last_cycle_duration = None
+        self.overrun_cycles = 0
+        self.overlapping_runs = 0
+        # Envíos urgentes en curso (difusiones): los ciclos esperan a que terminen para pedir turno
+        self._urgent_jobs = 0
+        self._urgent_idle = asyncio.Event()
+        self._urgent_idle.set()
+        # Próximo envío de cada mensaje (fuera del modo suavizado) y recuperación tras una parada
+        self.due_queue = DueQueue(
+            policy=self.config.get('politica_recuperacion', 'una'),
+            grace=self.config.get('recuperacion_gracia_segundos', 120),
+            max_catch_up=self.config.get('recuperacion_max_envios', 5)
+        )
+        # Horarios de calendario por mensaje (cron o ventanas), compilados una vez por mensaje
+        self.schedules = ScheduleCache(self.config)
+        # Caducidad de campañas (expire_at) ordenada por fecha
+        self.expirations = ExpirationIndex(self.config)
+        # Entregas por (mensaje, destino, ciclo) para no duplicar envíos
+        self.ledger = DeliveryLedger(
+            keep_cycles=self.config.get('entregas_ciclos_retenidos', 2),
+            persist_file=self.config.get('archivo_entregas', 'entregas.json')
+        )
+        # Permisos y títulos de destinos (compartido con los menús)
+        self.health = health or ChatHealthCache(
+            ttl=self.config.get('salud_ttl_segundos', 21600),
+            persist_file=self.config.get('archivo_salud', 'salud_destinos.json')
+        )
+        # Latencia, éxito y clase de error por destino
+        self.analytics = DestinationAnalytics(
+            samples=self.config.get('analitica_muestras', 50),
+            persist_file=self.config.get('archivo_analitica', 'analitica_destinos.json')
+        )
+        # Retraso entre la hora prevista y la entrega, con objetivo de p95
+        self.lag = LagTracker(
+            target=self.config.get('slo_retraso_segundos', 300),
+            window=self.config.get('slo_ventana_segundos', 3600),
+            min_samples=self.config.get('slo_min_entregas', 20),
+            cooldown=self.config.get('slo_alerta_cooldown_segundos', 3600)
+        )
+        # Mensajes producidos en cada destino, para propagar ediciones
+        self.message_map = MessageMap(
+            max_age=self.config.get('mapa_mensajes_max_edad_segundos', 172800),
+            persist_file=self.config.get('archivo_mapa_mensajes', 'mapa_mensajes.json'),
+            max_entries=self.config.get('mapa_mensajes_max_copias', 100000)
+        )
     
     def start_forwarding(self, application):
         """Iniciar el sistema de reenvío automático"""
         self.application = application
         
         if not self.is_running:
-            self.scheduler.start()
+            if not self.scheduler.running:
+                self.scheduler.start()
             self.is_running = True
+            self.stats.set_running(True)
             logger.info("🚀 Sistema de reenvío iniciado")
         
         # Programar job principal
         self.schedule_forwarding_job()
+        self._update_next_run()
+        
+        # Retomar el ciclo interrumpido en el último apagado
+        pending = self._load_checkpoint()
+        if pending:
+            self.scheduler.add_job(
+                self.resume_from_checkpoint,
+                args=[pending],
+                id='resume_checkpoint',
+                name='Resume Checkpoint Job',
+                replace_existing=True
+            )
+    
+    def start_health_sweep(self, application):
+        """Programar la revisión periódica de permisos de los destinos"""
+        self.application = application
+        interval = self.config.get('salud_intervalo_segundos', 3600)
+        if not interval:
+            return
+        if not self.scheduler.running:
+            self.scheduler.start()
+        
+        # Primera revisión inmediata si la caché no está al día
+        overdue = self.health.last_sweep is None or time.time() - self.health.last_sweep > interval
+        self.scheduler.add_job(
+            self.run_health_sweep,
+            trigger=IntervalTrigger(seconds=interval),
+            id='health_sweep',
+            name='Health Sweep Job',
+            replace_existing=True,
+            **({'next_run_time': datetime.now()} if overdue else {})
+        )
+        logger.info(f"🩺 Revisión de destinos programada cada {interval} segundos")
+    
+    async def run_health_sweep(self):
+        """Revisar todos los destinos y actualizar la caché de salud"""
+        if not self.application or self.stopping:
+            return
+        await self.health.sweep(self.application.bot, self.config)
     
     def schedule_forwarding_job(self):
         """Programar job de reenvío"""
-        # Obtener intervalo global (temporal: 60 segundos para pruebas)
-        interval = 60  # self.config.get('intervalo_global', 3600)
+        if self._smoothing_enabled():
+            # Modo suavizado: ticks cortos, cada par sale en su hueco dentro del intervalo
+            interval = max(1, int(self.config.get('suavizado_tick_segundos', 5)))
+        else:
+            # Obtener intervalo global (temporal: 60 segundos para pruebas)
+            interval = FORWARD_JOB_INTERVAL  # self.config.get('intervalo_global', 3600)
         
         # Remover job existente si existe
         try:
@@ -37,143 +209,775 @@ class Forwarder:
         except:
             pass
         
-        # Agregar nuevo job
+        # Agregar nuevo job; los solapes los gestiona forward_all_messages según la política
+        self.base_interval = self.current_interval = interval
         self.scheduler.add_job(
             self.forward_all_messages,
             trigger=IntervalTrigger(seconds=interval),
             id='forward_messages',
-            name='Forward Messages Job'
+            name='Forward Messages Job',
+            max_instances=2,
+            coalesce=True
         )
         
         logger.info(f"📅 Job de reenvío programado cada {interval} segundos")
+        self._publish_cadence()
+    
+    def _update_next_run(self):
+        """Publicar el próximo envío en las estadísticas"""
+        job = self.scheduler.get_job('forward_messages')
+        self.stats.set_next_run(job.next_run_time if job else None)
+    
+    def _smoothing_enabled(self):
+        """Modo suavizado activado en la configuración"""
+        return bool(self.config.get('modo_suavizado', False))
+    
+    def _message_interval(self, msg):
+        """Intervalo de repetición de un mensaje en segundos"""
+        return message_interval(msg, self.config)
+    
+    @staticmethod
+    def _pair_offset(flow, dest_id, interval):
+        """Desfase estable de un par (mensaje, destino) dentro de su intervalo"""
+        return zlib.crc32(f"{flow}:{dest_id}".encode()) % (interval * 1000) / 1000.0
+    
+    def _pair_due(self, flow, dest_id, interval, window_start, window_end):
+        """El hueco del par cae en la ventana (window_start, window_end]"""
+        offset = self._pair_offset(flow, dest_id, interval)
+        return math.floor((window_end - offset) / interval) > math.floor((window_start - offset) / interval)
+    
+    def _scheduled_run_time(self):
+        """Hora programada de la ejecución en curso (no la real, que puede llegar con retraso)"""
+        job = self.scheduler.get_job('forward_messages') if self.scheduler.running else None
+        if job and job.next_run_time and isinstance(job.trigger, IntervalTrigger):
+            return job.next_run_time.timestamp() - job.trigger.interval.total_seconds()
+        return time.time()
+    
+    def _schedule_of(self, msg):
+        """Horario de un mensaje: calendario propio o su intervalo efectivo"""
+        return self.schedules.get(msg, effective_interval(msg, self.config))
+    
+    def _reschedule_calendars(self, messages):
+        """Recalcular el próximo disparo de los horarios de calendario tras cambiar la zona horaria"""
+        now = time.time()
+        count = 0
+        for msg in messages:
+            schedule = self._schedule_of(msg)
+            if schedule.calendar and 'next_due' in msg:
+                self.due_queue.reschedule(msg, schedule.first(now))
+                count += 1
+        logger.info(f"🌐 Zona horaria {self.schedules.timezone_name}: {count} horarios recalculados")
+    
+    def _due_cycle(self, msg, due):
+        """Ciclo de un envío programado por la cola de vencimientos"""
+        # Los disparos de calendario no tienen periodo fijo: se agrupan por minuto
+        if self._schedule_of(msg).calendar:
+            return int(due // FORWARD_JOB_INTERVAL)
+        return int(due // effective_interval(msg, self.config))
+    
+    def _pair_cycle(self, flow, dest_id, interval, at):
+        """Ciclo de un par en modo suavizado: periodos completos desde su desfase"""
+        return math.floor((at - self._pair_offset(flow, dest_id, interval)) / interval)
+    
+    def _pair_slot(self, flow, dest_id, interval, cycle):
+        """Hora prevista del hueco de un par en un ciclo del modo suavizado"""
+        return cycle * interval + self._pair_offset(flow, dest_id, interval)
+    
+    def _smoothing_window(self):
+        """Ventana de tiempo cubierta por este tick"""
+        now = time.time()
+        tick = max(1, int(self.config.get('suavizado_tick_segundos', 5)))
+        start = now - tick
+        if self._last_tick:
+            # Dentro del margen de gracia se continúa la ventana; tras una parada más larga decide la
+            # política: 'saltar' cubre solo el último tick, 'todas' envía ya cada hueco perdido y 'una'
+            # reparte un envío por par en el intervalo siguiente (sin ráfaga al arrancar)
+            gap = now - self._last_tick
+            if gap < max(tick * 10, self.due_queue.grace) or self.due_queue.policy == 'todas':
+                start = self._last_tick
+            elif self.due_queue.policy == 'una':
+                self._catch_up = (self._last_tick, start)
+        self._last_tick = now
+        return start, now
+    
+    def _catch_up_slot(self, flow, dest_id, interval, window_start, window_end):
+        """Hueco perdido en la parada cuyo envío de recuperación toca en esta ventana (política 'una'), o None"""
+        if not self._catch_up:
+            return None
+        gap_start, gap_end = self._catch_up
+        # Último hueco del par antes de reanudar (como mucho uno por par)
+        slot = self._pair_slot(flow, dest_id, interval, self._pair_cycle(flow, dest_id, interval, gap_end))
+        if slot <= gap_start:
+            return None
+        # Repartido en la primera mitad del tramo hasta su siguiente hueco, en el mismo orden que los huecos
+        send_at = gap_end + (slot + interval - gap_end) / 2
+        return slot if window_start < send_at <= window_end else None
+    
+    def _resolve_destinations(self, msg):
+        """Destinos de un mensaje"""
+        return resolve_destinations(msg, self.config)
+    
+    def _message_priority(self, msg):
+        """Clase de prioridad, peso y flujo WFQ de un mensaje (mensaje > lista > normal)"""
+        list_priority, list_weight = None, 1.0
+        if not msg.get('dest_all', True):
+            # Con varias listas (dest_lists) vale la prioridad más alta y el mayor peso entre ellas
+            class_weights = dict(PRIORITY_WEIGHTS, **self.config.get('pesos_prioridad', {}))
+            options = [self.config.get('prioridades_listas', {}).get(name) or {} for name in self._message_lists(msg)]
+            priorities = [o['prioridad'] for o in options if o.get('prioridad') in class_weights]
+            if priorities:
+                list_priority = max(priorities, key=lambda p: class_weights[p])
+            list_weight = max((float(o.get('peso', 1)) for o in options), default=1.0)
+        
+        priority = msg.get('prioridad') or list_priority or DEFAULT_PRIORITY
+        weight = float(msg.get('peso', 1)) * list_weight
+        flow = msg.get('uid', msg['message_id'])
+        return priority, weight, flow
     
     async def forward_all_messages(self):
         """Reenviar todos los mensajes programados"""
         if not self.application:
             logger.error("❌ Aplicación no disponible para reenvío")
             return
+        if self.stopping:
+            return
+        if self._cycle_busy:
+            self._handle_overlap()
+            return
+        
+        self._cycle_busy = True
+        task = asyncio.current_task()
+        self._cycle_tasks.add(task)
+        try:
+            while True:
+                started = time.monotonic()
+                await self._forward_cycle()
+                self._after_cycle(time.monotonic() - started)
+                if not self._rerun_pending or self.stopping:
+                    break
+                # Política 'agrupar': las ejecuciones perdidas se cubren con un único ciclo inmediato
+                self._rerun_pending = False
+                logger.info("⏩ Ejecutando ciclo agrupado tras un exceso")
+        finally:
+            self._cycle_busy = False
+            self._cycle_tasks.discard(task)
+    
+    def _overrun_policy(self):
+        """Política de exceso de ciclo configurada"""
+        policy = self.config.get('politica_exceso_ciclo', 'saltar')
+        return policy if policy in OVERRUN_POLICIES else 'saltar'
+    
+    def _handle_overlap(self):
+        """Llegó una ejecución con el ciclo anterior aún en curso"""
+        self.overlapping_runs += 1
+        if self._overrun_policy() == 'agrupar':
+            if not self._rerun_pending:
+                logger.warning("⏳ Ciclo anterior aún en curso: se ejecutará otro al terminar")
+            self._rerun_pending = True
+        else:
+            logger.warning(f"⏭️ Ejecución omitida: el ciclo anterior sigue en curso ({self.overlapping_runs} en total)")
+        self._publish_cadence()
+    
+    def _after_cycle(self, duration):
+        """Medir la duración del ciclo y aplicar la política si excede el intervalo"""
+        self.last_cycle_duration = duration
+        if duration > self.current_interval:
+            self.overrun_cycles += 1
+            logger.warning(f"🐢 Ciclo de {duration:.1f}s excede el intervalo de {self.current_interval}s")
         
-        # Recargar configuración y mensajes
-        self.config = load_config()
-        messages = load_messages()
+        if self._overrun_policy() == 'estirar':
+            # Intervalo ajustado a la capacidad medida, nunca por debajo del configurado
+            target = max(self.base_interval, math.ceil(duration * STRETCH_MARGIN))
+            # Histéresis: solo se acorta si la mejora es clara
+            if target > self.current_interval or target < self.current_interval * 0.8:
+                self._reschedule(target)
+        elif self.current_interval != self.base_interval:
+            self._reschedule(self.base_interval)
+        self._publish_cadence()
+    
+    def _reschedule(self, interval):
+        """Cambiar el intervalo del job de reenvío sin perder su identidad"""
+        if not self.scheduler.get_job('forward_messages'):
+            return
+        self.scheduler.reschedule_job('forward_messages', trigger=IntervalTrigger(seconds=interval))
+        logger.info(f"📏 Intervalo de reenvío ajustado: {self.current_interval}s → {interval}s")
+        self.current_interval = interval
+        self._update_next_run()
+    
+    def get_cadence(self):
+        """Cadencia efectiva, duración del último ciclo y contadores de exceso"""
+        return {
+            'policy': self._overrun_policy(),
+            'interval': self.current_interval,
+            'base_interval': self.base_interval,
+            'last_duration': self.last_cycle_duration,
+            'overrun_cycles': self.overrun_cycles,
+            'overlapping_runs': self.overlapping_runs,
+        }
+    
+    def _publish_cadence(self):
+        """Publicar la cadencia en las estadísticas"""
+        self.stats.set_cadence(self.get_cadence())
+    
+    async def _forward_cycle(self):
+        """Planificar y ejecutar un ciclo de reenvío"""        
+        # Configuración compartida con los menús; solo se relee si se editó a mano
+        refresh_config(self.config)
+        messages = self.store.all()
         
         if not messages:
             logger.info("📝 No hay mensajes para reenviar")
+            self._update_next_run()
             return
         
         timezone = self.config.get('timezone', 'Europe/Madrid')
         current_time = get_current_time(timezone)
+        smoothing = self._smoothing_enabled()
+        cycle_started = self._scheduled_run_time()
+        if smoothing:
+            window_start, window_end = self._smoothing_window()
+        else:
+            logger.info(f"🔄 Iniciando reenvío automático - {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
         
-        logger.info(f"🔄 Iniciando reenvío automático - {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+        # Campañas caducadas: solo se miran las que vencieron
+        self.expirations.sync(messages)
+        messages_to_remove = set(self.expirations.pop_expired(self.store, time.time()))
+        blocked_sends = 0
         
-        messages_to_remove = []
+        # Planificar: cada (mensaje, destino) entra en la cola según su clase y peso
+        queue = WeightedFairQueue(self.config.get('pesos_prioridad'))
+        results = {}
+        # Ciclos nuevos en los que participa cada mensaje (para max_cycles)
+        new_cycles = {}
+        longest_interval = 0
         
-        for i, msg in enumerate(messages):
+        if self.schedules.refresh_timezone():
+            self._reschedule_calendars(messages)
+        # Solo los mensajes vencidos según su próximo envío persistido (intervalo o calendario)
+        self.due_queue.sync(messages, cycle_started, self._schedule_of)
+        popped = self.due_queue.pop_due(self.store, time.time(), self._schedule_of)
+        planned = popped
+        if smoothing:
+            # Los mensajes por intervalo se reparten en huecos; los de calendario siguen su horario
+            planned = [(msg, None) for msg in messages if not self._schedule_of(msg).calendar] + [
+                (msg, dues) for msg, dues in popped if self._schedule_of(msg).calendar]
+        
+        for msg, dues in planned:
+            if not is_message_active(msg) or dues == [] or msg['uid'] in messages_to_remove:
+                continue
+            
             try:
-                # Determinar destinos - SOLO GRUPOS (NO ADMIN)
-                if msg.get('dest_all', True):
-                    # Reenviar solo a grupos/canales (NO al admin)
-                    all_destinos = self.config.get('destinos', [])
-                    admin_id = self.config.get('admin_id')
-                    source_channel = self.config.get('source_channel_id')
-                    
-                    # Filtrar admin y canal origen
-                    destinos = []
-                    for dest in all_destinos:
-                        if dest != admin_id and dest != source_channel:
-                            destinos.append(dest)
-                    
-                    logger.info(f"🎯 Destinos filtrados: {len(destinos)} grupos (admin y origen excluidos)")
-                else:
-                    # Usar lista específica
-                    lista_name = msg.get('dest_list')
-                    if lista_name:
-                        listas = self.config.get('listas_destinos', {})
-                        destinos = listas.get(lista_name, [])
-                        
-                        # Filtrar admin también de las listas
-                        admin_id = self.config.get('admin_id')
-                        source_channel = self.config.get('source_channel_id')
-                        destinos = [d for d in destinos if d != admin_id and d != source_channel]
-                    else:
-                        destinos = []
-                
+                destinos = self._resolve_destinations(msg)
                 if not destinos:
                     logger.warning(f"⚠️ Mensaje {msg['message_id']}: Sin destinos configurados")
                     continue
                 
-                # Reenviar a cada destino
-                successful_forwards = 0
-                failed_forwards = 0
+                # Omitir chats donde la última revisión indica que no se puede publicar
+                allowed = [d for d in destinos if self.health.can_post(d) is not False]
+                blocked_sends += len(destinos) - len(allowed)
+                destinos = allowed
                 
-                for dest_id in destinos:
-                    try:
-                        sent_message = await self.application.bot.forward_message(
-                            chat_id=dest_id,
-                            from_chat_id=msg['from_chat_id'],
-                            message_id=msg['message_id']
-                        )
-                        successful_forwards += 1
-                        logger.info(f"✔️ Mensaje {msg['message_id']} → {dest_id}")
-                        
-                        # Programar eliminación automática si está configurada
-                        delete_after_minutes = msg.get('delete_after')
-                        if delete_after_minutes is not None and delete_after_minutes > 0:
-                            self.schedule_message_deletion(dest_id, sent_message.message_id, delete_after_minutes)
-                        
-                        # Pequeña pausa para evitar rate limiting
-                        await asyncio.sleep(0.5)
-                        
-                    except TelegramError as e:
-                        failed_forwards += 1
-                        logger.error(f"❌ Mensaje {msg['message_id']} → {dest_id}: {str(e)}")
-                    
-                    except Exception as e:
-                        failed_forwards += 1
-                        logger.error(f"❌ Error inesperado {msg['message_id']} → {dest_id}: {str(e)}")
-                
-                # Actualizar contador de envíos
-                msg['send_count'] = msg.get('send_count', 0) + successful_forwards
+                priority, weight, flow = self._message_priority(msg)
+                # Envíos del mensaje en este tick: (destino, ciclo, hora prevista)
+                sends = []
+                if dues is None:
+                    interval = self._message_interval(msg)
+                    longest_interval = max(longest_interval, interval)
+                    for dest_id in destinos:
+                        slot = self._catch_up_slot(flow, dest_id, interval, window_start, window_end)
+                        if slot is not None:
+                            sends.append((dest_id, self._pair_cycle(flow, dest_id, interval, slot), slot))
+                    for dest_id in destinos:
+                        if self._pair_due(flow, dest_id, interval, window_start, window_end):
+                            cycle = self._pair_cycle(flow, dest_id, interval, window_end)
+                            sends.append((dest_id, cycle, self._pair_slot(flow, dest_id, interval, cycle)))
+                else:
+                    for due in dues:
+                        cycle = self._due_cycle(msg, due)
+                        sends.extend((dest_id, cycle, due) for dest_id in destinos)
                 
-                logger.info(f"📊 Mensaje {msg['message_id']}: {successful_forwards} ✔️, {failed_forwards} ❌")
+                # No planificar más envíos de los que le quedan a la campaña (en todos los huecos y periodos)
+                remaining = self._remaining_sends(msg)
+                if remaining is not None:
+                    sends = sends[:remaining]
+                if not sends:
+                    continue
+                for dest_id, cycle, due in sends:
+                    queue.push(SendItem(msg, dest_id, flow, priority, weight, cycle, due))
+                if dues is None:
+                    # En modo suavizado un ciclo del mensaje es su intervalo completo
+                    new_cycles[id(msg)] = int(window_end // interval)
+                else:
+                    new_cycles[id(msg)] = len({cycle for _, cycle, _ in sends})
+                results[id(msg)] = [msg, 0, 0]
                 
             except Exception as e:
                 logger.error(f"❌ Error procesando mensaje {msg.get('message_id', 'unknown')}: {str(e)}")
         
-        # Eliminar mensajes que alcanzaron el límite
+        if blocked_sends:
+            logger.info(f"🚫 {blocked_sends} envíos omitidos: destinos sin permiso de publicación")
+        if self._catch_up and smoothing and window_start - self._catch_up[1] > longest_interval:
+            # Ya pasó la mitad del intervalo de todos los mensajes: recuperación terminada
+            self._catch_up = None
+        
+        if not len(queue):
+            # Tick sin huecos ni mensajes vencidos: nada que enviar
+            if messages_to_remove:
+                self._retire(messages_to_remove)
+            elif popped:
+                # Persistir los próximos envíos recalculados
+                self.store.save()
+            self._update_next_run()
+            return
+        
+        logger.info(f"🎯 {len(queue)} envíos planificados - por clase: {queue.depth_by_class()}")
+        await self._execute_plan(queue, results)
+        
+        # Actualizar contadores de envíos y estadísticas en vivo
+        for msg, successful_forwards, failed_forwards in results.values():
+            self._record_sends(msg, successful_forwards, failed_forwards)
+            logger.info(f"📊 Mensaje {msg['message_id']}: {successful_forwards} ✔️, {failed_forwards} ❌")
+            if successful_forwards:
+                self._count_cycles(msg, new_cycles.get(id(msg)), smoothing and not self._schedule_of(msg).calendar)
+            if reached_limit(msg):
+                messages_to_remove.add(msg['uid'])
+        
+        # Eliminar mensajes caducados o que alcanzaron su tope, con una sola escritura
         if messages_to_remove:
-            # Eliminar en orden inverso para mantener índices válidos
-            for i in reversed(messages_to_remove):
-                removed_msg = messages.pop(i)
-                logger.info(f"🗑️ Mensaje {removed_msg['message_id']} eliminado automáticamente")
-            
-            # Guardar mensajes actualizados
-            save_messages(messages)
+            self._retire(messages_to_remove)
         else:
             # Solo guardar contadores actualizados
-            save_messages(messages)
+            self.store.save()
+        self._save_ledger()
+        await self._check_lag_slo()
         
+        self.stats.set_last_cycle(current_time)
+        self._update_next_run()
         logger.info(f"✅ Ciclo de reenvío completado - {len(messages)} mensajes procesados")
     
+    @staticmethod
+    def _count_cycles(msg, new_cycle, smoothing):
+        """Sumar los ciclos en los que salió el mensaje"""
+        if new_cycle is None:
+            return
+        if not smoothing:
+            msg['cycle_count'] = msg.get('cycle_count', 0) + new_cycle
+        elif msg.get('last_cycle') != new_cycle:
+            msg['last_cycle'] = new_cycle
+            msg['cycle_count'] = msg.get('cycle_count', 0) + 1
+    
+    def _remaining_sends(self, msg):
+        """Envíos que le quedan a la campaña contando los ya reservados, o None si no tiene max_sends"""
+        if not msg.get('max_sends'):
+            return None
+        reserved = self._reserved_sends.get(msg.get('uid'), 0)
+        return max(0, msg['max_sends'] - msg.get('send_count', 0) - reserved)
+    
+    def _release_sends(self, msg, count):
+        """Liberar envíos reservados (fallidos, no enviados o ya sumados a send_count)"""
+        uid = msg.get('uid')
+        left = self._reserved_sends.get(uid, 0) - count
+        if left > 0:
+            self._reserved_sends[uid] = left
+        else:
+            self._reserved_sends.pop(uid, None)
+    
+    def _record_sends(self, msg, successful, failed):
+        """Sumar los envíos del mensaje y soltar sus reservas"""
+        self.store.record_sends(msg, successful, failed)
+        self._release_sends(msg, successful)
+    
+    def _retire(self, uids):
+        """Eliminar mensajes terminados en bloque (guarda también los contadores del resto)"""
+        for msg in self.store.remove_many(uids):
+            logger.info(f"🗑️ Mensaje {msg['message_id']} eliminado automáticamente")
+    
+    async def _execute_plan(self, queue, results, cancel=None, progress=None, urgent=False):
+        """Enviar la cola respetando el presupuesto de tasa"""
+        self.current_queue = queue
+        self._active_queues.append(queue)
+        if urgent:
+            self._urgent_jobs += 1
+            self._urgent_idle.clear()
+        try:
+            workers = max(1, int(self.config.get('envios_concurrentes', 1)))
+            await asyncio.gather(*(self._drain_queue(queue, results, cancel, progress, urgent) for _ in range(workers)))
+        finally:
+            if urgent:
+                self._urgent_jobs -= 1
+                if not self._urgent_jobs:
+                    self._urgent_idle.set()
+            self._active_queues.remove(queue)
+            if self.stopping:
+                # Lo que no llegó a salir se guardará en el checkpoint
+                self._leftovers.extend(item for item in queue.pending() if self._resumable(item))
+            if self.current_queue is queue:
+                self.current_queue = None
+            self.last_queue_report = queue.report()
+            self.stats.set_queue_report(self.last_queue_report)
+    
+    async def _drain_queue(self, queue, results, cancel=None, progress=None, urgent=False):
+        """Consumir la cola en orden WFQ hasta vaciarla, hasta el apagado o hasta que se cancele"""
+        while not self.stopping and not (cancel and cancel.is_set()):
+            item = queue.pop()
+            if item is None:
+                return
+            uid = item.msg.get('uid')
+            if not self.ledger.begin(uid, item.dest_id, item.cycle):
+                logger.info(f"⏭️ Duplicado evitado: {item.msg['message_id']} → {item.dest_id} (ciclo {item.cycle})")
+                continue
+            capped = item.msg.get('max_sends') and uid is not None
+            if capped:
+                # Tope max_sends comprobado en cada envío: otros workers, ciclos o difusiones pudieron agotarlo
+                if not self._remaining_sends(item.msg):
+                    self.ledger.finish(uid, item.dest_id, item.cycle, False)
+                    continue
+                self._reserved_sends[uid] = self._reserved_sends.get(uid, 0) + 1
+            if not urgent:
+                # Una difusión en curso tiene preferencia sobre el presupuesto de tasa
+                await self._urgent_idle.wait()
+            await self.rate_limiter.acquire()
+            if self.stopping or (cancel and cancel.is_set()):
+                self.ledger.finish(uid, item.dest_id, item.cycle, False)
+                if capped:
+                    self._release_sends(item.msg, 1)
+                if self.stopping and self._resumable(item):
+                    self._leftovers.append(item)
+                return
+            ok = await self._send_item(item)
+            self.ledger.finish(uid, item.dest_id, item.cycle, ok)
+            if capped and not ok:
+                self._release_sends(item.msg, 1)
+            if ok:
+                self._record_lag(item)
+            tally = results[id(item.msg)]
+            tally[1 if ok else 2] += 1
+            if progress:
+                progress(tally[1], tally[2])
+    
+    def _current_cycle(self, msg, flow, dest_id, at):
+        """Ciclo al que pertenece un envío hecho ahora, igual que en la planificación"""
+        if self._smoothing_enabled() and not self._schedule_of(msg).calendar:
+            return self._pair_cycle(flow, dest_id, self._message_interval(msg), at)
+        return self._due_cycle(msg, at)
+    
+    async def send_now(self, msg, cancel=None, progress=None, urgent=False):
+        """Enviar un mensaje a sus destinos ya, fuera del ciclo, con la misma cola, tasa y registro
+
+        cancel: asyncio.Event que detiene los envíos pendientes; progress(enviados, fallidos, total) al empezar
+        y tras cada envío;
+        urgent: los ciclos no piden turno de tasa mientras dure
+        """
+        if not self.application or self.stopping:
+            return 0, 0
+        
+        task = asyncio.current_task()
+        self._cycle_tasks.add(task)
+        try:
+            destinos = [d for d in self._resolve_destinations(msg) if self.health.can_post(d) is not False]
+            if not destinos:
+                logger.warning(f"⚠️ Mensaje {msg['message_id']}: Sin destinos configurados")
+                return 0, 0
+            
+            # Solo los mensajes registrados cuentan como entrega del ciclo (no se repiten en él)
+            registered = self.store.get(msg.get('uid')) is msg
+            remaining = self._remaining_sends(msg) if registered else None
+            if remaining is not None:
+                destinos = destinos[:remaining]
+            priority, weight, flow = self._message_priority(msg)
+            now = time.time()
+            queue = WeightedFairQueue(self.config.get('pesos_prioridad'))
+            for dest_id in destinos:
+                cycle = self._current_cycle(msg, flow, dest_id, now) if registered else None
+                queue.push(SendItem(msg, dest_id, flow, priority, weight, cycle, now))
+            
+            if registered and not self._smoothing_enabled() and not self._schedule_of(msg).calendar:
+                # El siguiente envío periódico cuenta desde este (los de calendario mantienen su horario)
+                self.due_queue.reschedule(msg, now + effective_interval(msg, self.config))
+            
+            results = {id(msg): [msg, 0, 0]}
+            report = None
+            if progress:
+                total = len(queue)
+                def report(ok, failed):
+                    progress(ok, failed, total)
+                report(0, 0)
+            await self._execute_plan(queue, results, cancel, report, urgent)
+            _, successful_forwards, failed_forwards = results[id(msg)]
+            if registered:
+                self._record_sends(msg, successful_forwards, failed_forwards)
+                if reached_limit(msg):
+                    self._retire([msg['uid']])
+                else:
+                    self.store.save()
+            self._save_ledger()
+            return successful_forwards, failed_forwards
+        finally:
+            self._cycle_tasks.discard(task)
+    
+    @staticmethod
+    def _message_lists(msg):
+        """Listas a las que va un mensaje ('todos' si usa los destinos generales)"""
+        if msg.get('dest_all', True):
+            return [ALL_DESTINATIONS]
+        return msg.get('dest_lists') or ([msg['dest_list']] if msg.get('dest_list') else [])
+    
+    def _record_lag(self, item):
+        """Registrar el retraso de una entrega respecto a su hora prevista"""
+        self.lag.record(time.time() - item.due, item.msg['message_id'], self._message_lists(item.msg), item.priority)
+    
+    async def _check_lag_slo(self):
+        """Avisar al admin si el p95 del retraso supera el objetivo"""
+        if not self.lag.target:
+            return
+        breaches = self.lag.breaches()
+        if not breaches:
+            return
+        for dimension, name, total, p95 in breaches:
+            logger.warning(f"⏱️ SLO de retraso superado: {dimension} {name} p95 {p95:.0f}s ({total} entregas)")
+        admin_id = self.config.get('admin_id')
+        if not admin_id or not self.application:
+            return
+        try:
+            await self.application.bot.send_message(admin_id, self.lag.format_alert(breaches), parse_mode='Markdown')
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo avisar al admin: {e}")
+    
+    def _save_ledger(self):
+        """Podar mensajes eliminados y persistir entregas, salud y analítica de destinos"""
+        self.ledger.prune((m['uid'] for m in self.store.all()), all_destinations(self.config))
+        self.ledger.save()
+        self.health.save()
+        self.analytics.forget(all_destinations(self.config))
+        self.analytics.save()
+        self.message_map.prune()
+        self.message_map.forget_sources(
+            (m['from_chat_id'], source_id)
+            for m in self.store.all() if m.get('reemplazar_anterior')
+            for source_id in (m.get('message_ids') or [m['message_id']])
+        )
+        self.message_map.save()
+    
+    async def resume_from_checkpoint(self, pending):
+        """Enviar los pares (mensaje, destino) que quedaron pendientes al apagar"""
+        task = asyncio.current_task()
+        self._cycle_tasks.add(task)
+        try:
+            queue = WeightedFairQueue(self.config.get('pesos_prioridad'))
+            results = {}
+            for uid, dest_id, cycle, due in pending:
+                msg = self.store.get(uid)
+                # Saltar mensajes borrados o pausados y destinos que ya no le corresponden
+                if msg is None or not is_message_active(msg) or dest_id not in self._resolve_destinations(msg):
+                    continue
+                if self.health.can_post(dest_id) is False:
+                    continue
+                priority, weight, flow = self._message_priority(msg)
+                queue.push(SendItem(msg, dest_id, flow, priority, weight, cycle, due))
+                results.setdefault(id(msg), [msg, 0, 0])
+            
+            if not len(queue):
+                return
+            logger.info(f"♻️ Retomando ciclo interrumpido: {len(queue)} envíos pendientes")
+            await self._execute_plan(queue, results)
+            
+            finished = []
+            for msg, successful_forwards, failed_forwards in results.values():
+                self._record_sends(msg, successful_forwards, failed_forwards)
+                if reached_limit(msg):
+                    finished.append(msg['uid'])
+            if finished:
+                self._retire(finished)
+            else:
+                self.store.save()
+            self._save_ledger()
+            await self._check_lag_slo()
+        finally:
+            self._cycle_tasks.discard(task)
+    
+    @staticmethod
+    def _resumable(item):
+        """Solo los mensajes del almacén se reanudan; los de un solo uso (espejo sin registrar) se descartan"""
+        return item.msg.get('uid') is not None
+    
+    def _save_checkpoint(self, pending):
+        """Guardar los envíos pendientes del ciclo en curso"""
+        data = {
+            'saved_at': time.time(),
+            'last_tick': self._last_tick,
+            'pending': [[item.msg['uid'], item.dest_id, item.cycle, item.due] for item in pending],
+        }
+        if save_state_file(self.checkpoint_file, data):
+            logger.info(f"💾 Checkpoint guardado: {len(pending)} envíos pendientes")
+    
+    def _load_checkpoint(self):
+        """Leer y consumir el checkpoint del último apagado; devuelve los pares pendientes"""
+        data = load_state_file(self.checkpoint_file)
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        if data is None:
+            return []
+        
+        age = time.time() - data.get('saved_at', 0)
+        if age > self.config.get('checkpoint_max_edad_segundos', 3600):
+            logger.info(f"🗑️ Checkpoint descartado por antigüedad ({age:.0f}s)")
+            return []
+        
+        # Continuar la ventana del modo suavizado donde se dejó
+        if data.get('last_tick'):
+            self._last_tick = data['last_tick']
+        # Checkpoints antiguos sin ciclo ni hora prevista: sin control de duplicados y retraso desde ahora
+        return [(entry + [None, None])[:4] for entry in data.get('pending', [])]
+    
+    def _send_mode(self, msg):
+        """Modo de envío del mensaje (mensaje > configuración)"""
+        mode = msg.get('modo_envio') or self.config.get('modo_envio', 'reenviar')
+        return mode if mode in SEND_MODES else 'reenviar'
+    
+    async def _send_item(self, item):
+        """Reenviar o copiar un mensaje a un destino; devuelve True si tuvo éxito"""
+        msg, dest_id = item.msg, item.dest_id
+        is_copy = self._send_mode(msg) == 'copiar'
+        source_ids = msg.get('message_ids') or [msg['message_id']]
+        started = time.monotonic()
+        try:
+            sent_ids = await self._deliver(msg, dest_id, source_ids, is_copy)
+            self.analytics.record(dest_id, time.monotonic() - started, OK)
+            previous = []
+            for source_id, sent_id in zip(source_ids, sent_ids):
+                previous_id = self.message_map.latest(msg['from_chat_id'], source_id, dest_id)
+                if previous_id is not None:
+                    previous.append((source_id, previous_id))
+                self.message_map.add(msg['from_chat_id'], source_id, dest_id, sent_id, is_copy,
+                                     keep_latest=bool(msg.get('reemplazar_anterior')))
+            if msg.get('reemplazar_anterior') and previous:
+                # La copia anterior se borra en la misma pasada: una sola copia viva por grupo
+                await self._delete_previous(msg, dest_id, previous)
+            album = f" (álbum de {len(source_ids)})" if len(source_ids) > 1 else ""
+            logger.info(f"✔️ Mensaje {msg['message_id']}{album} → {dest_id} [{item.priority}]")
+            
+            # Programar eliminación automática si está configurada
+            delete_after_minutes = msg.get('delete_after')
+            if delete_after_minutes is not None and delete_after_minutes > 0:
+                for sent_id in sent_ids:
+                    self.schedule_message_deletion(dest_id, sent_id, delete_after_minutes)
+            return True
+            
+        except TelegramError as e:
+            self.analytics.record(dest_id, time.monotonic() - started, classify_error(e))
+            logger.error(f"❌ Mensaje {msg['message_id']} → {dest_id}: {str(e)}")
+            if self._is_permission_error(e):
+                # Se omite hasta que la revisión de salud confirme que vuelve a tener permiso
+                self.health.mark_failed(dest_id, str(e))
+        
+        except Exception as e:
+            self.analytics.record(dest_id, time.monotonic() - started, classify_error(e))
+            logger.error(f"❌ Error inesperado {msg['message_id']} → {dest_id}: {str(e)}")
+        
+        return False
+    
+    async def _deliver(self, msg, dest_id, source_ids, is_copy):
+        """Reenviar o copiar un mensaje o álbum; devuelve los IDs producidos en el destino, uno por parte"""
+        bot = self.application.bot
+        if len(source_ids) == 1:
+            send = bot.copy_message if is_copy else bot.forward_message
+            sent_message = await send(chat_id=dest_id, from_chat_id=msg['from_chat_id'], message_id=source_ids[0])
+            return [sent_message.message_id]
+        
+        # Álbum: una sola llamada forwardMessages/copyMessages, que lo mantiene agrupado en el destino
+        bulk = bot.copy_messages if is_copy else bot.forward_messages
+        sent_messages = await bulk(chat_id=dest_id, from_chat_id=msg['from_chat_id'], message_ids=source_ids)
+        return [sent_message.message_id for sent_message in sent_messages]
+    
+    async def _delete_previous(self, msg, dest_id, previous):
+        """Borrar las copias anteriores [(id origen, id destino)] en un destino (consume presupuesto de envíos)"""
+        bot = self.application.bot
+        message_ids = [message_id for _, message_id in previous]
+        await self.rate_limiter.acquire()
+        try:
+            if len(message_ids) > 1:
+                # Álbum: todas sus partes en una sola llamada deleteMessages
+                await bot.delete_messages(chat_id=dest_id, message_ids=message_ids)
+            else:
+                await bot.delete_message(chat_id=dest_id, message_id=message_ids[0])
+            logger.info(f"♻️ Copia anterior de {msg['message_id']} borrada en {dest_id}")
+        except TelegramError as e:
+            logger.warning(f"⚠️ No se pudo borrar la copia anterior de {msg['message_id']} en {dest_id}: {e}")
+        for source_id, message_id in previous:
+            self.message_map.discard(msg['from_chat_id'], source_id, dest_id, message_id)
+    
+    @staticmethod
+    def _is_permission_error(error):
+        """Error que se repetirá en cada envío (expulsado, sin derechos o chat inexistente)"""
+        if isinstance(error, Forbidden):
+            return True
+        text = str(error).lower()
+        return isinstance(error, BadRequest) and ('not found' in text or 'not enough rights' in text)
+    
+    def get_queue_report(self):
+        """Profundidad y tiempo de espera por clase (ciclo en curso o último)"""
+        if self.current_queue is not None:
+            return self.current_queue.report()
+        return self.last_queue_report
+    
     def stop_forwarding(self):
         """Detener el sistema de reenvío"""
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
         if self.is_running:
-            self.scheduler.shutdown()
             self.is_running = False
+            self.stats.set_running(False)
             logger.info("🛑 Sistema de reenvío detenido")
     
+    async def graceful_stop(self, timeout=None):
+        """Dejar de desencolar, esperar los envíos en vuelo y guardar lo pendiente"""
+        if timeout is None:
+            timeout = self.config.get('apagado_timeout_segundos', 20)
+        self.stopping = True
+        if self.scheduler.running:
+            # Sin ciclos nuevos mientras se drena
+            self.scheduler.pause()
+        
+        if self._cycle_tasks:
+            logger.info(f"⏳ Esperando envíos en curso (máx. {timeout}s)...")
+            done, still_running = await asyncio.wait(set(self._cycle_tasks), timeout=timeout)
+            if still_running:
+                logger.warning(f"⚠️ {len(still_running)} ciclo(s) sin terminar tras {timeout}s")
+        
+        pending = list(self._leftovers)
+        for queue in self._active_queues:
+            pending.extend(item for item in queue.pending() if self._resumable(item))
+        self.ledger.save()
+        if pending:
+            self._save_checkpoint(pending)
+        elif self._smoothing_enabled() and self._last_tick:
+            # Sin pendientes, pero se conserva la ventana del modo suavizado
+            self._save_checkpoint([])
+        
+        self.stop_forwarding()
+    
     def get_status(self):
         """Obtener estado del forwarder"""
         if not self.is_running:
             return "⏹️ Detenido"
         
-        jobs = self.scheduler.get_jobs()
-        if jobs:
-            next_run = jobs[0].next_run_time
-            if next_run:
-                return f"🔄 Activo - Próximo envío: {next_run.strftime('%H:%M:%S')}"
+        status = "🔄 Activo"
+        job = self.scheduler.get_job('forward_messages')
+        if job and job.next_run_time:
+            status += f" - Próximo envío: {job.next_run_time.strftime('%H:%M:%S')}"
         
-        return "🔄 Activo"
+        cadence = self.get_cadence()
+        status += f" - Cada {cadence['interval']}s"
+        if cadence['interval'] != cadence['base_interval']:
+            status += f" (estirado desde {cadence['base_interval']}s)"
+        if cadence['last_duration'] is not None:
+            status += f", último ciclo {cadence['last_duration']:.1f}s"
+        if cadence['overrun_cycles'] or cadence['overlapping_runs']:
+            status += (
+                f" - ⚠️ {cadence['overrun_cycles']} ciclos excedidos, "
+                f"{cadence['overlapping_runs']} ejecuciones solapadas ({cadence['policy']})"
+            )
+        return status
     
     def update_interval(self, new_interval):
         """Actualizar intervalo de reenvío"""
@@ -0,0 +1,153 @@
+"""
+Teclados estáticos del bot, construidos una sola vez al importar el módulo
+"""
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+
+# Textos del teclado principal
+BTN_LINK_CHANNEL = "🔗 Vincular Canal"
+BTN_MESSAGE_MANAGEMENT = "📝 Gestión de Mensajes"
+BTN_LIST_MANAGEMENT = "📋 Gestión de Listas"
+BTN_BOT_STATUS = "📄 Estado del Bot"
+BTN_BACK_TO_MENU = "🔙 Volver al Menú"
+BTN_VIEW_MESSAGES = "📝 Ver Mensajes"
+BTN_DELETE_MESSAGES = "🗑️ Eliminar Mensajes"
+
+# Textos que nunca deben tratarse como mensajes compartidos
+KEYBOARD_COMMANDS = frozenset([
+    BTN_LINK_CHANNEL, BTN_MESSAGE_MANAGEMENT, BTN_LIST_MANAGEMENT,
+    BTN_BOT_STATUS, BTN_BACK_TO_MENU, BTN_VIEW_MESSAGES, BTN_DELETE_MESSAGES,
+    "📥 Agregar Mensaje", "📋 Ver Mensajes", "➕ Crear Lista",
+    "👁️ Ver Listas", "🗑️ Eliminar Listas", "Cancelar", "Atrás",
+    "🏠 Menú Principal", "⚙️ Configuración", "📊 Estadísticas"
+])
+
+MAIN_MENU_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        [BTN_LINK_CHANNEL, BTN_MESSAGE_MANAGEMENT],
+        [BTN_LIST_MANAGEMENT, BTN_BOT_STATUS]
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=False
+)
+
+BACK_TO_MENU_KEYBOARD = ReplyKeyboardMarkup([[BTN_BACK_TO_MENU]], resize_keyboard=True)
+
+BACK_TO_MAIN_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
+])
+
+BACK_TO_DEST_MENU_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Volver a destinos", callback_data="dest_menu")]
+])
+
+BACK_TO_DESTINATIONS_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Gestión de Destinos", callback_data="destinations")]
+])
+
+BACK_TO_LISTS_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]
+])
+
+BACK_TO_LIST_MANAGEMENT_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Gestión de Listas", callback_data="dest_lists")]
+])
+
+CANCEL_TO_LISTS_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("❌ Cancelar", callback_data="dest_lists")]
+])
+
+DESTINATIONS_MENU_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Agregar Destino", callback_data="dest_add")],
+    [InlineKeyboardButton("📥 Importar desde archivo", callback_data="dest_import")],
+    [InlineKeyboardButton("👁️ Ver Destinos", callback_data="dest_view")],
+    [InlineKeyboardButton("🗑️ Eliminar Destino", callback_data="dest_delete")],
+    [InlineKeyboardButton("📁 Gestionar Listas", callback_data="dest_lists")],
+    [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
+])
+
+MESSAGE_MANAGEMENT_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📥 Ver Mensajes", callback_data="show_messages_list")],
+    [InlineKeyboardButton("🗑️ Eliminar Mensajes", callback_data="delete_messages")],
+    [InlineKeyboardButton("📣 Difundir ahora", callback_data="broadcast_start")],
+    [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
+])
+
+LIST_MANAGEMENT_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
+    [InlineKeyboardButton("👁️ Ver Listas", callback_data="list_view")],
+    [InlineKeyboardButton("🗑️ Eliminar Lista", callback_data="list_delete")],
+    [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
+])
+
+MANAGE_LISTS_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
+    [InlineKeyboardButton("👁️ Ver Listas", callback_data="list_view")],
+    [InlineKeyboardButton("🗑️ Eliminar Lista", callback_data="list_delete")],
+    [InlineKeyboardButton("🔙 Volver al Menú", callback_data="main_menu")]
+])
+
+EMPTY_LISTS_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
+    [InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]
+])
+
+CHANNEL_MENU_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔗 Vincular Canal", callback_data="channel_link")],
+    [InlineKeyboardButton("🚫 Desvincular Canal", callback_data="channel_unlink")],
+    [InlineKeyboardButton("🪞 Espejo en vivo: activar/desactivar", callback_data="channel_mirror_toggle")],
+    [InlineKeyboardButton("🔙 Volver", callback_data="main_menu")]
+])
+
+LINK_CHANNEL_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📺 Gestionar Canal", callback_data="show_channel_menu")],
+    [InlineKeyboardButton("🪞 Espejo en vivo: activar/desactivar", callback_data="channel_mirror_toggle")],
+    [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
+])
+
+BACK_TO_CHANNEL_MENU_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Volver", callback_data="show_channel_menu")]
+])
+
+BOT_STATUS_INLINE = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔄 Recargar Estado", callback_data="bot_status"),
+        InlineKeyboardButton("⚙️ Configuración", callback_data="main_menu")
+    ],
+    [
+        InlineKeyboardButton("📊 Ver Mensajes", callback_data="show_messages_list"),
+        InlineKeyboardButton("🎯 Gestionar Destinos", callback_data="show_destinations_menu")
+    ],
+    [
+        InlineKeyboardButton("📋 Ver Listas", callback_data="dest_lists")
+    ],
+    [
+        InlineKeyboardButton("📐 Capacidad", callback_data="capacity_report"),
+        InlineKeyboardButton("📈 Analítica", callback_data="analytics_report")
+    ],
+    [
+        InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")
+    ]
+])
+
+ANALYTICS_INLINE = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("🔄 Actualizar", callback_data="analytics_report"),
+        InlineKeyboardButton("📄 Exportar CSV", callback_data="analytics_export")
+    ],
+    [InlineKeyboardButton("🔙 Volver", callback_data="bot_status")]
+])
+
+CAPACITY_REPORT_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Recalcular", callback_data="capacity_report")],
+    [InlineKeyboardButton("🔙 Volver", callback_data="bot_status")]
+])
+
+AUTO_CONFIG_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Sí", callback_data="auto_config_yes")],
+    [InlineKeyboardButton("❌ No", callback_data="auto_config_no")]
+])
+
+BROADCAST_ABORT_INLINE = InlineKeyboardMarkup([
+    [InlineKeyboardButton("❌ Cancelar", callback_data="broadcast_abort")]
+])
@@ -0,0 +1,161 @@
+"""
+Álgebra de conjuntos sobre listas de destinos: bitmaps por lista y listas compuestas
+"""
+
+import re
+from utils import get_config_version
+
+# Nombre reservado para los destinos generales dentro de las expresiones
+ALL_DESTINATIONS = 'todos'
+
+UNION = ('∪', '|', '+')
+INTERSECTION = ('∩', '&')
+DIFFERENCE = ('−', '-')
+
+# Operadores; '-' y '+' solo con espacios alrededor para permitir guiones en los nombres
+_TOKEN_RE = re.compile(r'\s*(∪|∩|−|\||&|\(|\)|\s-\s|\s\+\s)\s*')
+
+class ListExpressionError(ValueError):
+    pass
+
+def _tokenize(expression):
+    """Separar nombres de listas y operadores"""
+    tokens = []
+    for part in _TOKEN_RE.split(f" {expression} "):
+        part = part.strip()
+        if part:
+            tokens.append(part)
+    return tokens
+
+class ListAlgebra:
+    def __init__(self, config):
+        self.config = config
+        listas = config.get('listas_destinos', {})
+        self.composites = config.get('listas_compuestas', {})
+
+        # Registro de destinos: chat_id -> bit, en orden para decodificar listas ordenadas
+        chat_ids = set(config.get('destinos', []))
+        for lista in listas.values():
+            chat_ids.update(lista)
+        self.chat_ids = sorted(chat_ids)
+        self._index = {chat_id: i for i, chat_id in enumerate(self.chat_ids)}
+
+        self._bitmaps = {name: self._encode(lista) for name, lista in listas.items()}
+        self._bitmaps.setdefault(ALL_DESTINATIONS, self._encode(config.get('destinos', [])))
+        self._members = {}
+        self._resolving = set()
+
+    def _encode(self, chat_ids):
+        """Bitmap de un conjunto de chats"""
+        bitmap = 0
+        for chat_id in chat_ids:
+            bitmap |= 1 << self._index[chat_id]
+        return bitmap
+
+    def members(self, bitmap):
+        """Chats de un bitmap en orden ascendente"""
+        result = []
+        while bitmap:
+            low = bitmap & -bitmap
+            result.append(self.chat_ids[low.bit_length() - 1])
+            bitmap ^= low
+        return result
+
+    def names(self):
+        """Listas simples y compuestas disponibles"""
+        return sorted(set(self.config.get('listas_destinos', {})) | set(self.composites))
+
+    def bitmap(self, name):
+        """Bitmap de una lista simple o compuesta (las compuestas se evalúan una vez)"""
+        if name in self._bitmaps:
+            return self._bitmaps[name]
+        if name not in self.composites:
+            raise ListExpressionError(f"Lista desconocida: {name}")
+        if name in self._resolving:
+            raise ListExpressionError(f"Definición circular en la lista {name}")
+        self._resolving.add(name)
+        try:
+            bitmap = self.evaluate(self.composites[name])
+        finally:
+            self._resolving.discard(name)
+        self._bitmaps[name] = bitmap
+        return bitmap
+
+    def evaluate(self, expression):
+        """Evaluar una expresión como 'VIP ∪ Regional − Pausados' (∩ tiene precedencia)"""
+        tokens = _tokenize(expression)
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def take():
+            nonlocal position
+            token = peek()
+            position += 1
+            return token
+
+        def atom():
+            token = take()
+            if token is None:
+                raise ListExpressionError(f"Expresión incompleta: {expression}")
+            if token == '(':
+                value = union_or_difference()
+                if take() != ')':
+                    raise ListExpressionError(f"Falta ')' en: {expression}")
+                return value
+            if token in UNION + INTERSECTION + DIFFERENCE + (')',):
+                raise ListExpressionError(f"Operador inesperado '{token}' en: {expression}")
+            return self.bitmap(token)
+
+        def intersection():
+            value = atom()
+            while peek() in INTERSECTION:
+                take()
+                value &= atom()
+            return value
+
+        def union_or_difference():
+            value = intersection()
+            while peek() in UNION + DIFFERENCE:
+                if take() in UNION:
+                    value |= intersection()
+                else:
+                    value &= ~intersection()
+            return value
+
+        result = union_or_difference()
+        if peek() is not None:
+            raise ListExpressionError(f"Sobra '{peek()}' en: {expression}")
+        return result
+
+    def resolve(self, name):
+        """Chats de una lista simple o compuesta, ordenados y sin duplicados"""
+        members = self._members.get(name)
+        if members is None:
+            members = self.members(self.bitmap(name))
+            self._members[name] = members
+        return members
+
+    def resolve_many(self, names):
+        """Unión de varias listas, cada chat una sola vez"""
+        if len(names) == 1:
+            return self.resolve(names[0])
+        bitmap = 0
+        for name in names:
+            bitmap |= self.bitmap(name)
+        return self.members(bitmap)
+
+# Álgebra compilada por configuración: (id del dict, versión) -> ListAlgebra
+_cache = {}
+
+def get_list_algebra(config):
+    """Álgebra de listas de la configuración, recalculada solo al cambiar de versión"""
+    key = id(config)
+    version = get_config_version()
+    cached = _cache.get(key)
+    if cached and cached[0] == version and cached[1].config is config:
+        return cached[1]
+    algebra = ListAlgebra(config)
+    _cache[key] = (version, algebra)
+    return algebra
@@ -8,12 +8,20 @@ import asyncio
 import logging
 import signal
 import sys
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+import time
+from telegram import Update
+from telegram.ext import (
+    Application, CommandHandler, MessageHandler, CallbackQueryHandler, ChatMemberHandler, TypeHandler, filters
+)
 
 # Importar configuración y módulos
 import config
 from bot_handler import BotHandler
 from forwarder import Forwarder
+from channel_mirror import ChannelMirror
+from edit_propagation import EditPropagator
+from message_store import MessageStore
+from planner import capacity_warning
 
 from utils import load_config, logger
 
@@ -32,20 +40,34 @@ class TelegramForwarderBot:
         self.application = None
         self.bot_handler = None
         self.forwarder = None
+        self.message_store = None
         self.config_file = config_file or 'config.json'
         self.messages_file = messages_file or 'mensajes.json'
+        # Snapshot único de configuración compartido por handler, forwarder y listas
         self.config = load_config(self.config_file)
         
-        # Manejar señales para cierre limpio
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
+        # Tiempos de arranque por fase y tiempo hasta el primer update
+        self._started_at = time.perf_counter()
+        self.startup_timings = {}
+        self.first_update_at = None
+        
+        # Evento de parada: las señales solo lo activan, el cierre lo hace start_bot
+        self.stop_event = None
     
-    def _signal_handler(self, signum, frame):
+    def _install_signal_handlers(self):
+        """Manejar señales para cierre limpio dentro del bucle de eventos"""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self._signal_handler, signum)
+            except NotImplementedError:
+                # Windows: sin add_signal_handler, se reenvía al bucle de forma segura
+                signal.signal(signum, lambda s, frame: loop.call_soon_threadsafe(self._signal_handler, s))
+    
+    def _signal_handler(self, signum, frame=None):
         """Manejar señales de cierre"""
         logger.info(f"📡 Señal {signum} recibida, cerrando bot...")
-        if self.forwarder:
-            self.forwarder.stop_forwarding()
-        sys.exit(0)
+        self.stop_event.set()
     
     async def setup_bot(self):
         """Configurar el bot y sus handlers"""
@@ -59,15 +81,25 @@ class TelegramForwarderBot:
         # Crear aplicación
         self.application = Application.builder().token(config.BOT_TOKEN).build()
         
+        # Almacén de mensajes y estadísticas en vivo compartidos
+        self.message_store = MessageStore(self.messages_file)
+        
+        # Crear forwarder (su caché de salud de destinos se comparte con los menús)
+        self.forwarder = Forwarder(self.config, self.message_store)
+        self.application.bot_data['forwarder'] = self.forwarder
+        # Espejo en vivo del canal origen (usa el mismo motor de reenvío)
+        self.mirror = ChannelMirror(self.config, self.forwarder, self.message_store)
+        # Ediciones del origen aplicadas a las copias enviadas
+        self.edits = EditPropagator(self.config, self.forwarder)
+        
         # Crear handler principal
-        self.bot_handler = BotHandler()
+        self.bot_handler = BotHandler(self.config_file, self.messages_file, self.message_store, self.config,
+                                      self.forwarder.health)
         
         # Pasar referencia del bot_handler al contexto y configurar en el handler
         self.application.bot_data['bot_handler'] = self.bot_handler
         self.bot_handler.application = self.application
-        
-        # Crear forwarder
-        self.forwarder = Forwarder(self.config)
+        self.application.bot_data['stats'] = self.message_store.stats
         
 
         
@@ -79,6 +111,9 @@ class TelegramForwarderBot:
     
     async def _setup_handlers(self):
         """Configurar todos los handlers del bot"""
+        # Medir el tiempo hasta el primer update (grupo previo, no bloquea al resto)
+        self.application.add_handler(TypeHandler(Update, self._track_first_update), group=-1)
+        
         # Comandos
         self.application.add_handler(
             CommandHandler("start", self.bot_handler.start)
@@ -96,6 +131,14 @@ class TelegramForwarderBot:
             CommandHandler("bots_activos", self.bot_handler.bots_activos)
         )
         
+        # Publicaciones y ediciones de canales (antes que los handlers de mensajes, que no las esperan)
+        self.application.add_handler(
+            MessageHandler(filters.UpdateType.CHANNEL_POST, self.mirror.handle_channel_post)
+        )
+        self.application.add_handler(
+            MessageHandler(filters.UpdateType.EDITED_CHANNEL_POST, self.edits.handle_edited_channel_post)
+        )
+        
         # Callbacks de botones inline
         self.application.add_handler(
             CallbackQueryHandler(self.bot_handler.handle_callback)
@@ -127,11 +170,11 @@ class TelegramForwarderBot:
         
 
         
-        # Detectar cuando el bot es agregado a nuevos grupos
+        # Altas, bajas y cambios de permisos del bot en grupos y canales
         self.application.add_handler(
-            MessageHandler(
-                filters.StatusUpdate.NEW_CHAT_MEMBERS,
-                self.bot_handler.handle_new_chat_member
+            ChatMemberHandler(
+                self.bot_handler.handle_my_chat_member,
+                ChatMemberHandler.MY_CHAT_MEMBER
             )
         )
         
@@ -154,52 +197,71 @@ class TelegramForwarderBot:
             except:
                 pass
     
+    def _phase(self, name, started):
+        """Registrar la duración de una fase de arranque"""
+        self.startup_timings[name] = time.perf_counter() - started
+    
+    async def _track_first_update(self, update, context):
+        """Registrar el primer update recibido tras el arranque"""
+        if self.first_update_at is None:
+            self.first_update_at = time.perf_counter()
+            logger.info(f"⏱️ Primer update atendido a los {self.first_update_at - self._started_at:.2f}s del arranque")
+    
     async def start_bot(self):
         """Iniciar el bot"""
         logger.info("🚀 Iniciando bot de reenvío automático...")
         
+        self.stop_event = asyncio.Event()
+        self._install_signal_handlers()
+        
         # Configurar bot
+        started = time.perf_counter()
         if not await self.setup_bot():
             return False
+        self._phase('configuración', started)
         
         try:
-            # Inicializar aplicación
+            # Inicializar aplicación (initialize() ya obtiene y cachea getMe)
+            started = time.perf_counter()
             await self.application.initialize()
             await self.application.start()
+            self._phase('inicialización', started)
             
-            # Obtener información del bot
-            bot_info = await self.application.bot.get_me()
-            logger.info(f"🤖 Bot iniciado: @{bot_info.username} ({bot_info.first_name})")
+            # Iniciar polling de inmediato; el calentamiento corre después en paralelo
+            started = time.perf_counter()
+            logger.info("📡 Iniciando polling...")
+            await self.application.updater.start_polling(
+                drop_pending_updates=True,
+                allowed_updates=["message", "channel_post", "edited_channel_post", "callback_query", "my_chat_member"]
+            )
+            self._phase('polling', started)
             
             # Mostrar configuración actual
-            await self._show_startup_info()
+            self._show_startup_info()
             
             # Iniciar sistema de reenvío automático
-            from utils import load_messages
-            messages = load_messages()
-            active_messages = [msg for msg in messages if msg.get('active', False) or msg.get('activo', False)]
+            active_count = self.message_store.stats.active
             
-            if active_messages:
-                logger.info(f"🔄 Iniciando sistema de reenvío con {len(active_messages)} mensajes activos")
+            if active_count:
+                logger.info(f"🔄 Iniciando sistema de reenvío con {active_count} mensajes activos")
                 self.forwarder.start_forwarding(self.application)
             else:
                 logger.info("⏸️ Sistema de reenvío en standby - no hay mensajes activos")
             
-
+            # Calentamiento de red concurrente: identidad, aviso al admin y destinos
+            started = time.perf_counter()
+            await self._warm_up()
+            self._phase('calentamiento', started)
+            self._log_startup_timings()
             
-            # Iniciar polling
-            logger.info("📡 Iniciando polling...")
-            await self.application.updater.start_polling(
-                drop_pending_updates=True,
-                allowed_updates=["message", "callback_query"]
-            )
+            # Revisión periódica de permisos en los destinos
+            self.forwarder.start_health_sweep(self.application)
             
             # Mantener el bot corriendo
             logger.info("✅ Bot completamente iniciado y funcionando")
             
-            # Mantener el bot corriendo
-            while True:
-                await asyncio.sleep(1)
+            # Mantener el bot corriendo hasta recibir una señal de parada
+            await self.stop_event.wait()
             
         except Exception as e:
             logger.error(f"❌ Error al iniciar bot: {e}")
@@ -209,7 +271,29 @@ class TelegramForwarderBot:
             # Limpieza
             await self._cleanup()
     
-    async def _show_startup_info(self):
+    async def _warm_up(self):
+        """Ejecutar en paralelo las llamadas de red del arranque"""
+        bot_info = self.application.bot.bot
+        self.message_store.stats.set_bot_identity(bot_info)
+        logger.info(f"🤖 Bot iniciado: @{bot_info.username} ({bot_info.first_name})")
+        
+        tasks = [self._notify_admin()]
+        if self.config.get('verificar_destinos_al_iniciar', False):
+            self.forwarder.application = self.application
+            tasks.append(self.forwarder.run_health_sweep())
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Error en el calentamiento de arranque: {result}")
+    
+    def _log_startup_timings(self):
+        """Desglose de tiempos de arranque por fase"""
+        phases = " · ".join(f"{name} {seconds:.2f}s" for name, seconds in self.startup_timings.items())
+        total = time.perf_counter() - self._started_at
+        logger.info(f"⏱️ Arranque: {phases} · total {total:.2f}s")
+    
+    def _show_startup_info(self):
         """Mostrar información de configuración al inicio"""
         admin_id = self.config.get('admin_id')
         origen = self.config.get('origen_chat_id', 'No configurado')
@@ -218,9 +302,7 @@ class TelegramForwarderBot:
         intervalo = self.config.get('intervalo_global', 3600)
         timezone = self.config.get('timezone', 'Europe/Madrid')
         
-        from utils import load_messages
-        messages = load_messages()
-        mensajes_count = len(messages)
+        mensajes_count = self.message_store.stats.total
         
         logger.info("=" * 50)
         logger.info("📊 CONFIGURACIÓN ACTUAL:")
@@ -233,7 +315,18 @@ class TelegramForwarderBot:
         logger.info(f"🌐 Zona horaria: {timezone}")
         logger.info("=" * 50)
         
-        # Enviar mensaje de inicio al admin si está configurado
+        # Avisar si la demanda programada supera la capacidad del limitador
+        capacity = capacity_warning(self.config, self.message_store.all())
+        if capacity:
+            logger.warning(capacity)
+            logger.warning("📐 Ejecuta 'python planner.py' para ver el detalle por mensaje")
+    
+    async def _notify_admin(self):
+        """Enviar mensaje de inicio al admin si está configurado"""
+        admin_id = self.config.get('admin_id')
+        mensajes_count = self.message_store.stats.total
+        destinos_count = len(self.config.get('destinos', []))
+        
         if admin_id:
             try:
                 startup_message = f"""🤖 **Bot Iniciado**
@@ -259,12 +352,17 @@ Usa /start para el menú principal."""
         logger.info("🧹 Realizando limpieza...")
         
         try:
+            # Primero dejar de recibir updates para no aceptar trabajo nuevo
+            if self.application and self.application.updater.running:
+                await self.application.updater.stop()
+            
+            # Drenar envíos en curso (con límite de tiempo) y guardar checkpoint
             if self.forwarder:
-                self.forwarder.stop_forwarding()
+                await self.forwarder.graceful_stop()
             
             if self.application:
-                await self.application.updater.stop()
-                await self.application.stop()
+                if self.application.running:
+                    await self.application.stop()
                 await self.application.shutdown()
             
             logger.info("✅ Limpieza completada")
@@ -4,44 +4,107 @@ MenuManager limpio y funcional para el bot de Telegram
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
+import io
 import logging
-from utils import save_config
+from datetime import datetime
+from utils import save_config, get_config_version
+from stats import BotStats
+from state_store import ConversationStateStore
+from pagination import CursorIndex, page_nav_row
+from planner import CapacityPlanner, format_report, check_capacity
+from list_algebra import get_list_algebra, ListExpressionError
+from delivery_slo import format_lag
+from keyboards import (
+    MAIN_MENU_KEYBOARD, BACK_TO_MAIN_INLINE, BACK_TO_DEST_MENU_INLINE,
+    BACK_TO_DESTINATIONS_INLINE, BACK_TO_LISTS_INLINE, BACK_TO_LIST_MANAGEMENT_INLINE,
+    CANCEL_TO_LISTS_INLINE, DESTINATIONS_MENU_INLINE, MESSAGE_MANAGEMENT_INLINE,
+    LIST_MANAGEMENT_INLINE, MANAGE_LISTS_INLINE, EMPTY_LISTS_INLINE,
+    CHANNEL_MENU_INLINE, LINK_CHANNEL_INLINE, BACK_TO_CHANNEL_MENU_INLINE, BOT_STATUS_INLINE, CAPACITY_REPORT_INLINE, ANALYTICS_INLINE
+)
 
 logger = logging.getLogger(__name__)
 
+# Tamaños de página de las listas del panel
+DESTINATIONS_PAGE_SIZE = 20
+DELETE_BUTTONS_PAGE_SIZE = 8
+LISTS_PAGE_SIZE = 10
+ANALYTICS_WORST_SIZE = 10
+
 class MenuManager:
-    def __init__(self, config, config_file='config.json', messages_file='mensajes.json'):
+    def __init__(self, config, config_file='config.json', messages_file='mensajes.json', stats=None, states=None,
+                 message_store=None, health=None):
         self.config = config
         self.config_file = config_file
         self.messages_file = messages_file
+        self.message_store = message_store
+        # Caché de salud de destinos: títulos y permisos sin llamadas a la API al renderizar
+        self.health = health
+        self.stats = stats or (message_store.stats if message_store else BotStats())
+        # Estados de conversación compartidos con BotHandler
+        self.states = states if states is not None else ConversationStateStore()
+        # Índices de paginación derivados de la configuración: tipo -> (versión, índice)
+        self._indexes = {}
+    
+    def _config_index(self, kind):
+        """Índice ordenado de destinos ('destinos'), nombres de listas ('listas') o de listas compuestas ('compuestas')"""
+        version = get_config_version()
+        cached = self._indexes.get(kind)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        if kind == 'destinos':
+            index = CursorIndex(set(self.config.get('destinos', [])))
+        elif kind == 'compuestas':
+            index = CursorIndex(self.config.get('listas_compuestas', {}).keys())
+        else:
+            index = CursorIndex(self.config.get('listas_destinos', {}).keys())
+        self._indexes[kind] = (version, index)
+        return index
+    
+    def _dest_label(self, chat_id):
+        """Título cacheado del destino con su ID y estado de publicación"""
+        if self.health is None:
+            return f"`{chat_id}`"
+        title = self.health.title(chat_id)
+        can_post = self.health.can_post(chat_id)
+        icon = "" if can_post is None else ("🟢 " if can_post else "🔴 ")
+        if title:
+            return f"{icon}{escape_markdown(title)} (`{chat_id}`)"
+        return f"{icon}`{chat_id}`"
+    
+    def _check_capacity(self):
+        """(aviso, rechazar) de capacidad con la configuración actual"""
+        if self.message_store is None:
+            return None, False
+        return check_capacity(self.config, self.message_store.all())
+    
+    @staticmethod
+    async def _render(update, text, reply_markup):
+        """Editar el mensaje del callback o responder con uno nuevo"""
+        if update.callback_query:
+            await update.callback_query.edit_message_text(
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
+        else:
+            await update.message.reply_text(
+                text=text,
+                reply_markup=reply_markup,
+                parse_mode='Markdown'
+            )
     
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostrar menú principal"""
-        keyboard = [
-            ["🔗 Vincular Canal", "📝 Gestión de Mensajes"],
-            ["📋 Gestión de Listas", "📄 Estado del Bot"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=False)
-        
+        reply_markup = MAIN_MENU_KEYBOARD
+
         # Obtener estadísticas actuales
-        try:
-            import json
-            destinos = self.config.get('destinos', [])
-            listas = self.config.get('listas_destinos', {})
-            # Cargar mensajes directamente
-            try:
-                with open(self.messages_file, 'r', encoding='utf-8') as f:
-                    mensajes = json.load(f)
-            except:
-                mensajes = []
-            canal_origen = self.config.get('origen_chat_id')
-            mensajes_activos = len([m for m in mensajes if m.get('activo', False)])
-        except:
-            destinos = []
-            listas = {}
-            mensajes_activos = 0
-            canal_origen = None
-        
+        destinos = self.config.get('destinos', [])
+        listas = self.config.get('listas_destinos', {})
+        canal_origen = self.config.get('origen_chat_id')
+        mensajes_activos = self.stats.active
+
         welcome_text = (
             "🚀 **Bot de Reenvío Automático**\n"
             "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
@@ -49,7 +112,7 @@ class MenuManager:
             f"🔗 Canal origen: {'✅ Configurado' if canal_origen else '❌ No configurado'}\n"
             f"📂 Destinos: {len(destinos)} individuales, {len(listas)} listas\n"
             f"📝 Mensajes: {mensajes_activos} activos\n"
-            f"🤖 Sistema: 🟢 Activo\n\n"
+            f"🤖 Sistema: {'🟢 Activo' if self.stats.running else '🟡 En espera'}\n\n"
             "🎯 **¡Listo para reenviar!** Usa los botones del menú 👇\n\n"
             "❓ **¿Necesitas ayuda?** Contacta @frankosmel"
         )
@@ -79,15 +142,7 @@ class MenuManager:
             f"Selecciona una opción:"
         )
         
-        keyboard = [
-            [InlineKeyboardButton("➕ Agregar Destino", callback_data="dest_add")],
-            [InlineKeyboardButton("👁️ Ver Destinos", callback_data="dest_view")],
-            [InlineKeyboardButton("🗑️ Eliminar Destino", callback_data="dest_delete")],
-            [InlineKeyboardButton("📁 Gestionar Listas", callback_data="dest_lists")],
-            [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = DESTINATIONS_MENU_INLINE
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -102,53 +157,21 @@ class MenuManager:
                 parse_mode='Markdown'
             )
     
-    async def handle_destinations_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
-        """Manejar callbacks de destinos"""
-        if data == "dest_add":
-            await update.callback_query.edit_message_text(
-                "📂 **Agregar Destino**\n\n"
-                "Envía el ID del grupo/canal destino.\n\n"
-                "**Ejemplo:** `-1001234567890`\n\n"
-                "Para obtener el ID:\n"
-                "1. Reenvía un mensaje del canal/grupo\n"
-                "2. O usa bots como @getidsbot",
-                parse_mode='Markdown'
-            )
-            # Establecer estado usando chat_data
-            context.chat_data['waiting_dest_id'] = True
-        
-        elif data == "dest_view":
-            await self.show_destinations_view(update, context)
-        
-        elif data == "dest_delete":
-            await self.show_delete_destinations(update, context)
-        
-        elif data == "dest_lists":
-            await self.show_manage_lists(update, context)
-        
-        elif data == "list_create":
-            await self.request_list_name(update, context)
-        
-        elif data == "list_view":
-            await self.show_existing_lists(update, context)
-        
-        elif data == "list_delete":
-            await self.show_delete_lists_menu(update, context)
-        
-        elif data.startswith("delete_list_"):
-            list_name = data.replace("delete_list_", "")
-            await self.delete_list(update, context, list_name)
-        
-        elif data == "dest_menu":
-            await self.show_destinations_menu(update, context)
-        
-        elif data == "main_menu":
-            await self.show_main_menu(update, context)
-            
-        elif data == "show_messages_list":
-            # Importar MessageManager para mostrar lista de mensajes
-            from message_manager import MessageManager
-    
+    async def request_destination_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Solicitar ID de destino"""
+        await update.callback_query.edit_message_text(
+            "📂 **Agregar Destino**\n\n"
+            "Envía el ID del grupo/canal destino.\n\n"
+            "**Ejemplo:** `-1001234567890`\n\n"
+            "Para obtener el ID:\n"
+            "1. Reenvía un mensaje del canal/grupo\n"
+            "2. O usa bots como @getidsbot",
+            parse_mode='Markdown'
+        )
+
+        # Establecer estado
+        self.states.set(update.effective_user.id, 'awaiting_destination_input')
+
     async def show_link_channel_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostrar menú para vincular canal"""
         current_channel = self.config.get('origen_chat_id')
@@ -166,14 +189,11 @@ class MenuManager:
             "1. Agrega el bot al canal como administrador\n"
             "2. Reenvía cualquier mensaje del canal al bot\n"
             "3. El bot detectará automáticamente el canal\n\n"
-            "**Nota:** Solo se puede tener un canal origen activo."
+            "**Nota:** Solo se puede tener un canal origen activo.\n\n"
+            f"Espejo en vivo: {'🟢 Activo' if self.config.get('espejo_canal', False) else '🔴 Inactivo'}"
         )
         
-        keyboard = [
-            [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = LINK_CHANNEL_INLINE
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -190,31 +210,15 @@ class MenuManager:
     
     async def show_message_management_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostrar menú de gestión de mensajes"""
-        # Cargar mensajes actuales
-        try:
-            import json
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                mensajes = json.load(f)
-        except:
-            mensajes = []
-        
-        mensajes_activos = len([m for m in mensajes if m.get('activo', False)])
-        
         text = (
             "📝 **Gestión de Mensajes**\n\n"
             f"**Estado actual:**\n"
-            f"• Mensajes activos: {mensajes_activos}\n"
-            f"• Total configurados: {len(mensajes)}\n\n"
+            f"• Mensajes activos: {self.stats.active}\n"
+            f"• Total configurados: {self.stats.total}\n\n"
             "Selecciona una opción:"
         )
         
-        keyboard = [
-            [InlineKeyboardButton("📥 Ver Mensajes", callback_data="show_messages_list")],
-            [InlineKeyboardButton("🗑️ Eliminar Mensajes", callback_data="delete_messages")],
-            [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = MESSAGE_MANAGEMENT_INLINE
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -241,64 +245,7 @@ class MenuManager:
             "Selecciona una opción:"
         )
         
-        keyboard = [
-            [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
-            [InlineKeyboardButton("👁️ Ver Listas", callback_data="list_view")],
-            [InlineKeyboardButton("🗑️ Eliminar Lista", callback_data="list_delete")],
-            [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if update.callback_query:
-            await update.callback_query.edit_message_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        else:
-            await update.message.reply_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-    
-    async def show_bot_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Mostrar estado del bot"""
-        # Cargar información actual
-        try:
-            import json
-            with open(self.messages_file, 'r', encoding='utf-8') as f:
-                mensajes = json.load(f)
-        except:
-            mensajes = []
-        
-        destinos = self.config.get('destinos', [])
-        listas = self.config.get('listas_destinos', {})
-        canal_origen = self.config.get('origen_chat_id')
-        mensajes_activos = len([m for m in mensajes if m.get('activo', False)])
-        
-        text = (
-            "📄 **Estado del Bot**\n\n"
-            "**📊 Configuración actual:**\n"
-            f"🔗 Canal origen: {'✅ ' + str(canal_origen) if canal_origen else '❌ No configurado'}\n"
-            f"📂 Destinos individuales: {len(destinos)}\n"
-            f"📋 Listas de destinos: {len(listas)}\n"
-            f"📝 Mensajes activos: {mensajes_activos}\n"
-            f"📈 Total mensajes: {len(mensajes)}\n\n"
-            "**🔄 Sistema de reenvío:**\n"
-            f"Estado: {'🟢 Activo' if mensajes_activos > 0 else '🟡 En espera'}\n"
-            f"Intervalo: 60 segundos (pruebas)\n"
-            f"Auto-eliminación: 10 minutos\n\n"
-            "**🤖 Bot funcionando correctamente**"
-        )
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Actualizar", callback_data="bot_status")],
-            [InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = LIST_MANAGEMENT_INLINE
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -312,157 +259,127 @@ class MenuManager:
                 reply_markup=reply_markup,
                 parse_mode='Markdown'
             )
-            await msg_manager.show_simple_messages_list(update, context)
-            
-        elif data == "show_destinations_menu":
-            await self.show_destinations_menu(update, context)
     
-    async def show_destinations_view(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_destinations_view(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
         """Mostrar lista de destinos actuales"""
-        destinos = self.config.get('destinos', [])
+        index = self._config_index('destinos')
         listas = self.config.get('listas_destinos', {})
         
         text = f"📂 **Destinos Configurados**\n\n"
         
-        if destinos:
-            text += f"**Destinos individuales ({len(destinos)}):**\n"
-            for i, dest in enumerate(destinos):
-                text += f"{i+1}. `{dest}`\n"
+        page = index.page(cursor, direction, DESTINATIONS_PAGE_SIZE)
+        if page.keys:
+            text += f"**Destinos individuales ({page.label()}):**\n"
+            for i, dest in enumerate(page.keys, page.start + 1):
+                text += f"{i}. {self._dest_label(dest)}\n"
             text += "\n"
         else:
             text += "• No hay destinos individuales configurados\n\n"
         
         if listas:
-            text += f"**Listas de destinos ({len(listas)}):**\n"
-            for nombre, lista in listas.items():
-                text += f"• **{nombre}**: {len(lista)} destinos\n"
-            text += "\n"
+            text += f"**Listas de destinos:** {len(listas)} (ver en Gestionar Listas)\n"
         else:
             text += "• No hay listas de destinos configuradas\n\n"
         
-        keyboard = [
-            [InlineKeyboardButton("🔙 Volver a destinos", callback_data="dest_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        keyboard = []
+        nav = page_nav_row('d', page)
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([InlineKeyboardButton("🔙 Volver a destinos", callback_data="dest_menu")])
         
-        await update.callback_query.edit_message_text(
-            text=text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await self._render(update, text, InlineKeyboardMarkup(keyboard))
     
-    async def show_delete_destinations(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_delete_destinations(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
         """Mostrar lista de destinos para eliminar"""
-        destinos = self.config.get('destinos', [])
+        index = self._config_index('destinos')
         
-        if not destinos:
+        if not len(index):
             await update.callback_query.edit_message_text(
                 "📂 **No hay destinos configurados**\n\n"
                 "Agrega destinos primero para poder eliminarlos.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🔙 Volver", callback_data="dest_menu")
-                ]]),
+                reply_markup=BACK_TO_DEST_MENU_INLINE,
                 parse_mode='Markdown'
             )
             return
         
-        text = "🗑️ **Eliminar Destino**\n\nSelecciona el destino a eliminar:\n\n"
+        page = index.page(cursor, direction, DELETE_BUTTONS_PAGE_SIZE)
+        text = f"🗑️ **Eliminar Destino** ({page.label()})\n\nSelecciona el destino a eliminar:\n\n"
         keyboard = []
         
-        for i, dest in enumerate(destinos):
-            text += f"{i+1}. `{dest}`\n"
-            keyboard.append([InlineKeyboardButton(f"🗑️ Eliminar {dest}", callback_data=f"dest_del_{i}")])
+        for i, dest in enumerate(page.keys, page.start + 1):
+            text += f"{i}. {self._dest_label(dest)}\n"
+            title = self.health.title(dest) if self.health else None
+            label = f"{title[:30]} ({dest})" if title else str(dest)
+            keyboard.append([InlineKeyboardButton(f"🗑️ Eliminar {label}", callback_data=f"dest_del_{dest}")])
         
+        nav = page_nav_row('x', page)
+        if nav:
+            keyboard.append(nav)
         keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="dest_menu")])
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.callback_query.edit_message_text(
-            text=text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
-        )
+        await self._render(update, text, InlineKeyboardMarkup(keyboard))
     
-    async def show_manage_lists(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_manage_lists(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
         """Mostrar gestión de listas"""
         # Limpiar cualquier estado activo cuando se accede al menú de listas
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler and hasattr(bot_handler, 'clear_user_state'):
-            bot_handler.clear_user_state(update.effective_user.id)
+        self.states.pop(update.effective_user.id)
         
         listas = self.config.get('listas_destinos', {})
+        index = self._config_index('listas')
         
         text = f"📁 **Gestión de Listas**\n\n"
         
-        if listas:
-            text += f"**Listas configuradas ({len(listas)}):**\n"
-            for nombre, lista in listas.items():
-                text += f"• **{nombre}**: {len(lista)} destinos\n"
+        page = index.page(cursor, direction, LISTS_PAGE_SIZE)
+        if page.keys:
+            text += f"**Listas configuradas ({page.label()}):**\n"
+            for nombre in page.keys:
+                text += f"• **{nombre}**: {len(listas.get(nombre, []))} destinos\n"
             text += "\n"
         else:
             text += "• No hay listas configuradas\n\n"
         
-        keyboard = [
-            [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
-            [InlineKeyboardButton("👁️ Ver Listas", callback_data="list_view")],
-            [InlineKeyboardButton("🗑️ Eliminar Lista", callback_data="list_delete")],
-            [InlineKeyboardButton("🔙 Volver al Menú", callback_data="main_menu")]
-        ]
+        reply_markup = MANAGE_LISTS_INLINE
+        nav = page_nav_row('lm', page)
+        if nav:
+            reply_markup = InlineKeyboardMarkup([nav] + [list(row) for row in MANAGE_LISTS_INLINE.inline_keyboard])
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if update.callback_query:
-            await update.callback_query.edit_message_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
-        else:
-            await update.message.reply_text(
-                text=text,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+        await self._render(update, text, reply_markup)
     
     async def show_channel_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostrar menú de gestión de canal"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        
         current_channel = self.config.get('origen_chat_id', 'No configurado')
         
         text = f"📺 **Gestión de Canal Origen**\n\n"
         text += f"Canal actual: `{current_channel}`\n\n"
         text += "**Opciones:**\n"
         text += "• 🔗 Vincular - Establecer canal origen\n"
-        text += "• 🚫 Desvincular - Quitar canal origen\n\n"
+        text += "• 🚫 Desvincular - Quitar canal origen\n"
+        text += "• 🪞 Espejo en vivo - Enviar cada publicación nueva del canal a los destinos al momento\n\n"
+        mirror = "🟢 Activo" if self.config.get('espejo_canal', False) else "🔴 Inactivo"
+        text += f"Espejo en vivo: {mirror}"
+        if self.config.get('espejo_canal', False) and self.config.get('espejo_registrar', False):
+            text += " (las publicaciones quedan registradas para reenvíos periódicos)"
+        text += "\n\n"
         text += "El canal origen es donde el bot detectará automáticamente los mensajes reenviados para agregar."
         
-        keyboard = [
-            [InlineKeyboardButton("🔗 Vincular Canal", callback_data="channel_link")],
-            [InlineKeyboardButton("🚫 Desvincular Canal", callback_data="channel_unlink")],
-            [InlineKeyboardButton("🔙 Volver", callback_data="main_menu")]
-        ]
-        
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=CHANNEL_MENU_INLINE,
                 parse_mode='Markdown'
             )
         else:
             await update.message.reply_text(
                 text=text,
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=CHANNEL_MENU_INLINE,
                 parse_mode='Markdown'
             )
     
-    async def handle_channel_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
-        """Manejar callbacks relacionados con canales"""
-        if data == "channel_link":
-            await self.request_channel_input(update, context)
-        elif data == "channel_unlink":
-            await self.unlink_channel(update, context)
+    async def toggle_channel_mirror(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Activar o desactivar el espejo en vivo del canal origen"""
+        self.config['espejo_canal'] = not self.config.get('espejo_canal', False)
+        save_config(self.config)
+        await self.show_channel_menu(update, context)
     
     async def request_channel_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Solicitar ID de canal"""
@@ -479,9 +396,7 @@ class MenuManager:
         )
         
         # Establecer estado
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler:
-            bot_handler.set_user_state(update.effective_user.id, "waiting_channel_id")
+        self.states.set(update.effective_user.id, "waiting_channel_id")
     
     async def unlink_channel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Desvincular canal"""
@@ -494,17 +409,12 @@ class MenuManager:
             "🚫 **Canal Desvinculado**\n\n"
             "El canal origen ha sido desvinculado.\n"
             "Ahora deberás agregar mensajes manualmente.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Volver", callback_data="show_channel_menu")
-            ]]),
+            reply_markup=BACK_TO_CHANNEL_MENU_INLINE,
             parse_mode='Markdown'
         )
     
     async def handle_channel_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text, state=None):
         """Manejar entrada de ID de canal"""
-        from utils import save_config
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        
         channel_id = text.strip()
         
         # Validar formato
@@ -533,76 +443,37 @@ class MenuManager:
         save_config(self.config)
         
         # Limpiar estado del usuario
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler:
-            bot_handler.clear_user_state(update.effective_user.id)
+        self.states.pop(update.effective_user.id)
         
         await update.message.reply_text(
             f"✅ **Canal Vinculado**\n\n"
             f"Canal origen: `{channel_id}`\n\n"
             "Ahora el bot detectará automáticamente mensajes reenviados desde este canal.",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")
-            ]]),
+            reply_markup=BACK_TO_MAIN_INLINE,
             parse_mode='Markdown'
         )
     
     async def show_bot_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mostrar estado detallado del bot con estadísticas completas"""
-        from utils import get_current_time, load_messages
-        from datetime import datetime
-        import pytz
-        
-        # Obtener información del forwarder
-        forwarder = context.bot_data.get('forwarder')
-        status = forwarder.get_status() if forwarder else {'running': False, 'next_run': None}
-        
+        from utils import get_current_time
+
+        stats = self.stats
+
         # Información básica
-        canal_origen = self.config.get('source_channel_id')
+        canal_origen = self.config.get('origen_chat_id')
         destinos = self.config.get('destinos', [])
         listas = self.config.get('listas_destinos', {})
         intervalo_global = self.config.get('intervalo_global', 60)
         timezone_str = self.config.get('timezone', 'Europe/Madrid')
         admin_id = self.config.get('admin_id')
         
-        # Obtener información del bot
-        try:
-            bot_info = await context.bot.get_me()
-            bot_name = bot_info.first_name
-            bot_username = f"@{bot_info.username}"
-        except:
-            bot_name = "Bot de Reenvío"
-            bot_username = "@bot"
-        
-        # Contar mensajes y estadísticas
-        try:
-            mensajes = load_messages()
-            total_mensajes = len(mensajes)
-            mensajes_activos = len([m for m in mensajes if m.get('active', True)])
-            
-            # Calcular estadísticas de envío
-            total_enviados = sum(m.get('success_count', 0) for m in mensajes)
-            total_errores = sum(m.get('error_count', 0) for m in mensajes)
-            
-        except:
-            total_mensajes = 0
-            mensajes_activos = 0
-            total_enviados = 0
-            total_errores = 0
-        
-        # Calcular próximo envío
-        try:
-            timezone = pytz.timezone(timezone_str)
-            current_time = datetime.now(timezone)
-            
-            if status.get('next_run'):
-                next_run_str = status['next_run'].strftime('%Y-%m-%d %H:%M')
-            else:
-                next_run_str = "No programado"
-        except:
-            current_time = datetime.now()
-            next_run_str = "Calculando..."
-        
+        # Identidad del bot cacheada al iniciar (sin llamar a getMe)
+        bot_name = stats.bot_name or "Bot de Reenvío"
+        bot_username = stats.bot_username or "@bot"
+
+        current_time = get_current_time(timezone_str)
+        next_run_str = stats.next_run.strftime('%Y-%m-%d %H:%M') if stats.next_run else "No programado"
+
         # Crear texto de estado detallado
         text = f"🤖 **{bot_name}** `{bot_username}`\n"
         text += f"📅 **Estado del Sistema** - {current_time.strftime('%Y-%m-%d %H:%M')}\n\n"
@@ -617,25 +488,28 @@ class MenuManager:
         text += f"🎯 **Destinos Activos:** {len(destinos)} grupos\n"
         if not destinos:
             text += f"   ⚠️ Sin destinos configurados\n"
+        if self.health is not None and len(self.health):
+            health = self.health.summary()
+            text += (
+                f"🩺 **Revisión de destinos:** {health['ok']} pueden publicar, "
+                f"{health['sin_permiso']} sin permiso, {health['caducados']} pendientes de revisar\n"
+            )
         
-        # Información de listas
+        # Información de listas (el detalle, paginado, en 📋 Ver Listas)
         text += f"📋 **Listas Personalizadas:** {len(listas)}\n"
-        for list_name, list_dest in listas.items():
-            text += f"   • {list_name}: {len(list_dest)} destinos\n"
         
         text += f"\n"
         
         # Estadísticas de mensajes
         text += f"📊 **Estadísticas de Mensajes:**\n"
-        text += f"📝 **Total:** {total_mensajes} mensajes configurados\n"
-        text += f"▶️ **Activos:** {mensajes_activos} enviándose\n"
-        text += f"⏸️ **Pausados:** {total_mensajes - mensajes_activos}\n"
-        text += f"✅ **Enviados:** {total_enviados} exitosos\n"
-        text += f"❌ **Errores:** {total_errores} fallos\n"
-        
-        if total_enviados + total_errores > 0:
-            success_rate = (total_enviados / (total_enviados + total_errores)) * 100
-            text += f"📈 **Tasa de éxito:** {success_rate:.1f}%\n"
+        text += f"📝 **Total:** {stats.total} mensajes configurados\n"
+        text += f"▶️ **Activos:** {stats.active} enviándose\n"
+        text += f"⏸️ **Pausados:** {stats.paused}\n"
+        text += f"✅ **Enviados:** {stats.sent} exitosos\n"
+        text += f"❌ **Errores:** {stats.errors} fallos\n"
+
+        if stats.success_rate is not None:
+            text += f"📈 **Tasa de éxito:** {stats.success_rate:.1f}%\n"
         
         text += f"\n"
         
@@ -661,28 +535,36 @@ class MenuManager:
         
         # Estado del reenvío automático
         text += f"\n🔄 **Sistema de Reenvío:**\n"
-        if status.get('running'):
+        if stats.running:
             text += f"🟢 **Estado:** Activo\n"
             text += f"📅 **Próximo envío:** {next_run_str}\n"
+            cadence = stats.cadence
+            if cadence:
+                text += f"⏱️ **Cadencia:** cada {cadence['interval']}s"
+                if cadence['interval'] != cadence['base_interval']:
+                    text += f" (estirada desde {cadence['base_interval']}s)"
+                if cadence['last_duration'] is not None:
+                    text += f", último ciclo {cadence['last_duration']:.1f}s"
+                text += "\n"
+                if cadence['overrun_cycles'] or cadence['overlapping_runs']:
+                    text += (
+                        f"🐢 **Excesos:** {cadence['overrun_cycles']} ciclos más largos que el intervalo, "
+                        f"{cadence['overlapping_runs']} ejecuciones solapadas (política: {cadence['policy']})\n"
+                    )
         else:
             text += f"🔴 **Estado:** Inactivo\n"
         
+        # Cola de envíos por clase de prioridad
+        if stats.queue_report:
+            text += f"\n📥 **Cola por prioridad (último ciclo):**\n"
+            for priority, info in stats.queue_report.items():
+                text += (
+                    f"• {priority}: {info['sent']} enviados, pico {info['peak_depth']}, "
+                    f"espera media {info['avg_wait']:.1f}s (máx {info['max_wait']:.1f}s)\n"
+                )
+        
         # Botones de acción
-        keyboard = [
-            [
-                InlineKeyboardButton("🔄 Recargar Estado", callback_data="bot_status"),
-                InlineKeyboardButton("⚙️ Configuración", callback_data="main_menu")
-            ],
-            [
-                InlineKeyboardButton("📊 Ver Mensajes", callback_data="show_messages_list"),
-                InlineKeyboardButton("🎯 Gestionar Destinos", callback_data="show_destinations_menu")
-            ],
-            [
-                InlineKeyboardButton("🔙 Menú Principal", callback_data="main_menu")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = BOT_STATUS_INLINE
         
         # Enviar el mensaje con estadísticas
         if update.callback_query:
@@ -698,6 +580,73 @@ class MenuManager:
                 parse_mode='Markdown'
             )
     
+    async def show_capacity_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Informe del planificador de capacidad"""
+        messages = self.message_store.all() if self.message_store else []
+        report = CapacityPlanner(self.config, messages).report()
+        await self._render(update, format_report(report), CAPACITY_REPORT_INLINE)
+    
+    async def show_analytics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Destinos con peor rendimiento y tendencia de errores (últimas 24 h)"""
+        forwarder = context.bot_data.get('forwarder')
+        analytics = forwarder.analytics if forwarder else None
+        
+        text = "📈 **Analítica de destinos (24 h)**\n\n"
+        worst = analytics.worst(ANALYTICS_WORST_SIZE) if analytics else []
+        if not worst:
+            text += "Sin envíos registrados todavía."
+            await self._render(update, text, ANALYTICS_INLINE)
+            return
+        
+        text += "**Peores destinos:**\n"
+        for s in worst:
+            label = self._dest_label(s['chat_id'])
+            latency = f"{s['avg_latency']:.2f}s" if s['avg_latency'] is not None else "-"
+            top_error = max(s['errors'].items(), key=lambda e: e[1])[0] if s['errors'] else "-"
+            text += (
+                f"• {label}: {s['ok']}/{s['sent']} ok ({s['failure_rate']:.0%} fallos), "
+                f"latencia {latency}, error principal: {top_error}\n"
+            )
+        
+        text += "\n**Errores por hora:**\n"
+        for bucket in analytics.error_trend('h', 6):
+            hour = datetime.fromtimestamp(bucket['start']).strftime('%H:%M')
+            errors = ", ".join(f"{k} {v}" for k, v in sorted(bucket['errors'].items())) or "sin errores"
+            text += f"• {hour}: {bucket['sent']} envíos, {errors}\n"
+        
+        # Retraso respecto a la hora prevista (SLO)
+        lag = forwarder.lag
+        by_priority = lag.report('prioridad')
+        if by_priority:
+            text += f"\n**Retraso de entrega** (objetivo p95 ≤ {format_lag(lag.target)}):\n"
+            for name, (total, p50, p95, _) in by_priority.items():
+                icon = "🔴 " if lag.target and p95 > lag.target else ""
+                text += f"• {icon}prioridad {name}: p50 {format_lag(p50)}, p95 {format_lag(p95)} ({total} entregas)\n"
+            for name, (total, p50, p95, _) in list(lag.report('lista').items())[:ANALYTICS_WORST_SIZE]:
+                icon = "🔴 " if lag.target and p95 > lag.target else ""
+                text += f"• {icon}lista {escape_markdown(str(name))}: p50 {format_lag(p50)}, p95 {format_lag(p95)} ({total} entregas)\n"
+        
+        await self._render(update, text, ANALYTICS_INLINE)
+    
+    async def export_analytics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Enviar la analítica de todos los destinos como CSV"""
+        forwarder = context.bot_data.get('forwarder')
+        if not forwarder or not len(forwarder.analytics):
+            await self._render(update, "📄 Sin datos para exportar todavía.", ANALYTICS_INLINE)
+            return
+        
+        titles = {}
+        if self.health is not None:
+            titles = {c: self.health.title(c) for c in forwarder.analytics.chat_ids() if self.health.title(c)}
+        data = forwarder.analytics.export_csv(titles=titles).encode('utf-8')
+        filename = f"analitica_destinos_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=io.BytesIO(data),
+            filename=filename,
+            caption="📄 Analítica por destino (últimas 24 h)"
+        )
+    
     async def request_list_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Solicitar nombre para nueva lista"""
         await update.callback_query.edit_message_text(
@@ -712,83 +661,96 @@ class MenuManager:
         logger = logging.getLogger(__name__)
         logger.info(f"🔧 Solicitando nombre de lista para usuario {update.effective_user.id}")
         
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler:
-            bot_handler.set_user_state(update.effective_user.id, 'waiting_list_name')
-            logger.info(f"🔧 Estado establecido: waiting_list_name para usuario {update.effective_user.id}")
-        else:
-            logger.error("❌ bot_handler no encontrado en context.bot_data")
+        self.states.set(update.effective_user.id, 'waiting_list_name')
+        logger.info(f"🔧 Estado establecido: waiting_list_name para usuario {update.effective_user.id}")
     
-    async def show_existing_lists(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def show_existing_lists(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
         """Mostrar todas las listas existentes"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        
         listas = self.config.get('listas_destinos', {})
         
         if not listas:
             await update.callback_query.edit_message_text(
                 "📋 **No hay listas configuradas**\n\n"
                 "Crea tu primera lista para organizar tus destinos.",
-                reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("➕ Crear Lista", callback_data="list_create")],
-                    [InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]
-                ])
+                reply_markup=EMPTY_LISTS_INLINE
             )
             return
         
-        text = "📋 **Listas de Destinos**\n\n"
-        keyboard = []
+        page = self._config_index('listas').page(cursor, direction, LISTS_PAGE_SIZE)
+        text = f"📋 **Listas de Destinos** ({page.label()})\n\n"
         
-        for nombre, destinos in listas.items():
+        for nombre in page.keys:
+            destinos = listas.get(nombre, [])
+            preview = ', '.join(map(str, destinos[:5]))
+            if len(destinos) > 5:
+                preview += f", … (+{len(destinos) - 5})"
             text += f"**{nombre}**\n"
             text += f"• {len(destinos)} destinos configurados\n"
-            text += f"• IDs: {', '.join(map(str, destinos))}\n\n"
-            
-            keyboard.append([InlineKeyboardButton(f"📋 {nombre}", callback_data=f"list_detail_{nombre}")])
+            text += f"• IDs: {preview}\n\n"
         
+        compuestas = self.config.get('listas_compuestas', {})
+        keyboard = []
+        nav = page_nav_row('l', page)
+        if nav:
+            keyboard.append(nav)
+        if compuestas:
+            keyboard.append([InlineKeyboardButton(f"🧮 Listas compuestas ({len(compuestas)})", callback_data="list_composite")])
         keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")])
         
-        await update.callback_query.edit_message_text(
-            text=text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
+        await self._render(update, text, InlineKeyboardMarkup(keyboard))
     
-    async def show_delete_lists_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Mostrar menú para eliminar listas"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    async def show_composite_lists(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
+        """Listas compuestas con su expresión y el tamaño resuelto, paginadas"""
+        compuestas = self.config.get('listas_compuestas', {})
+        page = self._config_index('compuestas').page(cursor, direction, LISTS_PAGE_SIZE)
+        text = f"🧮 **Listas compuestas** ({page.label()})\n\n"
+        
+        algebra = get_list_algebra(self.config)
+        for nombre in page.keys:
+            try:
+                total = f"{len(algebra.resolve(nombre))} destinos"
+            except ListExpressionError as e:
+                total = f"⚠️ {e}"
+            text += f"• **{escape_markdown(nombre)}** = {escape_markdown(compuestas.get(nombre, ''))} → {escape_markdown(total)}\n"
         
+        keyboard = []
+        nav = page_nav_row('lc', page)
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([InlineKeyboardButton("🔙 Volver", callback_data="list_view")])
+        
+        await self._render(update, text, InlineKeyboardMarkup(keyboard))
+    
+    async def show_delete_lists_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None, direction='n'):
+        """Mostrar menú para eliminar listas"""
         listas = self.config.get('listas_destinos', {})
         
         if not listas:
             await update.callback_query.edit_message_text(
                 "📋 **No hay listas para eliminar**\n\n"
                 "No tienes listas configuradas actualmente.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]])
+                reply_markup=BACK_TO_LISTS_INLINE
             )
             return
         
-        text = "🗑️ **Eliminar Listas**\n\n"
+        page = self._config_index('listas').page(cursor, direction, DELETE_BUTTONS_PAGE_SIZE)
+        text = f"🗑️ **Eliminar Listas** ({page.label()})\n\n"
         text += "Selecciona la lista que deseas eliminar:\n\n"
         keyboard = []
         
-        for nombre, destinos in listas.items():
-            text += f"• **{nombre}**: {len(destinos)} destinos\n"
+        for nombre in page.keys:
+            text += f"• **{nombre}**: {len(listas.get(nombre, []))} destinos\n"
             keyboard.append([InlineKeyboardButton(f"🗑️ {nombre}", callback_data=f"delete_list_{nombre}")])
         
+        nav = page_nav_row('ld', page)
+        if nav:
+            keyboard.append(nav)
         keyboard.append([InlineKeyboardButton("❌ Cancelar", callback_data="dest_lists")])
         
-        await update.callback_query.edit_message_text(
-            text=text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode='Markdown'
-        )
+        await self._render(update, text, InlineKeyboardMarkup(keyboard))
     
     async def delete_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE, list_name):
         """Eliminar una lista específica"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        from utils import save_config
-        
         listas = self.config.get('listas_destinos', {})
         
         if list_name in listas:
@@ -799,20 +761,19 @@ class MenuManager:
             await update.callback_query.edit_message_text(
                 f"✅ **Lista Eliminada**\n\n"
                 f"La lista **{list_name}** ha sido eliminada correctamente.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Gestión de Listas", callback_data="dest_lists")]]),
+                reply_markup=BACK_TO_LIST_MANAGEMENT_INLINE,
                 parse_mode='Markdown'
             )
         else:
             await update.callback_query.edit_message_text(
                 f"❌ **Error**\n\n"
                 f"La lista **{list_name}** no existe.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]]),
+                reply_markup=BACK_TO_LISTS_INLINE,
                 parse_mode='Markdown'
             )
     
     async def handle_list_name_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, list_name):
         """Procesar nombre de lista ingresado"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
         import logging
         logger = logging.getLogger(__name__)
         
@@ -822,7 +783,7 @@ class MenuManager:
             await update.message.reply_text(
                 "❌ **Nombre inválido**\n\n"
                 "El nombre de la lista no puede estar vacío.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]])
+                reply_markup=BACK_TO_LISTS_INLINE
             )
             return
         
@@ -834,7 +795,7 @@ class MenuManager:
             await update.message.reply_text(
                 f"❌ **Lista ya existe**\n\n"
                 f"Ya existe una lista llamada **{list_name}**.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]])
+                reply_markup=BACK_TO_LISTS_INLINE
             )
             return
         
@@ -844,24 +805,16 @@ class MenuManager:
             f"Ahora envía los IDs de los destinos separados por comas o espacios.\n\n"
             f"_Ejemplo: -1001234567890, -1001234567891_\n\n"
             f"Puedes usar los grupos donde ya está el bot agregado.",
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancelar", callback_data="dest_lists")]]),
+            reply_markup=CANCEL_TO_LISTS_INLINE,
             parse_mode='Markdown'
         )
         
         # Establecer estado para capturar IDs
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler:
-            bot_handler.set_user_state(update.effective_user.id, f'waiting_list_ids:{list_name}')
-            logger.info(f"🔧 Estado establecido: waiting_list_ids:{list_name} para usuario {update.effective_user.id}")
-        else:
-            logger.error(f"❌ bot_handler no encontrado en context.bot_data. Keys disponibles: {list(context.bot_data.keys())}")
-            # Fallback: establecer estado directo (debugging)
-            logger.info(f"🔧 Usando fallback para establecer estado para usuario {update.effective_user.id}")
+        self.states.set(update.effective_user.id, f'waiting_list_ids:{list_name}')
+        logger.info(f"🔧 Estado establecido: waiting_list_ids:{list_name} para usuario {update.effective_user.id}")
     
     async def handle_list_ids_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, ids_text, list_name):
         """Procesar IDs de destinos para la lista"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        from utils import save_config
         import logging
         logger = logging.getLogger(__name__)
         
@@ -882,7 +835,7 @@ class MenuManager:
                     await update.message.reply_text(
                         f"❌ **ID inválido**: {part}\n\n"
                         f"Los IDs deben ser números enteros.",
-                        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]])
+                        reply_markup=BACK_TO_LISTS_INLINE
                     )
                     return
             
@@ -890,7 +843,7 @@ class MenuManager:
                 await update.message.reply_text(
                     "❌ **Sin destinos**\n\n"
                     "Debes proporcionar al menos un ID de destino.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="dest_lists")]])
+                    reply_markup=BACK_TO_LISTS_INLINE
                 )
                 return
             
@@ -898,7 +851,20 @@ class MenuManager:
             if 'listas_destinos' not in self.config:
                 self.config['listas_destinos'] = {}
             
+            previous = self.config['listas_destinos'].get(list_name)
             self.config['listas_destinos'][list_name] = destinos
+            warning, reject = self._check_capacity()
+            if reject:
+                if previous is None:
+                    del self.config['listas_destinos'][list_name]
+                else:
+                    self.config['listas_destinos'][list_name] = previous
+                await update.message.reply_text(
+                    f"❌ **Lista rechazada**\n\n{warning}",
+                    reply_markup=BACK_TO_LIST_MANAGEMENT_INLINE,
+                    parse_mode='Markdown'
+                )
+                return
             save_config(self.config)
             
             logger.info(f"🔧 Lista guardada exitosamente para usuario {update.effective_user.id}")
@@ -910,8 +876,9 @@ class MenuManager:
                 f"✅ **Lista Creada**\n\n"
                 f"**{list_name}** creada con {len(destinos)} destinos:\n"
                 f"• {', '.join(map(str, destinos))}\n\n"
-                f"Ya puedes seleccionar esta lista al configurar mensajes.",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Gestión de Listas", callback_data="dest_lists")]]),
+                f"Ya puedes seleccionar esta lista al configurar mensajes."
+                + (f"\n\n{warning}" if warning else ""),
+                reply_markup=BACK_TO_LIST_MANAGEMENT_INLINE,
                 parse_mode='Markdown'
             )
             
@@ -921,48 +888,73 @@ class MenuManager:
             await update.message.reply_text(
                 f"❌ **Error**\n\n"
                 f"Error procesando los IDs: {str(e)}",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Volver", callback_data="main_menu")]])
+                reply_markup=BACK_TO_MAIN_INLINE
             )
     
-    async def handle_list_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
-        """Manejar callbacks de gestión de listas"""
-        if data == "list_create":
-            await self.request_list_name(update, context)
-        elif data == "list_view":
-            await self.show_existing_lists(update, context)
-        elif data == "list_delete":
-            await self.show_delete_lists_menu(update, context)
-        elif data.startswith("delete_list_"):
-            list_name = data.replace("delete_list_", "")
-            await self.delete_list(update, context, list_name)
-    
+    async def handle_delete_list_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
+        """Callback delete_list_<nombre>"""
+        list_name = data.replace("delete_list_", "", 1)
+        await self.delete_list(update, context, list_name)
+
+    async def handle_delete_destination_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE, data):
+        """Callback dest_del_<id de destino>"""
+        destinos = self.config.get('destinos', [])
+        try:
+            dest_id = int(data.replace("dest_del_", "", 1))
+            destinos.remove(dest_id)
+        except ValueError:
+            await update.callback_query.edit_message_text(
+                "❌ **Destino no encontrado**",
+                reply_markup=BACK_TO_DEST_MENU_INLINE,
+                parse_mode='Markdown'
+            )
+            return
+
+        save_config(self.config)
+        await update.callback_query.edit_message_text(
+            f"✅ **Destino eliminado**\n\n"
+            f"ID: `{dest_id}`\n"
+            f"Total destinos: {len(destinos)}",
+            reply_markup=BACK_TO_DEST_MENU_INLINE,
+            parse_mode='Markdown'
+        )
+
     async def handle_destination_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text):
         """Manejar entrada de ID de destino"""
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        from utils import save_config
-        
         try:
             dest_id = int(text.strip())
             
             if 'destinos' not in self.config:
                 self.config['destinos'] = []
             
+            self.states.pop(update.effective_user.id)
+
             if dest_id not in self.config['destinos']:
                 self.config['destinos'].append(dest_id)
+                warning, reject = self._check_capacity()
+                if reject:
+                    self.config['destinos'].remove(dest_id)
+                    await update.message.reply_text(
+                        f"❌ **Destino rechazado**\n\n{warning}",
+                        reply_markup=BACK_TO_DESTINATIONS_INLINE,
+                        parse_mode='Markdown'
+                    )
+                    return
                 save_config(self.config)
                 
                 await update.message.reply_text(
                     f"✅ **Destino agregado**\n\n"
                     f"ID: `{dest_id}`\n"
-                    f"Total destinos: {len(self.config['destinos'])}",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Gestión de Destinos", callback_data="destinations")]]),
+                    f"Total destinos: {len(self.config['destinos'])}"
+                    + (f"\n\n{warning}" if warning else ""),
+                    reply_markup=BACK_TO_DESTINATIONS_INLINE,
                     parse_mode='Markdown'
                 )
             else:
                 await update.message.reply_text(
                     f"⚠️ **Destino ya existe**\n\n"
                     f"ID: `{dest_id}` ya está en la lista de destinos.",
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Gestión de Destinos", callback_data="destinations")]]),
+                    reply_markup=BACK_TO_DESTINATIONS_INLINE,
                     parse_mode='Markdown'
                 )
         except ValueError:
@@ -970,7 +962,7 @@ class MenuManager:
                 f"❌ **ID inválido**\n\n"
                 f"Envía un ID numérico válido.\n"
                 f"Ejemplo: `-1001234567890`",
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Gestión de Destinos", callback_data="destinations")]]),
+                reply_markup=BACK_TO_DESTINATIONS_INLINE,
                 parse_mode='Markdown'
             )
     
@@ -987,6 +979,29 @@ class MenuManager:
         )
         
         # Establecer estado
-        bot_handler = context.bot_data.get('bot_handler')
-        if bot_handler:
-            bot_handler.set_user_state(update.effective_user.id, 'waiting_timezone')
+        self.states.set(update.effective_user.id, 'waiting_timezone')
+
+    async def handle_timezone_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text):
+        """Manejar entrada de zona horaria"""
+        from utils import validate_timezone
+
+        tz_name = text.strip()
+        if not validate_timezone(tz_name):
+            await update.message.reply_text(
+                f"❌ **Zona horaria inválida**: `{tz_name}`\n\n"
+                "Ejemplo: `Europe/Madrid`",
+                parse_mode='Markdown'
+            )
+            return
+
+        self.config['timezone'] = tz_name
+        save_config(self.config)
+
+        self.states.pop(update.effective_user.id)
+
+        await update.message.reply_text(
+            f"✅ **Zona horaria actualizada**\n\n"
+            f"Nueva zona: `{tz_name}`",
+            reply_markup=BACK_TO_MAIN_INLINE,
+            parse_mode='Markdown'
+        )
@@ -1,13 +1,69 @@
 # message_manager.py
 
 import logging
-from utils import load_messages, save_messages
+from telegram import InlineKeyboardMarkup
+from utils import is_message_active, is_source_chat
+from keyboards import AUTO_CONFIG_INLINE
+from planner import check_capacity
+from pagination import page_nav_row
 
 logger = logging.getLogger(__name__)
 
 class MessageManager:
-    def __init__(self, config):
+    def __init__(self, config, message_store, user_states):
         self.config = config
+        self.store = message_store
+        # Estados de conversación compartidos (mensaje pendiente de auto-configurar)
+        self.states = user_states
+
+    @staticmethod
+    def _pending_key(user_id):
+        return f"{user_id}:pending_message"
+
+    async def handle_shared_message(self, update, context):
+        """Mensaje reenviado o multimedia: preguntar si viene del canal origen, si no agregarlo"""
+        forward_chat = update.message.forward_from_chat
+        if forward_chat and is_source_chat(forward_chat, self.config):
+            await self.ask_auto_config(update, context)
+            return
+        await self.add_shared_message(update, context)
+
+    async def ask_auto_config(self, update, context):
+        """Auto-configurar mensaje"""
+        key = self._pending_key(update.effective_user.id)
+        message = update.message
+        if message.media_group_id:
+            # Partes siguientes de un álbum: se suman a la pregunta ya hecha o al álbum registrado
+            pending = self.states.get(key)
+            if pending and pending.get('media_group_id') == message.media_group_id:
+                pending['forward_from_message_ids'].append(message.forward_from_message_id)
+                self.states.set(key, pending)
+                return
+            album = self.store.find_album(message.forward_from_chat.id, message.media_group_id)
+            if album:
+                self.store.add_album_part(album, message.forward_from_message_id)
+                return
+        self.states.set(key, {
+            'forward_from_chat_id': message.forward_from_chat.id,
+            'forward_from_message_id': message.forward_from_message_id,
+            'forward_from_message_ids': [message.forward_from_message_id],
+            'media_group_id': message.media_group_id,
+            'message_content': message.text or message.caption or "[Multimedia]"
+        })
+        await message.reply_text("🔄 **Configurar mensaje?**", reply_markup=AUTO_CONFIG_INLINE, parse_mode='Markdown')
+
+    async def handle_auto_config_callback(self, update, context, data):
+        """Callback auto_config_<yes|no>: respuesta a la auto-configuración"""
+        query = update.callback_query
+        pending = self.states.pop(self._pending_key(update.effective_user.id))
+        if data == "auto_config_yes":
+            if not pending:
+                await query.edit_message_text("⌛ **Solicitud caducada**, reenvía el mensaje de nuevo", parse_mode='Markdown')
+                return
+            await self.auto_add_message(update, context, pending)
+            await query.edit_message_text("✅ **Configurado**", parse_mode='Markdown')
+        else:
+            await query.edit_message_text("ℹ️ **Ignorado**", parse_mode='Markdown')
 
     async def add_shared_message(self, update, context):
         """Agregar un mensaje reenviado manualmente"""
@@ -19,17 +75,19 @@ class MessageManager:
             return
 
         message_id = msg.forward_from_message_id
-        mensajes = load_messages()
 
         # Verificar si ya existe
-        exists = any(
-            m["from_chat_id"] == from_chat_id and m["message_id"] == message_id
-            for m in mensajes
-        )
-        if exists:
+        if self.store.find(from_chat_id, message_id):
             await msg.reply_text("⚠️ Este mensaje ya está registrado.")
             return
 
+        # Las demás partes de un álbum se suman a la unidad ya registrada, sin responder otra vez
+        if msg.media_group_id:
+            album = self.store.find_album(from_chat_id, msg.media_group_id)
+            if album:
+                self.store.add_album_part(album, message_id)
+                return
+
         # Agregar
         new_msg = {
             "from_chat_id": from_chat_id,
@@ -39,32 +97,35 @@ class MessageManager:
             "active": True,
             "send_count": 0
         }
-        mensajes.append(new_msg)
-        save_messages(mensajes)
+        if msg.media_group_id:
+            new_msg["media_group_id"] = msg.media_group_id
+            new_msg["message_ids"] = [message_id]
+        warning, reject = check_capacity(self.config, self.store.all() + [new_msg])
+        if reject:
+            await msg.reply_text(f"❌ Mensaje rechazado.\n\n{warning}")
+            return
+        self.store.add(new_msg)
 
         await msg.reply_text(
             "✅ Mensaje agregado correctamente.\n\n"
             "Puedes configurarlo más tarde desde el menú de mensajes."
+            + (f"\n\n{warning}" if warning else "")
         )
 
-    async def auto_add_message(self, update, context):
+    async def auto_add_message(self, update, context, pending):
         """Agregar automáticamente desde el canal origen"""
-        msg = update.message
-        from_chat_id = msg.forward_from_chat.id if msg.forward_from_chat else None
+        msg = update.effective_message
+        from_chat_id = pending.get('forward_from_chat_id')
 
         if not from_chat_id:
             await msg.reply_text("❌ No se detectó canal válido.")
             return
 
-        message_id = msg.forward_from_message_id
-        mensajes = load_messages()
+        message_ids = pending.get('forward_from_message_ids') or [pending.get('forward_from_message_id')]
+        message_id = min(message_ids)
 
         # Verificar si ya existe
-        exists = any(
-            m["from_chat_id"] == from_chat_id and m["message_id"] == message_id
-            for m in mensajes
-        )
-        if exists:
+        if self.store.find(from_chat_id, message_id):
             await msg.reply_text("⚠️ Este mensaje ya está registrado.")
             return
 
@@ -77,20 +138,26 @@ class MessageManager:
             "active": True,
             "send_count": 0
         }
-        mensajes.append(new_msg)
-        save_messages(mensajes)
+        if pending.get('media_group_id'):
+            # Álbum completo como una sola unidad programada
+            new_msg["media_group_id"] = pending['media_group_id']
+            new_msg["message_ids"] = sorted(message_ids)
+        warning, reject = check_capacity(self.config, self.store.all() + [new_msg])
+        if reject:
+            await msg.reply_text(f"❌ Mensaje rechazado.\n\n{warning}")
+            return
+        self.store.add(new_msg)
 
         await msg.reply_text(
             "✅ Mensaje agregado automáticamente con configuración básica.\n"
             "Revisar menú de gestión de mensajes si deseas personalizarlo."
+            + (f"\n\n{warning}" if warning else "")
         )
 
     async def delete_message(self, update, context, index):
         """Eliminar mensaje por índice"""
-        mensajes = load_messages()
-        if 0 <= index < len(mensajes):
-            deleted = mensajes.pop(index)
-            save_messages(mensajes)
+        deleted = self.store.remove_at(index)
+        if deleted:
             await update.message.reply_text(
                 f"✅ Mensaje eliminado (ID: {deleted['message_id']})."
             )
@@ -99,15 +166,20 @@ class MessageManager:
 
     async def list_messages(self, update, context):
         """Listar todos los mensajes programados"""
-        mensajes = load_messages()
-        if not mensajes:
+        if not len(self.store):
             await update.message.reply_text("📝 No hay mensajes configurados.")
             return
 
-        text = "📝 **Mensajes configurados:**\n\n"
-        for i, m in enumerate(mensajes, 1):
-            status = "✅ Activo" if m.get("active") else "⏸️ Inactivo"
+        page, mensajes = self.store.page(size=10)
+        text = f"📝 **Mensajes configurados** ({page.label()}):\n\n"
+        for i, m in enumerate(mensajes, page.start + 1):
+            status = "✅ Activo" if is_message_active(m) else "⏸️ Inactivo"
             text += (
-                f"{i}. ID: {m['message_id']} | Intervalo: {m['interval']}s | {status}\n"
+                f"{i}. ID: {m['message_id']} | Intervalo: {m.get('interval', 600)}s | {status}\n"
             )
-        await update.message.reply_text(text, parse_mode="Markdown")
+        nav = page_nav_row('m', page)
+        await update.message.reply_text(
+            text,
+            reply_markup=InlineKeyboardMarkup([nav]) if nav else None,
+            parse_mode="Markdown"
+        )
@@ -0,0 +1,127 @@
+"""
+Índice de copias enviadas: (chat origen, mensaje origen) -> (chat destino, mensaje destino), podado por antigüedad
+y por tamaño, más la última copia viva por destino para el modo "reemplazar anterior"
+"""
+
+import logging
+import time
+from utils import load_state_file, save_state_file
+
+logger = logging.getLogger(__name__)
+
+class MessageMap:
+    def __init__(self, max_age=172800, persist_file=None, max_entries=100000):
+        self.max_age = max_age
+        self.persist_file = persist_file
+        self.max_entries = max_entries
+        # (chat origen, mensaje origen) -> [[chat destino, mensaje destino, enviado], ...] en orden de envío;
+        # solo copias: los reenvíos no se pueden editar
+        self._copies = {}
+        # (chat origen, mensaje origen) -> {chat destino: último mensaje destino}; solo modo "reemplazar anterior"
+        self._latest = {}
+        self._size = 0
+        # Cambios desde el último guardado
+        self._dirty = False
+        self._load()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, source_chat, source_message, dest_chat, dest_message, is_copy, keep_latest=False, sent_at=None):
+        """Registrar el mensaje producido en un destino (copias para editar, último para reemplazar)"""
+        key = (source_chat, source_message)
+        if is_copy:
+            self._copies.setdefault(key, []).append([dest_chat, dest_message, sent_at or time.time()])
+            self._size += 1
+            self._dirty = True
+        if keep_latest:
+            self._latest.setdefault(key, {})[dest_chat] = dest_message
+            self._dirty = True
+
+    def latest(self, source_chat, source_message, dest_chat):
+        """Último mensaje producido en un destino, o None"""
+        return self._latest.get((source_chat, source_message), {}).get(dest_chat)
+
+    def forget_sources(self, live_sources):
+        """Olvidar la última copia de mensajes origen que ya no están programados"""
+        live_sources = set(live_sources)
+        for key in [k for k in self._latest if k not in live_sources]:
+            del self._latest[key]
+            self._dirty = True
+
+    def copies(self, source_chat, source_message):
+        """Copias producidas por un mensaje origen: [(chat destino, mensaje destino)]"""
+        return [(chat, message) for chat, message, _ in self._copies.get((source_chat, source_message), [])]
+
+    def discard(self, source_chat, source_message, dest_chat, dest_message):
+        """Olvidar una copia que ya no existe en el destino"""
+        key = (source_chat, source_message)
+        before = self._copies.get(key, [])
+        copies = [c for c in before if (c[0], c[1]) != (dest_chat, dest_message)]
+        self._size -= len(before) - len(copies)
+        if copies:
+            self._copies[key] = copies
+        else:
+            self._copies.pop(key, None)
+        latest = self._latest.get(key, {})
+        if latest.get(dest_chat) == dest_message:
+            del latest[dest_chat]
+        self._dirty = True
+
+    def prune(self, now=None):
+        """Eliminar copias más antiguas que max_age y, por encima de max_entries, las de los orígenes más antiguos"""
+        oldest = (now or time.time()) - self.max_age
+        for key in list(self._copies):
+            copies = self._copies[key]
+            # Las copias están en orden de envío: basta con saltar las del principio
+            start = 0
+            while start < len(copies) and copies[start][2] < oldest:
+                start += 1
+            if start == len(copies):
+                del self._copies[key]
+            elif start:
+                self._copies[key] = copies[start:]
+            if start:
+                self._size -= start
+                self._dirty = True
+        # Los orígenes se insertan en orden de primer envío: se descartan desde el principio
+        while self.max_entries and self._size > self.max_entries and self._copies:
+            key = next(iter(self._copies))
+            self._size -= len(self._copies.pop(key))
+            self._dirty = True
+
+    def _load(self):
+        """Restaurar el índice desde disco"""
+        if not self.persist_file:
+            return
+        data = load_state_file(self.persist_file)
+        if data is None:
+            return
+        for key, copies in data.get('copias', {}).items():
+            # Formato anterior con reenvíos: [chat, mensaje, enviado, es_copia]
+            copies = [c[:3] for c in copies if len(c) < 4 or c[3]]
+            if copies:
+                self._copies[self._parse_key(key)] = copies
+                self._size += len(copies)
+        for key, latest in data.get('ultimas', {}).items():
+            self._latest[self._parse_key(key)] = {int(chat): message for chat, message in latest.items()}
+
+    @staticmethod
+    def _parse_key(key):
+        """'chat:mensaje' -> (chat, mensaje)"""
+        source_chat, source_message = (int(part) for part in key.split(':'))
+        return source_chat, source_message
+
+    def save(self):
+        """Persistir el índice en disco si está habilitado y cambió"""
+        if not self.persist_file or not self._dirty:
+            return
+        data = {
+            'copias': {f"{chat}:{message}": copies for (chat, message), copies in self._copies.items()},
+            'ultimas': {
+                f"{chat}:{message}": {str(dest): dest_message for dest, dest_message in latest.items()}
+                for (chat, message), latest in self._latest.items() if latest
+            },
+        }
+        if save_state_file(self.persist_file, data):
+            self._dirty = False
@@ -0,0 +1,164 @@
+"""
+Almacén de mensajes en memoria respaldado por mensajes.json
+"""
+
+import logging
+import os
+from utils import load_messages, save_messages, is_message_active, load_state_file, save_state_file
+from stats import BotStats
+from pagination import CursorIndex
+
+logger = logging.getLogger(__name__)
+
+class MessageStore:
+    def __init__(self, messages_file='mensajes.json', stats=None, uid_file=None):
+        self.messages_file = messages_file
+        # Máximo histórico de uids (mensajes_uids.json): un uid nunca se reutiliza, aunque se borre su mensaje
+        self.uid_file = uid_file or f"{os.path.splitext(messages_file)[0]}_uids.json"
+        self.stats = stats or BotStats()
+        self.messages = load_messages(messages_file)
+        self._by_uid = {}
+        self._next_uid = 1
+        self._assign_uids()
+        self.index = CursorIndex(self._by_uid)
+        self.stats.rebuild(self.messages)
+
+    def _assign_uids(self):
+        """Dar uid nuevo solo a los mensajes sin uid válido; los existentes no se renumeran
+        (entregas, next_due y el checkpoint se guardan por uid)"""
+        state = load_state_file(self.uid_file) or {}
+        self._next_uid = state.get('next_uid', 1)
+        seen = set()
+        missing = []
+        for msg in self.messages:
+            uid = msg.get('uid')
+            if isinstance(uid, int) and not isinstance(uid, bool) and uid > 0 and uid not in seen:
+                seen.add(uid)
+            else:
+                missing.append(msg)
+        self._next_uid = max(self._next_uid, max(seen, default=0) + 1)
+        for msg in missing:
+            msg['uid'] = self._next_uid
+            self._next_uid += 1
+        # Orden de la lista = orden de uid (las colas toman los mensajes nuevos de la cola de la lista)
+        self.messages.sort(key=lambda m: m['uid'])
+        self._by_uid = {m['uid']: m for m in self.messages}
+        if missing or state.get('next_uid') != self._next_uid:
+            if missing:
+                logger.info(f"🔢 {len(missing)} mensajes sin uid recibieron uno nuevo")
+                self.save()
+            self._save_next_uid()
+
+    def _save_next_uid(self):
+        """Persistir el siguiente uid libre"""
+        save_state_file(self.uid_file, {'next_uid': self._next_uid})
+
+    def __len__(self):
+        return len(self.messages)
+
+    def all(self):
+        """Lista de mensajes (compartida, no copiar para iterar)"""
+        return self.messages
+
+    def active(self):
+        """Mensajes activos"""
+        return [m for m in self.messages if is_message_active(m)]
+
+    def get(self, uid):
+        """Buscar mensaje por uid"""
+        return self._by_uid.get(uid)
+
+    def position(self, uid):
+        """Índice en la lista de un mensaje dado su uid"""
+        return self.index.position(uid)
+
+    def page(self, cursor=None, direction='n', size=10):
+        """Página de mensajes a partir de un cursor"""
+        page = self.index.page(cursor, direction, size)
+        return page, [self._by_uid[uid] for uid in page.keys]
+
+    def find(self, from_chat_id, message_id):
+        """Buscar mensaje por chat origen e ID (también entre las partes de un álbum)"""
+        for msg in self.messages:
+            if msg['from_chat_id'] == from_chat_id and (
+                    msg['message_id'] == message_id or message_id in msg.get('message_ids', ())):
+                return msg
+        return None
+
+    def find_album(self, from_chat_id, media_group_id):
+        """Buscar el álbum registrado de un media_group_id"""
+        for msg in self.messages:
+            if msg['from_chat_id'] == from_chat_id and msg.get('media_group_id') == media_group_id:
+                return msg
+        return None
+
+    def add_album_part(self, msg, message_id):
+        """Sumar una parte a un álbum registrado (en orden; la primera da el message_id)"""
+        message_ids = sorted(set(msg.get('message_ids') or [msg['message_id']]) | {message_id})
+        msg['message_ids'] = message_ids
+        msg['message_id'] = message_ids[0]
+        return self.save()
+
+    def save(self):
+        """Persistir mensajes en disco"""
+        return save_messages(self.messages, self.messages_file)
+
+    def add(self, msg):
+        """Agregar mensaje y persistir"""
+        msg['uid'] = self._next_uid
+        self._next_uid += 1
+        # El máximo se guarda antes que el mensaje: tras un corte nunca queda un uid por encima
+        self._save_next_uid()
+        self.messages.append(msg)
+        self._by_uid[msg['uid']] = msg
+        self.index.add(msg['uid'])
+        self.stats.message_added(msg)
+        return self.save()
+
+    def remove_at(self, index):
+        """Eliminar mensaje por índice; devuelve el mensaje o None"""
+        if not 0 <= index < len(self.messages):
+            return None
+        msg = self.messages.pop(index)
+        self._by_uid.pop(msg['uid'], None)
+        self.index.remove(msg['uid'])
+        self.stats.message_removed(msg)
+        self.save()
+        return msg
+
+    def remove_many(self, uids):
+        """Eliminar varios mensajes por uid con una sola escritura; devuelve los eliminados"""
+        uids = set(uids)
+        removed = [m for m in self.messages if m['uid'] in uids]
+        if not removed:
+            return []
+        self.messages[:] = [m for m in self.messages if m['uid'] not in uids]
+        for msg in removed:
+            self._by_uid.pop(msg['uid'], None)
+            self.index.remove(msg['uid'])
+            self.stats.message_removed(msg)
+        self.save()
+        return removed
+
+    def clear(self):
+        """Eliminar todos los mensajes"""
+        self.messages.clear()
+        self._by_uid.clear()
+        self.index = CursorIndex()
+        self.stats.rebuild(self.messages)
+        return self.save()
+
+    def set_active(self, msg, active):
+        """Activar o pausar un mensaje"""
+        if is_message_active(msg) == active:
+            return
+        msg['active'] = active
+        msg.pop('activo', None)
+        self.stats.message_toggled(active)
+        self.save()
+
+    def record_sends(self, msg, successful, failed):
+        """Actualizar contadores del mensaje (se persisten con save())"""
+        msg['send_count'] = msg.get('send_count', 0) + successful
+        msg['error_count'] = msg.get('error_count', 0) + failed
+        self.stats.record_sends(successful, failed)
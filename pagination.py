@@ -0,0 +1,110 @@
+"""
+Paginación por cursor para las listas del panel de administración
+"""
+
+import bisect
+import zlib
+from telegram import InlineKeyboardButton
+
+# Prefijo de los callbacks de paginación: pg:<tipo>:<n|p>:<cursor>
+PAGE_CALLBACK_PREFIX = "pg:"
+
+class Page:
+    def __init__(self, keys, start, total, has_prev, has_next):
+        self.keys = keys
+        self.start = start
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+
+    def label(self):
+        """Rango mostrado, p. ej. '11–20 de 340'"""
+        if not self.keys:
+            return f"0 de {self.total}"
+        return f"{self.start + 1}–{self.start + len(self.keys)} de {self.total}"
+
+class CursorIndex:
+    def __init__(self, keys=()):
+        self.keys = sorted(keys)
+        # Las claves de texto (nombres de listas) usan un token corto para caber en callback_data
+        self._text_tokens = {}
+        for key in self.keys:
+            if isinstance(key, str):
+                self._text_tokens[self.token(key)] = key
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def token(key):
+        """Token estable de una clave para usar como cursor"""
+        if isinstance(key, str):
+            return format(zlib.crc32(key.encode('utf-8')), 'x')
+        return str(key)
+
+    def decode(self, token):
+        """Clave correspondiente a un token, o None si ya no existe"""
+        if token in self._text_tokens:
+            return self._text_tokens[token]
+        try:
+            return int(token)
+        except (TypeError, ValueError):
+            return None
+
+    def add(self, key):
+        """Insertar una clave manteniendo el orden"""
+        bisect.insort(self.keys, key)
+        if isinstance(key, str):
+            self._text_tokens[self.token(key)] = key
+
+    def remove(self, key):
+        """Eliminar una clave si existe"""
+        pos = bisect.bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            del self.keys[pos]
+            if isinstance(key, str):
+                self._text_tokens.pop(self.token(key), None)
+
+    def position(self, key):
+        """Posición ordenada de una clave"""
+        return bisect.bisect_left(self.keys, key)
+
+    def page(self, cursor=None, direction='n', size=10):
+        """Página después ('n') o antes ('p') del cursor en O(log n + size)"""
+        key = self.decode(cursor) if cursor is not None else None
+
+        if key is None:
+            start = 0
+        elif direction == 'p':
+            end = bisect.bisect_left(self.keys, key)
+            start = max(0, end - size)
+        else:
+            start = bisect.bisect_right(self.keys, key)
+            if start >= len(self.keys):
+                start = max(0, len(self.keys) - size)
+
+        keys = self.keys[start:start + size]
+        return Page(keys, start, len(self.keys), start > 0, start + size < len(self.keys))
+
+def page_nav_row(kind, page):
+    """Fila de botones anterior/siguiente para una página"""
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton(
+            "⬅️ Anterior",
+            callback_data=f"{PAGE_CALLBACK_PREFIX}{kind}:p:{CursorIndex.token(page.keys[0])}"
+        ))
+    if page.has_next:
+        row.append(InlineKeyboardButton(
+            "Siguiente ➡️",
+            callback_data=f"{PAGE_CALLBACK_PREFIX}{kind}:n:{CursorIndex.token(page.keys[-1])}"
+        ))
+    return row
+
+def parse_page_callback(data):
+    """Separar callback de paginación en (tipo, dirección, cursor)"""
+    try:
+        kind, direction, cursor = data[len(PAGE_CALLBACK_PREFIX):].split(':', 2)
+    except ValueError:
+        return None, 'n', None
+    return kind, direction, cursor
@@ -0,0 +1,147 @@
+"""
+Planificador de ciclos y estimador de capacidad (informe "qué pasaría si")
+"""
+
+import argparse
+import time
+from forwarder import resolve_destinations, effective_interval
+from list_algebra import ListAlgebra
+from calendar_schedule import ScheduleCache
+from utils import load_config, load_messages, is_message_active
+
+# Horizonte para medir la frecuencia media de los horarios de calendario
+PLAN_HORIZON = 7 * 24 * 3600
+# Tope de disparos por mensaje al medirla (las ventanas densas se promedian sobre el tramo recorrido)
+PLAN_MAX_FIRES = 1000
+
+class CapacityPlanner:
+    def __init__(self, config, messages):
+        self.config = config
+        self.messages = messages
+        self.rate = max(float(config.get('limite_envios_por_segundo', 2)), 0.01)
+        self.burst = max(int(config.get('rafaga_envios', 1)), 1)
+        # Sin caché: el planificador también evalúa cambios aún no guardados
+        self.algebra = ListAlgebra(config)
+        self.schedules = ScheduleCache(config)
+        self.now = time.time()
+
+    def min_cycle_seconds(self, sends):
+        """Tiempo mínimo para completar un número de envíos con el limitador de tasa"""
+        return max(0.0, (sends - self.burst) / self.rate)
+
+    def fire_rate(self, msg):
+        """(separación mínima entre envíos en segundos, envíos por hora) según el horario del mensaje;
+        los de calendario se miden con sus disparos de los próximos PLAN_HORIZON segundos"""
+        interval = effective_interval(msg, self.config)
+        schedule = self.schedules.get(msg, interval)
+        if not schedule.calendar:
+            return interval, 3600 / interval
+        fires = []
+        moment = schedule.next_after(self.now)
+        while moment <= self.now + PLAN_HORIZON and len(fires) < PLAN_MAX_FIRES:
+            fires.append(moment)
+            moment = schedule.next_after(moment)
+        if not fires:
+            return float('inf'), 0.0
+        # Con el tope de disparos alcanzado, la media se toma sobre el tramo recorrido
+        span = PLAN_HORIZON if moment > self.now + PLAN_HORIZON else max(fires[-1] - self.now, 1)
+        gaps = [later - earlier for earlier, later in zip(fires, fires[1:])]
+        return (min(gaps) if gaps else PLAN_HORIZON), len(fires) * 3600 / span
+
+    def message_plan(self, msg, position=None):
+        """Demanda proyectada de un mensaje"""
+        destinations = len(resolve_destinations(msg, self.config, self.algebra))
+        interval, fires_per_hour = self.fire_rate(msg)
+        min_cycle = self.min_cycle_seconds(destinations)
+        return {
+            'uid': msg.get('uid', position),
+            'message_id': msg.get('message_id'),
+            'destinations': destinations,
+            'interval': interval,
+            'sends_per_hour': destinations * fires_per_hour,
+            'min_cycle_seconds': min_cycle,
+            'feasible': min_cycle <= interval,
+        }
+
+    def report(self):
+        """Demanda total frente a la capacidad del limitador"""
+        plans = [self.message_plan(m, i) for i, m in enumerate(self.messages, 1) if is_message_active(m)]
+        demand = sum(p['sends_per_hour'] for p in plans)
+        capacity = self.rate * 3600
+        sends_per_cycle = sum(p['destinations'] for p in plans)
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'capacity_per_hour': capacity,
+            'demand_per_hour': demand,
+            'utilization': demand / capacity,
+            'sends_per_cycle': sends_per_cycle,
+            'min_cycle_seconds': self.min_cycle_seconds(sends_per_cycle),
+            'backlog_per_hour': max(0.0, demand - capacity),
+            'feasible': demand <= capacity and all(p['feasible'] for p in plans),
+            'messages': plans,
+        }
+
+def format_report(report, top=5):
+    """Texto del informe de capacidad"""
+    lines = [
+        "📐 *Planificador de capacidad*",
+        "",
+        f"🚦 Tasa: {report['rate']:g} envíos/s (ráfaga {report['burst']}) → {report['capacity_per_hour']:.0f}/h",
+        f"📤 Demanda: {report['demand_per_hour']:.0f} envíos/h ({report['utilization']:.0%} de uso)",
+        f"🔁 Envíos por ciclo: {report['sends_per_cycle']} → ciclo mínimo {report['min_cycle_seconds']:.0f}s",
+        f"📥 Backlog esperado: {report['backlog_per_hour']:.0f} envíos/h",
+        "",
+        "✅ Configuración viable" if report['feasible'] else "⚠️ *La configuración no da abasto*",
+    ]
+
+    heaviest = sorted(report['messages'], key=lambda p: p['min_cycle_seconds'] / p['interval'], reverse=True)[:top]
+    if heaviest:
+        lines.append("")
+        lines.append("*Mensajes más exigentes:*")
+        for p in heaviest:
+            icon = "🟢" if p['feasible'] else "🔴"
+            every = f"cada {p['interval']:g}s" if p['interval'] != float('inf') else "sin envíos en 7 días"
+            lines.append(
+                f"{icon} #{p['uid']} (ID {p['message_id']}): {p['destinations']} destinos {every} "
+                f"→ {p['sends_per_hour']:.0f}/h, ciclo mínimo {p['min_cycle_seconds']:.0f}s"
+            )
+    return "\n".join(lines)
+
+def capacity_warning(config, messages):
+    """Aviso breve si la configuración no da abasto, o None"""
+    report = CapacityPlanner(config, messages).report()
+    if report['feasible']:
+        return None
+    return (
+        f"⚠️ Capacidad insuficiente: {report['demand_per_hour']:.0f} envíos/h para "
+        f"{report['capacity_per_hour']:.0f}/h disponibles ({report['utilization']:.0%} de uso)"
+    )
+
+def check_capacity(config, messages):
+    """(aviso, rechazar) tras un cambio de destinos o listas según 'rechazar_config_inviable'"""
+    warning = capacity_warning(config, messages)
+    return warning, bool(warning) and config.get('rechazar_config_inviable', False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Informe de capacidad del reenviador")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--messages', default='mensajes.json')
+    parser.add_argument('--rate', type=float, help="Simular otro limite_envios_por_segundo")
+    parser.add_argument('--burst', type=int, help="Simular otra rafaga_envios")
+    parser.add_argument('--suavizado', action='store_true', help="Simular modo_suavizado activado")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.rate is not None:
+        config['limite_envios_por_segundo'] = args.rate
+    if args.burst is not None:
+        config['rafaga_envios'] = args.burst
+    if args.suavizado:
+        config['modo_suavizado'] = True
+
+    report = CapacityPlanner(config, load_messages(args.messages)).report()
+    print(format_report(report, top=20).replace('*', ''))
+
+if __name__ == "__main__":
+    main()
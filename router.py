@@ -0,0 +1,113 @@
+"""
+Router de updates basado en tablas: callbacks, textos de teclado y estados de conversación
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class UpdateRouter:
+    def __init__(self):
+        # Rutas exactas: valor -> handler(update, context)
+        self.callbacks = {}
+        self.keyboard = {}
+        # Estados exactos: estado -> handler(update, context, text)
+        self.states = {}
+        # Rutas por prefijo: prefijo -> handler(update, context, data)
+        self.callback_prefixes = {}
+        # Estados por prefijo: prefijo -> handler(update, context, text, state)
+        self.state_prefixes = {}
+        self._callback_prefix_order = ()
+        self._state_prefix_order = ()
+
+    def add_callback(self, data, handler):
+        """Registrar callback con valor exacto"""
+        self.callbacks[data] = handler
+
+    def add_callback_prefix(self, prefix, handler):
+        """Registrar callback por prefijo (recibe el data completo)"""
+        self.callback_prefixes[prefix] = handler
+        self._callback_prefix_order = self._sorted_prefixes(self.callback_prefixes)
+
+    def add_keyboard(self, text, handler):
+        """Registrar texto del teclado"""
+        self.keyboard[text] = handler
+
+    def add_state(self, state, handler):
+        """Registrar estado de conversación exacto"""
+        self.states[state] = handler
+
+    def add_state_prefix(self, prefix, handler):
+        """Registrar estado de conversación por prefijo"""
+        self.state_prefixes[prefix] = handler
+        self._state_prefix_order = self._sorted_prefixes(self.state_prefixes)
+
+    @staticmethod
+    def _sorted_prefixes(routes):
+        """Ordenar prefijos de más largo a más corto para que gane el más específico"""
+        return tuple(sorted(routes, key=len, reverse=True))
+
+    @staticmethod
+    def _match_prefix(value, order):
+        """Buscar el prefijo más específico para un valor"""
+        for prefix in order:
+            if value.startswith(prefix):
+                return prefix
+        return None
+
+    def is_keyboard_command(self, text):
+        """Comprobar si el texto corresponde a un botón registrado"""
+        return bool(text) and text.strip() in self.keyboard
+
+    async def dispatch_callback(self, update, context, data):
+        """Despachar callback inline; devuelve True si había ruta"""
+        handler = self.callbacks.get(data)
+        if handler:
+            await handler(update, context)
+            return True
+
+        prefix = self._match_prefix(data, self._callback_prefix_order)
+        if prefix is not None:
+            await self.callback_prefixes[prefix](update, context, data)
+            return True
+
+        logger.info(f"⚠️ Callback no reconocido: '{data}'")
+        return False
+
+    async def dispatch_keyboard(self, update, context, text):
+        """Despachar texto del teclado principal"""
+        handler = self.keyboard.get(text.strip())
+        if handler:
+            await handler(update, context)
+            return True
+
+        logger.info(f"⚠️ Comando no reconocido: '{text}'")
+        return False
+
+    async def dispatch_state(self, update, context, state, text):
+        """Despachar entrada de texto según el estado de conversación"""
+        handler = self.states.get(state)
+        if handler:
+            await handler(update, context, text)
+            return True
+
+        prefix = self._match_prefix(state, self._state_prefix_order)
+        if prefix is not None:
+            await self.state_prefixes[prefix](update, context, text, state)
+            return True
+
+        logger.info(f"⚠️ Estado sin handler: '{state}'")
+        return False
+
+    def describe(self):
+        """Devolver el registro de rutas para inspección"""
+        def names(routes):
+            return {key: getattr(h, '__qualname__', repr(h)) for key, h in routes.items()}
+
+        return {
+            'callbacks': names(self.callbacks),
+            'callback_prefixes': names(self.callback_prefixes),
+            'keyboard': names(self.keyboard),
+            'states': names(self.states),
+            'state_prefixes': names(self.state_prefixes),
+        }
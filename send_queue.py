@@ -0,0 +1,169 @@
+"""
+Cola de envíos con prioridades y reparto justo ponderado (WFQ) más limitador de tasa
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+# Clases de prioridad y su peso por defecto (configurable con 'pesos_prioridad')
+PRIORITY_WEIGHTS = {'alta': 8, 'normal': 3, 'baja': 1}
+DEFAULT_PRIORITY = 'normal'
+
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Reponer tokens según el tiempo transcurrido"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Esperar hasta disponer de un token"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class SendItem:
+    __slots__ = ('msg', 'dest_id', 'flow', 'priority', 'weight', 'cycle', 'due', 'enqueued_at')
+
+    def __init__(self, msg, dest_id, flow, priority=DEFAULT_PRIORITY, weight=1.0, cycle=None, due=None):
+        self.msg = msg
+        self.dest_id = dest_id
+        self.flow = flow
+        self.priority = priority
+        self.weight = weight
+        # Ciclo al que pertenece el envío (None = sin control de duplicados)
+        self.cycle = cycle
+        # Hora prevista de entrega (reloj de pared) para medir el retraso
+        self.due = due if due is not None else time.time()
+        self.enqueued_at = time.monotonic()
+
+class WeightedFairQueue:
+    def __init__(self, class_weights=None):
+        self.class_weights = dict(PRIORITY_WEIGHTS)
+        self.class_weights.update(class_weights or {})
+        self._seq = itertools.count()
+        # Dos niveles SCFQ: las clases se reparten el servicio según su peso y, dentro de cada clase,
+        # los flujos (mensajes) según el suyo; así el peso de una clase no se diluye entre sus flujos
+        # clase -> {'heap': [(fin, seq, item)], 'virtual': reloj de la clase, 'last_finish': {flujo: fin},
+        #          'class_finish': etiqueta de su último servicio}
+        self._classes = {}
+        # Reloj virtual entre clases y etiqueta de fin del próximo servicio de cada clase con pendientes
+        self._virtual_time = 0.0
+        self._class_tags = {}
+        self._size = 0
+        self._depth = {}
+        self._stats = {}
+
+    def __len__(self):
+        return self._size
+
+    def _class_stats(self, priority):
+        """Estadísticas de una clase (se crean al primer uso)"""
+        stats = self._stats.get(priority)
+        if stats is None:
+            stats = {'enqueued': 0, 'dequeued': 0, 'peak_depth': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            self._stats[priority] = stats
+        return stats
+
+    def push(self, item):
+        """Encolar en su clase con etiqueta de fin = max(reloj de la clase, último fin del flujo) + 1/peso"""
+        if item.priority not in self.class_weights:
+            item.priority = DEFAULT_PRIORITY
+        queue = self._classes.get(item.priority)
+        if queue is None:
+            queue = {'heap': [], 'virtual': 0.0, 'last_finish': {}}
+            self._classes[item.priority] = queue
+        start = max(queue['virtual'], queue['last_finish'].get(item.flow, 0.0))
+        finish = start + 1.0 / max(item.weight, 0.01)
+        queue['last_finish'][item.flow] = finish
+        if not queue['heap']:
+            # La clase vuelve a tener pendientes: su turno cuenta desde el reloj actual
+            self._class_tags[item.priority] = max(self._virtual_time, queue.get('class_finish', 0.0)) + self._class_step(item.priority)
+        heapq.heappush(queue['heap'], (finish, next(self._seq), item))
+        self._size += 1
+
+        depth = self._depth.get(item.priority, 0) + 1
+        self._depth[item.priority] = depth
+        stats = self._class_stats(item.priority)
+        stats['enqueued'] += 1
+        stats['peak_depth'] = max(stats['peak_depth'], depth)
+
+    def _class_step(self, priority):
+        """Avance de la etiqueta de una clase por cada envío servido"""
+        return 1.0 / max(self.class_weights[priority], 0.01)
+
+    def _next_class(self, class_tags):
+        """Clase con menor etiqueta de fin (a igualdad, la de más peso)"""
+        return min(class_tags, key=lambda p: (class_tags[p], self._class_step(p), p))
+
+    def pop(self):
+        """Desencolar: primero la clase que toca según su peso, luego el flujo con menor etiqueta, o None si está vacía"""
+        if not self._size:
+            return None
+        priority = self._next_class(self._class_tags)
+        class_tag = self._class_tags[priority]
+        self._virtual_time = class_tag
+        queue = self._classes[priority]
+        queue['class_finish'] = class_tag
+        finish, _, item = heapq.heappop(queue['heap'])
+        queue['virtual'] = finish
+        if queue['heap']:
+            self._class_tags[priority] = class_tag + self._class_step(priority)
+        else:
+            del self._class_tags[priority]
+        self._size -= 1
+        self._depth[item.priority] -= 1
+
+        waited = time.monotonic() - item.enqueued_at
+        stats = self._class_stats(item.priority)
+        stats['dequeued'] += 1
+        stats['total_wait'] += waited
+        stats['max_wait'] = max(stats['max_wait'], waited)
+        return item
+
+    def pending(self):
+        """Elementos pendientes en orden de servicio, sin desencolarlos"""
+        ordered = {p: deque(item for _, _, item in sorted(q['heap'], key=lambda entry: entry[:2]))
+                   for p, q in self._classes.items() if q['heap']}
+        class_tags = dict(self._class_tags)
+        result = []
+        while class_tags:
+            priority = self._next_class(class_tags)
+            result.append(ordered[priority].popleft())
+            if ordered[priority]:
+                class_tags[priority] += self._class_step(priority)
+            else:
+                del class_tags[priority]
+        return result
+
+    def depth_by_class(self):
+        """Elementos pendientes por clase"""
+        return {priority: depth for priority, depth in self._depth.items() if depth}
+
+    def report(self):
+        """Profundidad y espera por clase de prioridad"""
+        report = {}
+        for priority, stats in self._stats.items():
+            dequeued = stats['dequeued']
+            report[priority] = {
+                'depth': self._depth.get(priority, 0),
+                'peak_depth': stats['peak_depth'],
+                'sent': dequeued,
+                'avg_wait': stats['total_wait'] / dequeued if dequeued else 0.0,
+                'max_wait': stats['max_wait'],
+            }
+        return report
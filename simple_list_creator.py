@@ -2,12 +2,16 @@
 
 import logging
 from utils import save_config
+from planner import check_capacity
 
 logger = logging.getLogger(__name__)
 
 class SimpleListCreator:
-    def __init__(self, config):
+    def __init__(self, config, states, message_store=None):
         self.config = config
+        # Estados de conversación compartidos con BotHandler
+        self.states = states
+        self.message_store = message_store
 
     async def handle_list_name_input(self, update, context, list_name):
         """Procesar el nombre de la lista enviada por el admin"""
@@ -27,7 +31,7 @@ class SimpleListCreator:
             return
 
         # Establecer estado para capturar los IDs
-        context.bot_data['bot_handler'].set_user_state(update.effective_user.id, f"waiting_list_ids_{list_name}")
+        self.states.set(update.effective_user.id, f"waiting_list_ids_{list_name}")
 
         await update.message.reply_text(
             f"📝 Lista **{list_name}** creada.\n\n"
@@ -58,17 +62,31 @@ class SimpleListCreator:
         # Guardar la lista
         if "listas_destinos" not in self.config:
             self.config["listas_destinos"] = {}
+        previous = self.config["listas_destinos"].get(list_name)
         self.config["listas_destinos"][list_name] = destinos
+
+        warning, reject = None, False
+        if self.message_store is not None:
+            warning, reject = check_capacity(self.config, self.message_store.all())
+        if reject:
+            if previous is None:
+                del self.config["listas_destinos"][list_name]
+            else:
+                self.config["listas_destinos"][list_name] = previous
+            await update.message.reply_text(f"❌ Lista **{list_name}** rechazada.\n\n{warning}", parse_mode="Markdown")
+            self.states.pop(update.effective_user.id)
+            return
         save_config(self.config)
 
         await update.message.reply_text(
             f"✅ Lista **{list_name}** guardada con {len(destinos)} destinos.\n"
-            "Podrás usarla para reenvíos automáticos.",
+            "Podrás usarla para reenvíos automáticos."
+            + (f"\n\n{warning}" if warning else ""),
             parse_mode="Markdown"
         )
 
         # Limpiar el estado
-        context.bot_data['bot_handler'].clear_user_state(update.effective_user.id)
+        self.states.pop(update.effective_user.id)
 
     async def handle_list_callback(self, update, context, data):
         """Manejar callbacks relacionados con listas"""
@@ -76,7 +94,7 @@ class SimpleListCreator:
             await update.callback_query.edit_message_text(
                 "📝 Por favor escribe el nombre para la nueva lista."
             )
-            context.bot_data['bot_handler'].set_user_state(update.effective_user.id, "waiting_list_name")
+            self.states.set(update.effective_user.id, "waiting_list_name")
         elif data.startswith("delete_list_"):
             list_name = data.replace("delete_list_", "")
             listas = self.config.get("listas_destinos", {})
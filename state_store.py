@@ -0,0 +1,97 @@
+"""
+Almacén de estados de conversación con TTL, expulsión LRU y persistencia opcional
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from utils import load_state_file, save_state_file
+
+logger = logging.getLogger(__name__)
+
+class ConversationStateStore:
+    def __init__(self, max_entries=1000, ttl=1800, persist_file=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_file = persist_file
+        # clave -> (valor, expira_en); el orden refleja el uso más reciente al final
+        self._entries = OrderedDict()
+        self._last_purge = time.time()
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """Obtener valor vigente y marcarlo como usado"""
+        key = str(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self._save()
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Guardar valor con TTL propio o el global"""
+        key = str(key)
+        self._entries[key] = (value, time.time() + (ttl or self.ttl))
+        self._entries.move_to_end(key)
+        self._purge_if_due()
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            logger.info(f"♻️ Estado expulsado por capacidad: {evicted}")
+        self._save()
+
+    def pop(self, key, default=None):
+        """Eliminar y devolver valor vigente"""
+        entry = self._entries.pop(str(key), None)
+        if entry is None:
+            return default
+        self._save()
+        value, expires_at = entry
+        return value if expires_at > time.time() else default
+
+    def purge_expired(self):
+        """Eliminar todas las entradas caducadas"""
+        now = time.time()
+        expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self._last_purge = now
+        return len(expired)
+
+    def _purge_if_due(self):
+        """Purga completa como mucho una vez por minuto"""
+        if time.time() - self._last_purge >= 60:
+            self.purge_expired()
+
+    def _load(self):
+        """Restaurar estados vigentes desde disco"""
+        if not self.persist_file:
+            return
+        data = load_state_file(self.persist_file)
+        if data is None:
+            return
+
+        now = time.time()
+        for key, (value, expires_at) in sorted(data.items(), key=lambda item: item[1][1]):
+            if expires_at > now:
+                self._entries[key] = (value, expires_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._entries:
+            logger.info(f"💾 {len(self._entries)} estados de conversación restaurados")
+
+    def _save(self):
+        """Persistir estados en disco si está habilitado"""
+        if not self.persist_file:
+            return
+        save_state_file(self.persist_file, dict(self._entries), ensure_ascii=False)
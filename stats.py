@@ -0,0 +1,91 @@
+"""
+Agregados de estado mantenidos de forma incremental para los paneles de administración
+"""
+
+from utils import is_message_active
+
+class BotStats:
+    def __init__(self):
+        self.total = 0
+        self.active = 0
+        self.sent = 0
+        self.errors = 0
+        self.running = False
+        self.next_run = None
+        self.last_cycle = None
+        self.bot_name = None
+        self.bot_username = None
+        self.queue_report = {}
+        self.cadence = {}
+
+    @property
+    def paused(self):
+        """Mensajes configurados pero no activos"""
+        return self.total - self.active
+
+    @property
+    def success_rate(self):
+        """Porcentaje de envíos exitosos o None si aún no hubo envíos"""
+        attempts = self.sent + self.errors
+        if not attempts:
+            return None
+        return self.sent / attempts * 100
+
+    def rebuild(self, messages):
+        """Recalcular todos los agregados (solo al cargar el almacén)"""
+        self.total = len(messages)
+        self.active = sum(1 for m in messages if is_message_active(m))
+        self.sent = sum(m.get('send_count', 0) for m in messages)
+        self.errors = sum(m.get('error_count', 0) for m in messages)
+
+    def message_added(self, msg):
+        """Registrar alta de un mensaje"""
+        self.total += 1
+        if is_message_active(msg):
+            self.active += 1
+        self.sent += msg.get('send_count', 0)
+        self.errors += msg.get('error_count', 0)
+
+    def message_removed(self, msg):
+        """Registrar baja de un mensaje"""
+        self.total -= 1
+        if is_message_active(msg):
+            self.active -= 1
+        self.sent -= msg.get('send_count', 0)
+        self.errors -= msg.get('error_count', 0)
+
+    def message_toggled(self, active):
+        """Registrar cambio de estado activo/pausado"""
+        self.active += 1 if active else -1
+
+    def record_sends(self, successful, failed):
+        """Sumar resultados de envío de un mensaje"""
+        self.sent += successful
+        self.errors += failed
+
+    def set_running(self, running):
+        """Marcar si el sistema de reenvío está en marcha"""
+        self.running = running
+        if not running:
+            self.next_run = None
+
+    def set_next_run(self, next_run):
+        """Guardar el próximo envío programado"""
+        self.next_run = next_run
+
+    def set_last_cycle(self, finished_at):
+        """Guardar el momento del último ciclo completado"""
+        self.last_cycle = finished_at
+
+    def set_queue_report(self, report):
+        """Guardar profundidad/espera por clase del último ciclo"""
+        self.queue_report = report
+
+    def set_cadence(self, cadence):
+        """Guardar cadencia efectiva y excesos de ciclo del reenvío"""
+        self.cadence = cadence
+
+    def set_bot_identity(self, bot_user):
+        """Cachear nombre y username del bot (resultado de getMe)"""
+        self.bot_name = bot_user.first_name
+        self.bot_username = f"@{bot_user.username}"
@@ -0,0 +1,81 @@
+"""
+Pruebas de los horarios de calendario: días de la semana de cron y ventanas que cruzan la medianoche
+"""
+
+from datetime import datetime
+import pytest
+import pytz
+from calendar_schedule import (
+    CalendarSchedule, CronSchedule, ScheduleError, WindowSchedule, standard_day_of_week,
+)
+
+TZ = pytz.timezone('Europe/Madrid')
+
+def at(*args):
+    """Timestamp de una hora local de Madrid"""
+    return TZ.localize(datetime(*args)).timestamp()
+
+def local(timestamp):
+    """Hora local de Madrid (sin zona) de un timestamp"""
+    return datetime.fromtimestamp(timestamp, TZ).replace(tzinfo=None)
+
+@pytest.mark.parametrize('field, expected', [
+    ('*', '*'),
+    ('0', 'sun'),
+    ('7', 'sun'),
+    ('1', 'mon'),
+    ('1-5', 'mon,tue,wed,thu,fri'),
+    ('mon-fri', 'mon,tue,wed,thu,fri'),
+    ('5-7', 'sun,fri,sat'),
+    ('fri-sun', 'sun,fri,sat'),
+    ('0,6', 'sun,sat'),
+    ('*/2', 'sun,tue,thu,sat'),
+])
+def test_standard_day_of_week(field, expected):
+    assert standard_day_of_week(field) == expected
+
+@pytest.mark.parametrize('field', ['8', 'x', '5-1'])
+def test_standard_day_of_week_invalid(field):
+    with pytest.raises(ScheduleError):
+        standard_day_of_week(field)
+
+def test_cron_sunday_is_zero_and_seven():
+    # 2026-10-19 es lunes: el siguiente domingo es el 25
+    for day in ('0', '7', 'sun'):
+        schedule = CronSchedule(f'0 9 * * {day}', TZ)
+        assert local(schedule.next_after(at(2026, 10, 19, 12))) == datetime(2026, 10, 25, 9)
+
+def test_cron_weekdays_skip_weekend():
+    schedule = CronSchedule('0 9 * * 1-5', TZ)
+    # Viernes 23 por la tarde -> lunes 26
+    assert local(schedule.next_after(at(2026, 10, 23, 18))) == datetime(2026, 10, 26, 9)
+
+def test_window_across_midnight():
+    # Cada hora de 22:00 a 02:00, solo las ventanas que empiezan en viernes
+    schedule = WindowSchedule(60, '22:00', '02:00', [5], TZ)
+    fires = [schedule.next_after(at(2026, 10, 23, 21, 30))]
+    while len(fires) < 6:
+        fires.append(schedule.next_after(fires[-1]))
+    assert [local(f) for f in fires] == [
+        datetime(2026, 10, 23, 22), datetime(2026, 10, 23, 23),
+        datetime(2026, 10, 24, 0), datetime(2026, 10, 24, 1), datetime(2026, 10, 24, 2),
+        datetime(2026, 10, 30, 22),
+    ]
+
+def test_window_open_since_previous_day():
+    # Pasada la medianoche sigue abierta la ventana que empezó el viernes
+    schedule = WindowSchedule(60, '22:00', '02:00', [5], TZ)
+    assert local(schedule.next_after(at(2026, 10, 24, 0, 30))) == datetime(2026, 10, 24, 1)
+
+def test_window_across_dst_change():
+    # 2026-10-25: a las 03:00 el reloj vuelve a las 02:00; los disparos siguen creciendo
+    schedule = WindowSchedule(60, '00:00', '04:00', [7], TZ)
+    fires = [schedule.next_after(at(2026, 10, 24, 23, 30))]
+    while len(fires) < 5:
+        fires.append(schedule.next_after(fires[-1]))
+    assert fires == sorted(set(fires))
+    assert fires[-1] - fires[0] == 5 * 3600
+
+def test_calendar_schedule_is_abstract():
+    with pytest.raises(TypeError):
+        CalendarSchedule()
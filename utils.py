@@ -1,5 +1,6 @@
 import json
 import logging
+import os
 import pytz
 from datetime import datetime
 
@@ -10,9 +11,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Versión de la configuración: aumenta en cada guardado para invalidar cachés
+_config_version = 0
+# Última fecha de modificación vista de cada archivo de configuración
+_config_mtimes = {}
+
+def _config_mtime(config_file):
+    """Fecha de modificación del archivo, o None si no existe"""
+    try:
+        return os.path.getmtime(config_file)
+    except OSError:
+        return None
+
 def load_config(config_file='config.json'):
     """Cargar configuración desde archivo especificado"""
     try:
+        _config_mtimes[config_file] = _config_mtime(config_file)
         with open(config_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
@@ -27,11 +41,36 @@ def save_config(config):
     try:
         with open('config.json', 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
+        _config_mtimes['config.json'] = _config_mtime('config.json')
+        bump_config_version()
         return True
     except Exception as e:
         logger.error(f"Error al guardar config.json: {e}")
         return False
 
+def refresh_config(config, config_file='config.json'):
+    """Recargar en el mismo dict compartido solo si el archivo cambió fuera del bot"""
+    mtime = _config_mtime(config_file)
+    if mtime is None or mtime == _config_mtimes.get(config_file):
+        return False
+    fresh = load_config(config_file)
+    if not fresh:
+        return False
+    config.clear()
+    config.update(fresh)
+    bump_config_version()
+    logger.info(f"🔄 {config_file} modificado externamente, configuración recargada")
+    return True
+
+def bump_config_version():
+    """Marcar la configuración en memoria como modificada"""
+    global _config_version
+    _config_version += 1
+
+def get_config_version():
+    """Versión actual de la configuración (para cachés derivadas)"""
+    return _config_version
+
 def load_messages(messages_file='mensajes.json'):
     """Cargar mensajes desde archivo especificado"""
     try:
@@ -54,10 +93,45 @@ def save_messages(messages, messages_file='mensajes.json'):
         logger.error(f"Error al guardar mensajes.json: {e}")
         return False
 
+def load_state_file(path):
+    """Leer un archivo JSON de estado; None si no existe o no se puede leer"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error(f"Error al leer {path}: {e}")
+        return None
+
+def save_state_file(path, data, ensure_ascii=True):
+    """Escribir un archivo JSON de estado; devuelve si se guardó"""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=ensure_ascii)
+        return True
+    except Exception as e:
+        logger.error(f"Error al guardar {path}: {e}")
+        return False
+
 def is_admin(user_id, config):
     """Verificar si el usuario es administrador"""
     return user_id == config.get('admin_id')
 
+def is_source_chat(chat, config):
+    """Si un chat es el canal origen vinculado (por ID o por @username)"""
+    origen = config.get('origen_chat_id')
+    if not origen:
+        return False
+    if str(chat.id) == str(origen):
+        return True
+    username = getattr(chat, 'username', None)
+    return bool(username) and str(origen).lstrip('@').lower() == username.lower()
+
+def is_message_active(message_data):
+    """Verificar si un mensaje está activo (acepta 'active' y el antiguo 'activo')"""
+    return message_data.get('active', message_data.get('activo', True))
+
 def validate_timezone(tz_name):
     """Validar zona horaria"""
     try: